@@ -0,0 +1,154 @@
+"""
+Order admission load test
+=========================
+Fires a burst of concurrent POST /api/order/ requests at a throwaway SQLite
+database (bench profile), once with orders placed inline and once through
+admission control (ORDER_QUEUE), and compares request latency. For the
+queued run it also reports how long tickets waited until their order was
+placed, since that is the delay students see before confirmation.
+
+Requests go through the full middleware and DRF stack in-process, one
+thread per simulated client, all contending for the same inventory rows:
+    python benchmarks/order_admission.py
+    python benchmarks/order_admission.py --clients 64 --orders 20 --items 3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup(db_path):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'smartcanteen.settings'
+    os.environ['SMARTCANTEEN_PROFILE'] = 'bench'
+    os.environ['BENCH_DB_NAME'] = str(db_path)
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(clients, menu_items):
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from core.models import Inventory, MenuItem, User
+
+    menu = MenuItem.objects.bulk_create(
+        MenuItem(name=f'Dish {number}', description='', price=Decimal('2.50')) for number in range(menu_items)
+    )
+    Inventory.objects.bulk_create(
+        Inventory(menu_item=item, quantity=10 ** 6, stock_level=10 ** 6, threshold=10) for item in menu
+    )
+    tokens = []
+    for number in range(clients):
+        user = User.objects.create_user(
+            username=f'load{number}', password='load', email=f'load{number}@example.com',
+            reg_number=f'LOAD{number}', role='student',
+        )
+        tokens.append(str(AccessToken.for_user(user)))
+    return [item.id for item in menu], tokens
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+def burst(tokens, menu_ids, orders, items):
+    """Every client posts `orders` orders back to back; returns (latencies ms, failures)."""
+    from django.db import connection
+    from django.test import Client
+
+    latencies, failures = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(len(tokens))
+
+    def client_run(number, token):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+        body = {
+            'total_price': str(Decimal('2.50') * items), 'status': 'pending',
+            'items_data': [
+                {'menu_item_id': menu_ids[(number + offset) % len(menu_ids)], 'quantity': 1, 'subtotal': '2.50'}
+                for offset in range(items)
+            ],
+        }
+        start.wait()
+        try:
+            for _ in range(orders):
+                started = time.perf_counter()
+                try:
+                    response = client.post('/api/order/', body, content_type='application/json')
+                    ok = response.status_code in (201, 202)
+                except Exception:
+                    ok = False
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    (latencies if ok else failures).append(elapsed)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=len(tokens)) as pool:
+        list(pool.map(client_run, range(len(tokens)), tokens))
+    return latencies, failures
+
+
+def wait_for_tickets(timeout=120):
+    from core.models import OrderTicket
+
+    deadline = time.monotonic() + timeout
+    while OrderTicket.objects.filter(status='queued').exists() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    placed = OrderTicket.objects.filter(status='placed').values_list('created_at', 'processed_at')
+    return [(processed - created).total_seconds() * 1000 for created, processed in placed]
+
+
+def report(label, latencies, failures, extra=''):
+    if not latencies:
+        print(f"{label:<8} {'-':>7} {'-':>8} {'-':>8} {'-':>8} {len(failures):>7}{extra}")
+        return
+    print(
+        f"{label:<8} {len(latencies):>7} {statistics.median(latencies):>8.1f} "
+        f"{percentile(latencies, 0.99):>8.1f} {max(latencies):>8.1f} {len(failures):>7}{extra}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=32, help="Concurrent clients.")
+    parser.add_argument('--orders', type=int, default=10, help="Orders per client.")
+    parser.add_argument('--items', type=int, default=3, help="Items per order.")
+    parser.add_argument('--menu', type=int, default=10, help="Menu items the orders spread over.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup(Path(workdir) / 'bench.sqlite3')
+        from django.conf import settings
+        from django.test.utils import override_settings
+
+        menu_ids, tokens = seed(args.clients, args.menu)
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': ()}
+        print(f"{args.clients} clients x {args.orders} orders, {args.items} items each")
+        print(f"{'mode':<8} {'ok':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>7}")
+
+        with override_settings(REST_FRAMEWORK=rest_framework, ORDER_QUEUE=False):
+            report('inline', *burst(tokens, menu_ids, args.orders, args.items))
+
+        with override_settings(REST_FRAMEWORK=rest_framework, ORDER_QUEUE=True, ORDER_QUEUE_ASYNC=True):
+            latencies, failures = burst(tokens, menu_ids, args.orders, args.items)
+            waits = wait_for_tickets()
+        extra = f"   placed after p50 {statistics.median(waits):.0f} / p99 {percentile(waits, 0.99):.0f} ms" if waits else ''
+        report('queued', latencies, failures, extra)
+
+
+if __name__ == '__main__':
+    main()
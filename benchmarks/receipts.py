@@ -0,0 +1,104 @@
+"""
+Receipt rendering throughput benchmark
+======================================
+Simulates the end-of-day receipt run: seeds a throwaway SQLite database
+(bench profile) with completed payments, then fills their receipts the way
+the render_receipts command does, once per worker count. Each run writes to
+a fresh media directory, so every receipt is really rendered; a second pass
+over the same directory shows the cost when all receipts already exist.
+
+    python benchmarks/receipts.py
+    python benchmarks/receipts.py --payments 5000 --workers 1 2 4 8 --batch-size 500
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup(db_path):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'smartcanteen.settings'
+    os.environ['SMARTCANTEEN_PROFILE'] = 'bench'
+    os.environ['BENCH_DB_NAME'] = str(db_path)
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(payments, items_per_order):
+    from django.utils import timezone
+
+    from core.models import MenuItem, Order, OrderItem, Payment, User
+
+    user = User.objects.create_user(
+        username='bench', password='bench', email='bench@example.com', reg_number='BENCH', role='student',
+        name='Bench Student',
+    )
+    menu = MenuItem.objects.bulk_create(
+        MenuItem(name=f'Dish {number}', description='', price=Decimal('2.50')) for number in range(20)
+    )
+    orders = Order.objects.bulk_create(
+        Order(user=user, total_price=Decimal('2.50') * items_per_order, status='completed',
+              order_date=timezone.localdate())
+        for _ in range(payments)
+    )
+    OrderItem.objects.bulk_create(
+        (OrderItem(order=order, menu_item=menu[(order.id + offset) % len(menu)], quantity=1, subtotal=Decimal('2.50'))
+         for order in orders for offset in range(items_per_order)),
+        batch_size=1000,
+    )
+    Payment.objects.bulk_create(
+        (Payment(order=order, payment_ref=f'BENCH{order.id:08d}', amount=order.total_price,
+                 payment_method='m-pesa', payment_status='completed') for order in orders),
+        batch_size=1000,
+    )
+    return list(Payment.objects.order_by('id').values_list('id', flat=True))
+
+
+def run(ids, workers, batch_size, force):
+    from core.receipts import ReceiptRenderer
+
+    started = time.perf_counter()
+    rendered = 0
+    with ReceiptRenderer(workers=workers, force=force) as renderer:
+        for start in range(0, len(ids), batch_size):
+            rendered += renderer.render_ids(ids[start:start + batch_size])
+    return rendered, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--payments', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=4, help="Items per order.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup(Path(workdir) / 'bench.sqlite3')
+        from django.test.utils import override_settings
+
+        from core.models import Payment
+
+        ids = seed(args.payments, args.items)
+        print(f"{args.payments} payments, {args.items} items each, batches of {args.batch_size}")
+        print(f"{'workers':>7} {'rendered':>9} {'seconds':>8} {'receipts/s':>11} {'cached s':>9}")
+        for workers in args.workers:
+            Payment.objects.update(receipt_url=None)
+            with override_settings(MEDIA_ROOT=Path(workdir) / f'media-{workers}'):
+                rendered, elapsed = run(ids, workers, args.batch_size, force=False)
+                # Same data again: every receipt exists, only loading and hashing remain
+                _, cached = run(ids, workers, args.batch_size, force=True)
+            print(f"{workers:>7} {rendered:>9} {elapsed:>8.2f} {rendered / elapsed:>11.0f} {cached:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
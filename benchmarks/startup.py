@@ -0,0 +1,76 @@
+"""
+Startup-time benchmark for the settings profiles
+================================================
+Measures, per profile, how long a fresh interpreter takes to import and set
+up Django and how long the first request through the full middleware stack
+takes (the API root, answered without touching the database).
+
+Every sample runs in its own subprocess so import caches never carry over:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --profiles dev bench --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import json, os, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.conf import settings
+setup_done = time.perf_counter()
+
+from django.test import Client
+host = next((h for h in settings.ALLOWED_HOSTS if '/' not in h and h != '*'), 'localhost')
+response = Client(HTTP_HOST=host).get('/api/')
+first_request_done = time.perf_counter()
+
+print(json.dumps({
+    'setup_ms': (setup_done - started) * 1000,
+    'first_request_ms': (first_request_done - setup_done) * 1000,
+    'status': response.status_code,
+    'apps': len(settings.INSTALLED_APPS),
+    'middleware': len(settings.MIDDLEWARE),
+}))
+"""
+
+
+def sample(profile):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='smartcanteen.settings', SMARTCANTEEN_PROFILE=profile)
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD], cwd=BASE_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=['dev', 'test', 'prod', 'api', 'bench'])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'apps':>5} {'mw':>4} {'setup ms':>10} {'first req ms':>13} {'status':>7}")
+    for profile in args.profiles:
+        try:
+            samples = [sample(profile) for _ in range(args.runs)]
+        except RuntimeError as exc:
+            print(f"{profile:<8} skipped: {exc}")
+            continue
+        setup = statistics.median(s['setup_ms'] for s in samples)
+        first = statistics.median(s['first_request_ms'] for s in samples)
+        last = samples[-1]
+        print(f"{profile:<8} {last['apps']:>5} {last['middleware']:>4} {setup:>10.1f} {first:>13.1f} {last['status']:>7}")
+
+
+if __name__ == '__main__':
+    main()
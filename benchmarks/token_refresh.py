@@ -0,0 +1,136 @@
+"""
+Token refresh throughput benchmark
+==================================
+Seeds a throwaway SQLite database (bench profile) with students and a
+blacklist of already rotated tokens, then drives POST /api/token/refresh/
+and /api/token/verify/ through the full middleware and DRF stack, once with
+simplejwt's stock serializers and once with core.tokens (revocation filter,
+leaner blacklist writes). Reports requests per second and queries per
+request. Each refresh rotates, so every request uses the token the previous
+one returned, as a client would.
+
+    python benchmarks/token_refresh.py
+    python benchmarks/token_refresh.py --clients 200 --rounds 20 --revoked 50000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODES = {
+    'stock': 'rest_framework_simplejwt.serializers',
+    'core': 'core.tokens',
+}
+
+
+def setup(db_path):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'smartcanteen.settings'
+    os.environ['SMARTCANTEEN_PROFILE'] = 'bench'
+    os.environ['BENCH_DB_NAME'] = str(db_path)
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(clients, revoked):
+    from datetime import timedelta
+    from uuid import uuid4
+
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    from core.models import User
+
+    users = [
+        User.objects.create_user(
+            username=f'load{number}', password='load', email=f'load{number}@example.com',
+            reg_number=f'LOAD{number}', role='student',
+        )
+        for number in range(clients)
+    ]
+    now = timezone.now()
+    # A day's worth of rotations already on the blacklist
+    OutstandingToken.objects.bulk_create(
+        (OutstandingToken(user=users[number % clients], jti=uuid4().hex, token='', created_at=now,
+                          expires_at=now + timedelta(hours=12)) for number in range(revoked)),
+        batch_size=2000,
+    )
+    BlacklistedToken.objects.bulk_create(
+        (BlacklistedToken(token_id=token_id) for token_id in OutstandingToken.objects.values_list('id', flat=True)),
+        batch_size=2000,
+    )
+    return users
+
+
+def run(users, rounds, module):
+    """Refresh (and verify the new refresh token) `rounds` times per user; returns per-endpoint stats."""
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from django.urls import path
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
+
+    urls = type('urls', (), {'urlpatterns': [
+        path('refresh/', TokenRefreshView.as_view(_serializer_class=f'{module}.TokenRefreshSerializer')),
+        path('verify/', TokenVerifyView.as_view(_serializer_class=f'{module}.TokenVerifySerializer')),
+    ]})
+    fields = {'refresh': 'refresh', 'verify': 'token'}
+    tokens = [str(RefreshToken.for_user(user)) for user in users]
+    client = Client()
+    stats = {endpoint: {'seconds': 0.0, 'requests': 0, 'queries': 0} for endpoint in fields}
+
+    with override_settings(ROOT_URLCONF=urls):
+        for _ in range(rounds):
+            for number in range(len(tokens)):
+                for endpoint, field in fields.items():
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = client.post(
+                            f'/{endpoint}/', {field: tokens[number]}, content_type='application/json',
+                        )
+                        elapsed = time.perf_counter() - started
+                    assert response.status_code == 200, response.content
+                    if endpoint == 'refresh':
+                        tokens[number] = response.json()['refresh']
+                    stats[endpoint]['seconds'] += elapsed
+                    stats[endpoint]['requests'] += 1
+                    stats[endpoint]['queries'] += len(queries)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=100, help="Students refreshing.")
+    parser.add_argument('--rounds', type=int, default=10, help="Refreshes per student.")
+    parser.add_argument('--revoked', type=int, default=20000, help="Blacklisted tokens already stored.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        setup(Path(workdir) / 'bench.sqlite3')
+        from django.conf import settings
+        from django.test.utils import override_settings
+
+        users = seed(args.clients, args.revoked)
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': ()}
+        print(f"{args.clients} students x {args.rounds} refreshes, {args.revoked} tokens on the blacklist")
+        print(f"{'mode':<6} {'refresh/s':>10} {'queries':>8} {'verify/s':>9} {'queries':>8}")
+        for mode, module in MODES.items():
+            with override_settings(REST_FRAMEWORK=rest_framework):
+                stats = run(users, args.rounds, module)
+            print(f"{mode:<6}", ' '.join(
+                f"{stats[endpoint]['requests'] / stats[endpoint]['seconds']:>{width}.0f} "
+                f"{stats[endpoint]['queries'] / stats[endpoint]['requests']:>8.1f}"
+                for endpoint, width in (('refresh', 10), ('verify', 9))
+            ))
+
+
+if __name__ == '__main__':
+    main()
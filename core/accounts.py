@@ -0,0 +1,54 @@
+"""
+Password set/reset links.
+
+Accounts created without a password (bulk imports) start with an unusable
+password, and their owners set one through the same flow as a forgotten
+password: POST /api/users/password-reset/ with the account email mails a
+link carrying a uid and a one-time token, and POST
+/api/users/password-reset/confirm/ with uid, token and the new password
+sets it. Tokens are Django's password reset tokens, so a link stops working
+once the password changes or after PASSWORD_RESET_TIMEOUT.
+"""
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import send_mass_mail
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import User
+
+SUBJECTS = {
+    'invite': "Set your SmartCanteen password",
+    'reset': "Reset your SmartCanteen password",
+}
+BODIES = {
+    'invite': "Hello {name},\n\nAn account was created for you. Set your password here:\n{link}\n",
+    'reset': "Hello {name},\n\nUse this link to set a new password:\n{link}\n\n"
+             "If you did not ask for it, ignore this email.\n",
+}
+
+
+def password_link(user):
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    return getattr(settings, 'PASSWORD_SET_URL', '/set-password/{uid}/{token}/').format(uid=uid, token=token)
+
+
+def send_password_links(users, kind='reset'):
+    """Mail each of `users` a password link, over one connection. Returns the number sent."""
+    messages = [
+        (SUBJECTS[kind], BODIES[kind].format(name=user.name or user.reg_number, link=password_link(user)),
+         None, [user.email])
+        for user in users if user.email
+    ]
+    return send_mass_mail(messages) if messages else 0
+
+
+def user_for_token(uid, token):
+    """The active user a password link was made for, or None if it is invalid or used up."""
+    try:
+        user = User.objects.get(pk=force_str(urlsafe_base64_decode(uid)), is_active=True)
+    except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+        return None
+    return user if default_token_generator.check_token(user, token) else None
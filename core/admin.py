@@ -1,9 +1,83 @@
+import io
+import pstats
+from functools import partial
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, MenuItem, Order, OrderItem, Payment, Notification, Inventory, Tag
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Prefetch, QuerySet
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.functional import cached_property
+from . import audit, profiling
+from .alerts import observe_inventory
+from .caching import bump_version
+from .orders import conditional_update, touch_orders
+from .outlets import menu_cache_scopes
+from .permissions import IsAdmin
+from .models import User, Outlet, MenuItem, Order, OrderItem, Payment, Notification, Inventory, Tag, InventoryForecast, ArchivedOrder, AuditEvent, OrderTicket
 
 # Register your models here.
 
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATED_COUNT_MIN = 10000
+
+
+def estimated_count(queryset):
+    """Row estimate from the database statistics, or None if the backend has none."""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+    elif connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Use the table statistics instead of COUNT(*) for unfiltered changelists on big tables."""
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_MIN:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables that grow without bound."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # skips the extra unfiltered COUNT(*) on filtered pages
+    list_per_page = 50
+
+
+class AuditedAdmin(admin.ModelAdmin):
+    """Logs edits of `audited_fields` made in the admin to the audit log."""
+    audited_fields = ()
+
+    def save_model(self, request, obj, form, change):
+        changed = [field for field in self.audited_fields if change and field in form.changed_data]
+        before = {field: form.initial.get(field) for field in changed}
+        super().save_model(request, obj, form, change)
+        events = [
+            audit.change(obj, obj.pk, field, before[field], getattr(obj, field), getattr(obj, 'outlet_id', None))
+            for field in changed
+        ]
+        for event in events:
+            event.actor_id = request.user.pk
+        audit.record(events, using=obj._state.db)
+
+
 #This class customizes how your User model appears and behaves inside the Django Admin Dashboard.
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -16,7 +90,7 @@ class CustomUserAdmin(UserAdmin):
         (None, {'fields': ('reg_number', 'password')}),
         ('Personal Info', {'fields': ('name', 'email', 'phone_number', 'gender', 'profile_picture')}),
         ('Permissions', {'fields': ('is_staff', 'is_active', 'is_superuser', 'groups', 'user_permissions')}),
-        ('Role Info', {'fields': ('role',)}),
+        ('Role Info', {'fields': ('role', 'outlet')}),
     )
 
     add_fieldsets = (
@@ -29,11 +103,72 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
-admin.site.register(MenuItem)
-admin.site.register(OrderItem)
-admin.site.register(Payment)
-admin.site.register(Notification)
-admin.site.register(Inventory)
+@admin.register(Outlet)
+class OutletAdmin(admin.ModelAdmin):
+    list_display = ('name', 'code', 'is_active', 'created_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'code')
+
+
+@admin.register(MenuItem)
+class MenuItemAdmin(AuditedAdmin):
+    audited_fields = ('price',)
+    list_display = ('name', 'outlet', 'price', 'availability', 'updated_at')
+    list_filter = ('availability', 'outlet')
+    list_select_related = ('outlet',)
+    search_fields = ('name',)  # needed for the menu_item autocomplete widgets
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Saving bumps the item's new menu (see core/caching.py); a moved item also leaves its old one
+        if change and 'outlet' in form.changed_data:
+            transaction.on_commit(partial(bump_version, *menu_cache_scopes(form.initial.get('outlet'))))
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ('id', 'order', 'menu_item', 'quantity', 'subtotal')
+    list_select_related = ('order__user', 'menu_item')
+    raw_id_fields = ('order',)
+    autocomplete_fields = ('menu_item',)
+
+
+@admin.register(Payment)
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ('id', 'order_id', 'payment_ref', 'amount', 'payment_method', 'payment_status', 'created_at')
+    list_filter = ('payment_status', 'payment_method')
+    search_fields = ('payment_ref',)
+    raw_id_fields = ('order',)
+    date_hierarchy = 'created_at'
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'timestamp', 'read_status')
+    list_filter = ('read_status',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(Inventory)
+class InventoryAdmin(AuditedAdmin):
+    audited_fields = ('quantity',)
+    list_display = ('menu_item', 'outlet', 'quantity', 'stock_level', 'threshold', 'updated_at')
+    list_filter = ('outlet',)
+    list_select_related = ('menu_item', 'outlet')
+    autocomplete_fields = ('menu_item',)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Like API edits: a count set to zero takes the item off the menu and invalidates it
+        if change and 'quantity' in form.changed_data:
+            observe_inventory(obj, form.initial['quantity'])
+
+@admin.register(InventoryForecast)
+class InventoryForecastAdmin(admin.ModelAdmin):
+    list_display = ('menu_item', 'outlet', 'weekday', 'expected_demand', 'suggested_stock_level', 'suggested_threshold', 'generated_at')
+    list_filter = ('weekday', 'outlet')
+    list_select_related = ('menu_item', 'outlet')
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -47,14 +182,128 @@ class TagAdmin(admin.ModelAdmin):
 class OrderItemInline(admin.TabularInline):  # or StackedInline
     model = OrderItem
     extra = 0  # don’t show extra empty rows by default
+    autocomplete_fields = ('menu_item',)  # instead of a <select> with the whole menu per row
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('menu_item')
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'status', 'created_at')
-    list_filter = ('status', 'created_at')
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'outlet', 'status', 'get_items', 'created_at')
+    list_filter = ('status', 'outlet')
+    list_select_related = ('user', 'outlet')
     search_fields = ('user__name',)
+    date_hierarchy = 'created_at'
+    autocomplete_fields = ('user',)
     inlines = [OrderItemInline]  # 👈 attaches items inside the order view
+    readonly_fields = ('version',)
+
+    def get_queryset(self, request):
+        # One extra query for the items of the whole page instead of one per row
+        items = OrderItem.objects.select_related('menu_item').only('order_id', 'quantity', 'menu_item__name')
+        return super().get_queryset(request).prefetch_related(Prefetch('items', queryset=items))
 
     def get_items(self, obj):
         return ", ".join([f"{i.menu_item.name} x{i.quantity}" for i in obj.items.all()])
-    get_items.short_description = "Ordered Items"
\ No newline at end of file
+    get_items.short_description = "Ordered Items"
+
+    def save_model(self, request, obj, form, change):
+        """
+        Edits go through conditional_update like the API's, so the order's
+        version (its ETag) moves, the kitchen board sees status changes,
+        cancellations return stock and status changes are audited.
+        """
+        if not change:
+            return super().save_model(request, obj, form, change)
+        changes = {field: getattr(obj, field) for field in form.changed_data}
+        if not changes:
+            return
+        using = obj._state.db
+        with transaction.atomic(using=using):
+            order = Order.objects.using(using).get(pk=obj.pk)
+            conditional_update(order, order.version, **changes)
+        obj.version, obj.updated_at = order.version, order.updated_at
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change and any(formset.has_changed() for formset in formsets):
+            # Item edits move the order to a new version too
+            touch_orders([form.instance.pk], form.instance._state.db)
+
+
+@admin.register(OrderTicket)
+class OrderTicketAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'outlet', 'status', 'order_id', 'created_at', 'processed_at')
+    list_filter = ('status', 'outlet')
+    list_select_related = ('user', 'outlet')
+    raw_id_fields = ('user',)
+    date_hierarchy = 'created_at'
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(LargeTableAdmin):
+    list_display = ('order_id', 'outlet', 'user', 'status', 'total_price', 'created_at', 'archived_at')
+    list_filter = ('status', 'outlet')
+    list_select_related = ('user', 'outlet')
+    search_fields = ('=order_id', 'user__name')
+    date_hierarchy = 'created_at'
+    raw_id_fields = ('user',)
+
+
+@admin.register(AuditEvent)
+class AuditEventAdmin(LargeTableAdmin):
+    """The audit log is append-only; the admin can only browse it."""
+    list_display = ('created_at', 'model', 'object_id', 'field', 'old_value', 'new_value', 'actor', 'outlet')
+    list_filter = ('model', 'field', 'outlet')
+    list_select_related = ('actor', 'outlet')
+    search_fields = ('=object_id',)
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# Request profiles (core/profiling.py) live on disk, not in a model
+def profile_list_view(request):
+    if not IsAdmin().has_permission(request, None):
+        raise PermissionDenied
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiling.recent_profiles(),
+        'hot': profiling.hot_functions(),
+    }
+    return TemplateResponse(request, 'admin/core/profiles.html', context)
+
+
+def profile_detail_view(request, name):
+    if not IsAdmin().has_permission(request, None):
+        raise PermissionDenied
+    loaded = profiling.load_profile(name)
+    if loaded is None:
+        raise Http404
+    profile, stats_path = loaded
+    if 'download' in request.GET:
+        return FileResponse(open(stats_path, 'rb'), as_attachment=True, filename=stats_path.name)
+    stream = io.StringIO()
+    pstats.Stats(str(stats_path), stream=stream).strip_dirs().sort_stats('cumulative').print_stats(40)
+    context = {
+        **admin.site.each_context(request),
+        'title': f"{profile['method']} {profile['path']}",
+        'profile': profile,
+        'stats': stream.getvalue(),
+    }
+    return TemplateResponse(request, 'admin/core/profile_detail.html', context)
+
+
+def profile_urls():
+    return [
+        path('', admin.site.admin_view(profile_list_view), name='profiles'),
+        path('<str:name>/', admin.site.admin_view(profile_detail_view), name='profile-detail'),
+    ]
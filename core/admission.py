@@ -0,0 +1,231 @@
+"""
+Admission control for order creation at peak times.
+
+With ORDER_QUEUE on, POST /api/order/ only validates the order and stores
+it as an OrderTicket (one INSERT, no stock or order locks), then answers
+202 with the ticket. Each worker feeds its tickets to `order_queue`, a
+bounded in-process queue drained by one background thread: it collects up
+to ORDER_QUEUE_BATCH_SIZE tickets for at most ORDER_QUEUE_BATCH_WINDOW
+seconds and places them in ticket order, in one transaction per outlet
+(orders, one bulk insert of all items, one stock update for the batch).
+So instead of hundreds of requests queueing on the same inventory row
+locks, each worker holds them for one short transaction per batch.
+
+When a worker's queue is full, new orders are turned away with 503 and
+Retry-After rather than piling up. Clients poll /api/order-tickets/<id>/
+and also get a notification (delivered by /api/sync/) once the order is
+placed. Tickets left queued by a restarted worker are picked up by the
+process_order_queue command, which can also run as a dedicated consumer.
+
+Consumers claim tickets before placing them: one conditional UPDATE moves
+them from 'queued' to 'processing' under a claim token, so a ticket is only
+ever placed by the consumer whose claim landed, however many drain the
+queue at once. Tickets stuck in 'processing' (a consumer died mid batch)
+are put back in the queue by process_order_queue after --reclaim seconds.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_time
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import audit
+from .alerts import InsufficientStock, decrement_stock, stock_transaction
+from .models import Notification, Order, OrderItem, OrderTicket
+from .outlets import database_for
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_FIELDS = ('total_price', 'pickup_time', 'items_data')
+
+
+class QueueFull(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many orders are waiting right now. Try again in a moment.'
+    default_code = 'order_queue_full'
+    wait = 5  # Sent as Retry-After
+
+
+def admit(validated_data, user, outlet=None):
+    """
+    Store a validated order as a queued ticket and hand it to the worker's
+    queue once committed. Raises QueueFull when the queue has no room.
+    """
+    if not order_queue.has_room():
+        raise QueueFull()
+    payload = {field: validated_data.get(field) for field in PAYLOAD_FIELDS}
+    payload['items_data'] = payload['items_data'] or []
+    ticket = OrderTicket.objects.create(
+        user=user, outlet=outlet, payload=json.loads(json.dumps(payload, cls=DjangoJSONEncoder)),
+    )
+    transaction.on_commit(lambda: order_queue.submit(ticket.id))
+    return ticket
+
+
+def _place(tickets, outlet_id):
+    """Place `tickets` (all for `outlet_id`) in one transaction."""
+    using = database_for(outlet_id)
+    now = timezone.now()
+    with stock_transaction(outlet_id) as taken:
+        orders = []
+        for ticket in tickets:
+            pickup_time = ticket.payload.get('pickup_time')
+            orders.append(Order.objects.create(
+                user_id=ticket.user_id, outlet_id=outlet_id, status='pending',
+                total_price=Decimal(str(ticket.payload['total_price'])),
+                pickup_time=parse_time(pickup_time) if pickup_time else None,
+            ))
+
+        ordered = Counter()
+        order_items = []
+        events = []
+        for ticket, order in zip(tickets, orders):
+            for item_data in ticket.payload['items_data']:
+                order_items.append(OrderItem(
+                    order=order,
+                    menu_item_id=item_data.get('menu_item_id'),
+                    quantity=item_data.get('quantity'),
+                    subtotal=item_data.get('subtotal'),
+                ))
+                ordered[item_data.get('menu_item_id')] += int(item_data.get('quantity'))
+            event = audit.change(Order, order.pk, 'status', None, order.status, outlet_id)
+            event.actor_id = ticket.user_id
+            events.append(event)
+            ticket.status, ticket.order_id, ticket.processed_at = 'placed', order.pk, now
+        OrderItem.objects.bulk_create(order_items)
+        # One stock update for the whole batch
+        decrement_stock(ordered, outlet_id=outlet_id)
+        taken.update(ordered)
+        audit.record(events, using=using)
+
+    # Tickets live in default, which commits before the outlet's database:
+    # only mark them placed once the orders are in
+    OrderTicket.objects.bulk_update(tickets, ['status', 'order_id', 'processed_at'])
+    Notification.objects.bulk_create([
+        Notification(user_id=ticket.user_id, message=f"Your order #{ticket.order_id} has been placed.")
+        for ticket in tickets
+    ])
+
+
+def _fail(ticket, error):
+    ticket.status, ticket.error, ticket.processed_at = 'failed', str(error), timezone.now()
+    ticket.save(update_fields=['status', 'error', 'processed_at'])
+    Notification.objects.create(user_id=ticket.user_id, message="Sorry, your order could not be placed. Please try again.")
+
+
+def claim_tickets(ticket_ids):
+    """Claim the still queued tickets among `ticket_ids` for this consumer; returns them, oldest first."""
+    claim = uuid.uuid4().hex
+    claimed = OrderTicket.objects.filter(id__in=ticket_ids, status='queued').update(
+        status='processing', claim=claim, claimed_at=timezone.now(),
+    )
+    if not claimed:
+        return []
+    return list(OrderTicket.objects.filter(claim=claim).order_by('id'))
+
+
+def release_stale_claims(older_than):
+    """Put tickets claimed before `older_than` and never finished back in the queue."""
+    return OrderTicket.objects.filter(status='processing', claimed_at__lt=older_than).update(
+        status='queued', claim='', claimed_at=None,
+    )
+
+
+def process_tickets(ticket_ids):
+    """
+    Claim and place the queued tickets among `ticket_ids`, oldest first.
+    Returns the number of tickets handled (placed or failed).
+    """
+    tickets = claim_tickets(ticket_ids)
+    by_outlet = {}
+    for ticket in tickets:
+        by_outlet.setdefault(ticket.outlet_id, []).append(ticket)
+
+    for outlet_id, batch in by_outlet.items():
+        try:
+            _place(batch, outlet_id)
+        except (DatabaseError, InsufficientStock, KeyError, TypeError, ValueError) as exc:
+            if len(batch) == 1:
+                logger.warning("Order ticket %s failed: %s", batch[0].id, exc)
+                _fail(batch[0], exc)
+                continue
+            # One bad ticket must not sink the batch: retry them one by one
+            for ticket in batch:
+                ticket.status, ticket.order_id, ticket.processed_at = 'processing', None, None
+                try:
+                    _place([ticket], outlet_id)
+                except (DatabaseError, InsufficientStock, KeyError, TypeError, ValueError) as exc:
+                    logger.warning("Order ticket %s failed: %s", ticket.id, exc)
+                    _fail(ticket, exc)
+    return len(tickets)
+
+
+class OrderQueue:
+    """Bounded per-worker queue of ticket ids, drained in micro-batches by a background thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+
+    def _get_queue(self):
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self._queue = queue.Queue(maxsize=getattr(settings, 'ORDER_QUEUE_MAX', 500))
+        return self._queue
+
+    def has_room(self):
+        if not getattr(settings, 'ORDER_QUEUE_ASYNC', True):
+            return True
+        return not self._get_queue().full()
+
+    def submit(self, ticket_id):
+        if not getattr(settings, 'ORDER_QUEUE_ASYNC', True):
+            process_tickets([ticket_id])
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='order-queue', daemon=True)
+                self._thread.start()
+        try:
+            self._get_queue().put_nowait(ticket_id)
+        except queue.Full:
+            # Admitted just as the queue filled up; process_order_queue picks it up
+            logger.warning("Order queue full, ticket %s left for process_order_queue", ticket_id)
+
+    def _run(self):
+        batch_size = getattr(settings, 'ORDER_QUEUE_BATCH_SIZE', 50)
+        window = getattr(settings, 'ORDER_QUEUE_BATCH_WINDOW', 0.05)
+        pending = self._get_queue()
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + window
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                process_tickets(batch)
+            except Exception:
+                logger.exception("Placing order tickets %s failed", batch)
+            close_old_connections()
+
+
+order_queue = OrderQueue()
@@ -0,0 +1,244 @@
+"""
+Low-stock alerting.
+
+Stock levels are only checked where they change: the order path locks the
+ordered items' inventory rows, refuses orders that exceed the stock left,
+takes the quantities out with a single UPDATE and hands the affected rows
+to the alert engine, so there is never a scan of the inventory table.
+Alerts are debounced through the cache and staff notifications are written
+with one bulk insert in the same transaction. The staff ids are cached for
+STOCK_ALERT_STAFF_TTL seconds, and dropped when a user is saved or deleted.
+
+Both live in the default cache. With the stock per-process cache each
+worker debounces on its own (a crossing can alert once per worker) and only
+the worker that saved a user drops its staff ids at once; the others pick
+up new or deactivated staff when the TTL runs out. Configure a shared cache
+to debounce across workers.
+"""
+
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from functools import partial, reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import audit
+from .caching import bump_version
+from .models import Inventory, MenuItem, Notification, User
+from .outlets import database_for, menu_cache_scopes, use_outlet
+
+StockChange = namedtuple(
+    'StockChange',
+    ['inventory_id', 'menu_item_id', 'menu_item_name', 'previous', 'quantity', 'threshold', 'outlet_id'],
+    defaults=[None],
+)
+
+
+class StockAlertEngine:
+    """Turns stock changes into debounced staff notifications."""
+
+    cache_prefix = 'stock-alert'
+    staff_cache_key = 'stock-alert-staff'
+
+    def __init__(self, debounce=None):
+        self._debounce = debounce
+
+    @property
+    def debounce(self):
+        if self._debounce is not None:
+            return self._debounce
+        return getattr(settings, 'STOCK_ALERT_DEBOUNCE', 15 * 60)
+
+    def observe(self, changes):
+        """
+        Inspect a batch of stock changes.
+
+        Items that reach zero are marked unavailable straight away (only
+        items of the outlet that ran out, shared items stay on); threshold
+        crossings raise at most one alert per inventory row and kind within
+        the debounce window. Returns the alerts that will be sent.
+        """
+        alerts = []
+        sold_out = []
+        scopes = set()
+        for change in changes:
+            ran_out = change.previous > 0 and change.quantity == 0
+            crossed = change.previous > change.threshold >= change.quantity
+            if ran_out:
+                if change.outlet_id is None:
+                    sold_out.append(Q(id=change.menu_item_id))
+                else:
+                    sold_out.append(Q(id=change.menu_item_id, outlet_id=change.outlet_id))
+                scopes.update(menu_cache_scopes(change.outlet_id))
+            if not (ran_out or crossed):
+                continue
+
+            kind = 'out' if ran_out else 'low'
+            key = f'{self.cache_prefix}:{change.inventory_id}:{kind}'
+            if cache.add(key, True, self.debounce):
+                alerts.append(change)
+
+        if sold_out:
+            if MenuItem.objects.filter(reduce(or_, sold_out), availability=True).update(
+                availability=False, updated_at=timezone.now()
+            ):
+                transaction.on_commit(partial(bump_version, *scopes))
+        if alerts:
+            self.notify(alerts)
+        return alerts
+
+    def message(self, change):
+        if change.quantity == 0:
+            return f"Out of stock: {change.menu_item_name} has sold out and was marked unavailable."
+        return (
+            f"Low stock: {change.menu_item_name} is down to {change.quantity} "
+            f"(threshold {change.threshold})."
+        )
+
+    def staff_ids(self):
+        staff_ids = cache.get(self.staff_cache_key)
+        if staff_ids is None:
+            staff_ids = list(
+                User.objects.filter(role__in=['staff', 'admin'], is_active=True).values_list('id', flat=True)
+            )
+            cache.set(self.staff_cache_key, staff_ids, getattr(settings, 'STOCK_ALERT_STAFF_TTL', 5 * 60))
+        return staff_ids
+
+    def notify(self, alerts):
+        """Write one notification per alert for every active staff/admin user."""
+        staff_ids = self.staff_ids()
+        notifications = [
+            Notification(user_id=user_id, message=self.message(change))
+            for change in alerts
+            for user_id in staff_ids
+        ]
+        Notification.objects.bulk_create(notifications, batch_size=500)
+
+
+stock_alerts = StockAlertEngine()
+
+
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, **kwargs):
+    cache.delete(StockAlertEngine.staff_cache_key)
+
+
+class InsufficientStock(ValidationError):
+    default_code = 'insufficient_stock'
+
+    def __str__(self):
+        return ' '.join(self.detail['items_data'])
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(menu_item_id=menu_item_id, then=Value(qty)) for menu_item_id, qty in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def decrement_stock(quantities, outlet_id=None):
+    """
+    Take `quantities` ({menu_item_id: quantity}) out of `outlet_id`'s
+    inventory (rows without an outlet when None).
+
+    The rows are locked and read in one statement, so the alert engine sees
+    the real previous quantities, and updated in one more. Raises
+    InsufficientStock, before changing anything, when an item has less left
+    than ordered; items without an inventory row are not tracked. Must run
+    inside a transaction. Returns the raised alerts.
+    """
+    quantities = {menu_item_id: int(qty) for menu_item_id, qty in quantities.items() if qty}
+    if not quantities:
+        return []
+
+    rows = list(
+        Inventory.objects.select_for_update(of=('self',))
+        .filter(menu_item_id__in=quantities, outlet_id=outlet_id)
+        .values_list('id', 'menu_item_id', 'menu_item__name', 'quantity', 'threshold')
+    )
+    if not rows:
+        return []
+    short = [
+        f"Only {quantity} {name} left." for _, menu_item_id, name, quantity, _ in rows
+        if quantity < quantities[menu_item_id]
+    ]
+    if short:
+        raise InsufficientStock({'items_data': short})
+
+    Inventory.objects.filter(id__in=[row[0] for row in rows]).update(
+        quantity=F('quantity') - _quantity_case(quantities), updated_at=timezone.now()
+    )
+
+    changes = [
+        StockChange(inventory_id, menu_item_id, name, quantity, quantity - quantities[menu_item_id], threshold, outlet_id)
+        for inventory_id, menu_item_id, name, quantity, threshold in rows
+    ]
+    audit.record([
+        audit.change(Inventory, change.inventory_id, 'quantity', change.previous, change.quantity, outlet_id)
+        for change in changes
+    ])
+    return stock_alerts.observe(changes)
+
+
+def restock(quantities, outlet_id=None):
+    """Put `quantities` back into `outlet_id`'s inventory, undoing a decrement_stock."""
+    quantities = {menu_item_id: int(qty) for menu_item_id, qty in quantities.items() if qty}
+    if not quantities:
+        return
+    with transaction.atomic():
+        rows = list(
+            Inventory.objects.select_for_update()
+            .filter(menu_item_id__in=quantities, outlet_id=outlet_id)
+            .values_list('id', 'menu_item_id', 'quantity')
+        )
+        Inventory.objects.filter(id__in=[row[0] for row in rows]).update(
+            quantity=F('quantity') + _quantity_case(quantities), updated_at=timezone.now()
+        )
+        audit.record([
+            audit.change(Inventory, inventory_id, 'quantity', quantity, quantity + quantities[menu_item_id], outlet_id)
+            for inventory_id, menu_item_id, quantity in rows
+        ])
+
+
+@contextmanager
+def stock_transaction(outlet):
+    """
+    Transaction for placing orders of `outlet` (an Outlet, an id or None).
+
+    The orders go to the outlet's database and the stock they take stays in
+    default. No transaction spans two databases, so default commits first
+    and the outlet's database after it. Callers add the stock they took to
+    the yielded Counter. If the orders then fail to commit, that stock is
+    put back, so a failed order never keeps stock.
+    """
+    using = database_for(outlet)
+    outlet_id = getattr(outlet, 'pk', outlet)
+    taken = Counter()
+    stock_committed = False
+    try:
+        with use_outlet(outlet), transaction.atomic(using=using):
+            with transaction.atomic(savepoint=False):
+                yield taken
+            stock_committed = using != DEFAULT_DB_ALIAS
+    except DatabaseError:
+        if stock_committed and taken:
+            restock(taken, outlet_id)
+        raise
+
+
+def observe_inventory(inventory, previous):
+    """Hook for direct edits of a single Inventory row (API or admin)."""
+    return stock_alerts.observe([
+        StockChange(inventory.id, inventory.menu_item_id, inventory.menu_item.name,
+                    previous, inventory.quantity, inventory.threshold, inventory.outlet_id)
+    ])
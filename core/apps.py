@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Registers the tombstone receivers used by /api/sync/, the tag index rebuilds, receipt rendering,
+        # the stock alert staff cache, the kitchen board and menu cache invalidation
+        from . import alerts, caching, kitchen, receipts, sync, tagindex  # noqa: F401
@@ -0,0 +1,120 @@
+"""
+Archival of finished orders.
+
+Completed and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are
+copied into ArchivedOrder (one row per order, items and payments inlined as
+JSON) and removed from the Order, OrderItem and Payment tables, one batch
+per transaction. The hot tables then only hold recent and in-flight orders.
+
+Every order database is archived (the default one and each outlet
+database), always into the archive table in `default`. For an outlet
+database the archive rows commit just before the orders are deleted; if the
+delete fails, the next run finds those orders already archived and only
+deletes them. The sync tombstones of a batch are written in one insert.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem, Payment, Tombstone
+from .outlets import shard_aliases
+from .sync import bulk_order_deletes, order_tombstones
+
+ARCHIVABLE_STATUSES = ['completed', 'cancelled']
+
+
+def _snapshot(order):
+    return ArchivedOrder(
+        order_id=order.id,
+        outlet_id=order.outlet_id,
+        user_id=order.user_id,
+        total_price=order.total_price,
+        status=order.status,
+        order_date=order.order_date,
+        pickup_time=order.pickup_time,
+        created_at=order.created_at,
+        updated_at=order.updated_at,
+        items=[
+            {
+                'id': item.id,
+                'menu_item_id': item.menu_item_id,
+                'menu_item_name': item.menu_item.name,
+                'price': str(item.menu_item.price),
+                'quantity': item.quantity,
+                'subtotal': str(item.subtotal),
+            }
+            for item in order.items.all()
+        ],
+        payments=[
+            {
+                'id': payment.id,
+                'payment_ref': payment.payment_ref,
+                'amount': str(payment.amount),
+                'payment_method': payment.payment_method,
+                'payment_status': payment.payment_status,
+                'receipt_url': payment.receipt_url,
+                'created_at': payment.created_at.isoformat(),
+            }
+            for payment in order.payment_set.all()
+        ],
+    )
+
+
+def archive_batch(cutoff, batch_size=500, using=DEFAULT_DB_ALIAS):
+    """
+    Archive up to `batch_size` finished orders of database `using` created
+    before `cutoff`. Returns the number moved.
+    """
+    with transaction.atomic(using=using), transaction.atomic(using=DEFAULT_DB_ALIAS):
+        orders = list(
+            Order.objects.using(using)
+            .filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff)
+            .order_by('created_at')
+            .select_for_update()[:batch_size]
+        )
+        if not orders:
+            return 0
+        ids = [order.id for order in orders]
+        prefetch_related_objects(orders, 'items__menu_item', 'payment_set')
+
+        # Orders a previous, interrupted run already archived are only deleted
+        archived = set(
+            ArchivedOrder.objects.filter(order_id__in=ids)
+            .values_list('order_id', 'outlet_id', 'created_at')
+        )
+        ArchivedOrder.objects.bulk_create([
+            _snapshot(order) for order in orders
+            if (order.id, order.outlet_id, order.created_at) not in archived
+        ])
+
+        Tombstone.objects.bulk_create(order_tombstones(orders))
+        Payment.objects.using(using).filter(order_id__in=ids).delete()
+        OrderItem.objects.using(using).filter(order_id__in=ids).delete()
+        with bulk_order_deletes():
+            Order.objects.using(using).filter(id__in=ids).delete()
+        return len(ids)
+
+
+def archive_orders(older_than_days=None, batch_size=500, max_batches=None):
+    """
+    Archive finished orders of every order database in batches until none
+    are left (or `max_batches` ran per database).
+    """
+    if older_than_days is None:
+        older_than_days = getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 90)
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    total = 0
+    for using in [DEFAULT_DB_ALIAS, *sorted(shard_aliases())]:
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            moved = archive_batch(cutoff, batch_size, using=using)
+            if not moved:
+                break
+            total += moved
+            batches += 1
+    return total
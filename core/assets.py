@@ -0,0 +1,125 @@
+"""
+Production serving of static and media files.
+
+collectstatic writes content-hashed copies of every static file (Django's
+manifest storage) plus precompressed .gz, and .br when the optional
+`brotli` package is installed. `serve_file` then sends the best variant the
+client accepts, with long-lived immutable caching for hashed names and
+Last-Modified based revalidation for everything else.
+"""
+
+import gzip
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.svg', '.txt', '.html', '.json', '.xml', '.ico'}
+# Manifest storage inserts a 12 character md5 hash: base.4f3c1c9d5e2a.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _compress(path):
+    data = path.read_bytes()
+    if len(data) < 256:
+        return
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        # Only keep variants that are meaningfully smaller
+        if len(compressed) < len(data) * 0.95:
+            path.with_name(path.name + suffix).write_bytes(compressed)
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes .gz/.br siblings for text assets."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if not isinstance(processed, Exception):
+                processed_names.update(n for n in (name, hashed_name) if n)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for name in processed_names:
+            if Path(name).suffix.lower() in COMPRESSIBLE_EXTENSIONS:
+                _compress(Path(self.path(name)))
+
+
+def _accepts(request, encoding):
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for token in accepted.split(','):
+        name, _, params = token.strip().partition(';')
+        if name.strip() == encoding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0')
+    return False
+
+
+def serve_file(request, path, document_root, max_age=3600):
+    """Serve `path` from `document_root`, preferring precompressed variants."""
+    try:
+        fullpath = Path(safe_join(document_root, path))
+    except SuspiciousFileOperation:
+        raise Http404('File not found.')
+    if not fullpath.is_file():
+        raise Http404('File not found.')
+
+    stat = fullpath.stat()
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    served, content_encoding = fullpath, None
+    for suffix, encoding in (('.br', 'br'), ('.gz', 'gzip')):
+        candidate = fullpath.with_name(fullpath.name + suffix)
+        if _accepts(request, encoding) and candidate.is_file():
+            served, content_encoding = candidate, encoding
+            break
+
+    response = FileResponse(
+        served.open('rb'), content_type=content_type or 'application/octet-stream', filename=fullpath.name
+    )
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if HASHED_NAME.search(fullpath.name):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = f'public, max-age={max_age}'
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    if fullpath.suffix.lower() in COMPRESSIBLE_EXTENSIONS:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def file_urlpatterns():
+    """URL patterns for serving static and media files without DEBUG."""
+    from django.urls import re_path
+
+    patterns = []
+    for prefix, root, max_age in (
+        (settings.STATIC_URL, settings.STATIC_ROOT, getattr(settings, 'STATIC_MAX_AGE', 3600)),
+        (settings.MEDIA_URL, settings.MEDIA_ROOT, getattr(settings, 'MEDIA_MAX_AGE', 86400)),
+    ):
+        patterns.append(re_path(
+            r'^%s(?P<path>.*)$' % re.escape(prefix.lstrip('/')),
+            serve_file,
+            {'document_root': root, 'max_age': max_age},
+        ))
+    return patterns
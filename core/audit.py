@@ -0,0 +1,200 @@
+"""
+Audit log: who changed an order's status, a menu price or a stock count.
+
+Write paths describe their changes with `change(...)` and hand them to
+`record`, which stamps the acting user and defers everything to
+`transaction.on_commit`, so rolled back changes leave no trace and the write
+itself pays nothing. Committed events are buffered for the rest of the
+request by AuditMiddleware and written once the response is ready, with a
+single bulk_create (outside a request they are written at commit).
+
+AUDIT_LOG_SINKS picks where events go: 'database' (AuditEvent rows, which
+the order timeline and prep-time endpoints read) and/or 'file', appending
+NDJSON lines to AUDIT_LOG_FILE, rotated at AUDIT_LOG_MAX_BYTES.
+"""
+
+import json
+import logging
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import partial
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+_request = ContextVar('audit_request', default=None)
+_buffer = ContextVar('audit_buffer', default=None)
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def change(model, object_id, field, old, new, outlet_id=None):
+    """An unsaved AuditEvent; `model` is a model class or instance."""
+    return AuditEvent(
+        model=model._meta.model_name, object_id=object_id, field=field,
+        old_value=_text(old), new_value=_text(new), outlet_id=outlet_id, created_at=timezone.now(),
+    )
+
+
+def record(events, using=DEFAULT_DB_ALIAS):
+    """
+    Log `events` once the transaction on `using` (the database the change
+    was written to) commits. Events that do not change anything are dropped.
+    """
+    events = [event for event in events if event.old_value != event.new_value]
+    if not events:
+        return
+    request = _request.get()
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        for event in events:
+            event.actor_id = event.actor_id or user.pk
+    transaction.on_commit(partial(_committed, events), using=using)
+
+
+def _committed(events):
+    buffer = _buffer.get()
+    if buffer is not None:
+        buffer.extend(events)
+    else:
+        write(events)
+
+
+class NDJSONSink:
+    """Appends events as JSON lines to a size-rotated local file."""
+
+    def __init__(self):
+        self._logger = None
+
+    def _get_logger(self):
+        if self._logger is None:
+            path = Path(getattr(settings, 'AUDIT_LOG_FILE', Path(settings.BASE_DIR) / 'logs' / 'audit.ndjson'))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=getattr(settings, 'AUDIT_LOG_MAX_BYTES', 50 * 1024 * 1024),
+                backupCount=getattr(settings, 'AUDIT_LOG_BACKUPS', 10), encoding='utf-8',
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger = logging.getLogger(f'{__name__}.events')
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(handler)
+        return self._logger
+
+    def write(self, events):
+        lines = [
+            json.dumps({
+                'model': event.model, 'object_id': event.object_id, 'field': event.field,
+                'old': event.old_value, 'new': event.new_value, 'actor': event.actor_id,
+                'outlet': event.outlet_id, 'at': event.created_at.isoformat(),
+            })
+            for event in events
+        ]
+        # One record per batch, so a batch is never split by a rotation
+        self._get_logger().info('\n'.join(lines))
+
+
+file_sink = NDJSONSink()
+
+
+def write(events):
+    sinks = getattr(settings, 'AUDIT_LOG_SINKS', ['database'])
+    if 'database' in sinks:
+        AuditEvent.objects.bulk_create(events, batch_size=500)
+    if 'file' in sinks:
+        file_sink.write(events)
+
+
+class AuditMiddleware:
+    """Collects the request's committed audit events and writes them in one go."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_token, buffer_token = _request.set(request), _buffer.set([])
+        try:
+            return self.get_response(request)
+        finally:
+            events = _buffer.get()
+            _request.reset(request_token)
+            _buffer.reset(buffer_token)
+            if events:
+                try:
+                    write(events)
+                except Exception:
+                    # The changes themselves are committed; losing their log must not fail the request
+                    logger.exception("Writing %d audit events failed", len(events))
+
+
+def order_timeline(order):
+    """Status history of `order`, oldest first."""
+    # Order ids are only unique per database; the outlet tells them apart
+    return (
+        AuditEvent.objects
+        .filter(model='order', object_id=order.id, outlet_id=order.outlet_id)
+        .select_related('actor')
+        .order_by('created_at', 'id')
+    )
+
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of the sorted list `values`."""
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+def _summary(durations):
+    durations = sorted(durations)
+    return {
+        'orders': len(durations),
+        'mean_seconds': round(sum(durations) / len(durations), 1),
+        'p50_seconds': _percentile(durations, 0.5),
+        'p90_seconds': _percentile(durations, 0.9),
+        'max_seconds': durations[-1],
+    }
+
+
+def prep_times(start, end, outlet_id=None):
+    """
+    Kitchen prep-time metrics for orders confirmed in [start, end): the time
+    from 'confirmed' to 'ready', overall and by hour of day (local time) of
+    the confirmation, for capacity planning.
+    """
+    events = AuditEvent.objects.filter(
+        model='order', field='status', new_value__in=['confirmed', 'ready'],
+        # Orders confirmed just before `end` may only be ready a little later
+        created_at__gte=start, created_at__lt=end + timedelta(days=1),
+    )
+    if outlet_id is not None:
+        events = events.filter(outlet_id=outlet_id)
+
+    confirmed, ready = {}, {}
+    for object_id, order_outlet, new_value, at in events.order_by('created_at').values_list(
+        'object_id', 'outlet_id', 'new_value', 'created_at'
+    ).iterator(chunk_size=2000):
+        target = confirmed if new_value == 'confirmed' else ready
+        target.setdefault((order_outlet, object_id), at)
+
+    by_hour = {}
+    for key, confirmed_at in confirmed.items():
+        if confirmed_at >= end or key not in ready or ready[key] < confirmed_at:
+            continue
+        duration = round((ready[key] - confirmed_at).total_seconds())
+        by_hour.setdefault(timezone.localtime(confirmed_at).hour, []).append(duration)
+
+    durations = [duration for hour in by_hour.values() for duration in hour]
+    if not durations:
+        return {'orders': 0, 'by_hour': []}
+    return {
+        **_summary(durations),
+        'by_hour': [{'hour': hour, **_summary(by_hour[hour])} for hour in sorted(by_hour)],
+    }
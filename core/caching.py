@@ -0,0 +1,149 @@
+"""
+Read caching and request coalescing for public endpoints.
+
+Public list/detail responses (menu, tags) are cached per URL under a
+versioned key; any write bumps the version, which drops every cached page
+of that scope at once. Menu items saved or deleted outside the API (admin,
+scripts) bump their menu scopes through model signals once they commit.
+When the cache is cold, concurrent identical requests in the same worker
+are coalesced: one thread runs the query and the others wait for its result
+instead of hitting the database themselves.
+"""
+
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.response import Response
+
+from .models import MenuItem
+from .outlets import menu_cache_scopes
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result."""
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            if call.event.wait(self.timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # The leader is stuck; do the work ourselves rather than fail
+            return fn()
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+single_flight = SingleFlight()
+
+
+def _version_key(scope):
+    return f'api-cache:{scope}:version'
+
+
+def get_version(scope):
+    return cache.get_or_set(_version_key(scope), 1, None)
+
+
+def bump_version(*scopes):
+    """Invalidate every cached response of the given scopes."""
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.set(_version_key(scope), 2, None)
+
+
+class CachedReadMixin:
+    """
+    Cache `list` and `retrieve` for viewsets whose responses do not depend on
+    the requesting user. Writes through the viewset bump `cache_scopes`.
+    """
+
+    cache_scopes = ()
+
+    def get_cache_scopes(self):
+        """Scopes the cached responses of this request depend on; the first one names the key."""
+        return self.cache_scopes
+
+    def get_invalidation_scopes(self, instance):
+        """Scopes to bump after `instance` was written through this viewset."""
+        return self.cache_scopes
+
+    def cache_key(self, request):
+        scopes = self.get_cache_scopes()
+        versions = '.'.join(str(get_version(scope)) for scope in scopes)
+        return f'api-cache:{scopes[0]}:{versions}:{request.get_host()}{request.get_full_path()}'
+
+    def cached_response(self, request, render):
+        key = self.cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            def load():
+                cached = cache.get(key)
+                if cached is None:
+                    response = render()
+                    cached = (response.status_code, response.data)
+                    if response.status_code == 200:
+                        cache.set(key, cached, getattr(settings, 'API_CACHE_TTL', 60))
+                return cached
+            cached = single_flight.do(key, load)
+
+        status_code, data = cached
+        return Response(data, status=status_code)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedReadMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedReadMixin, self).retrieve(request, *args, **kwargs))
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        bump_version(*self.get_invalidation_scopes(serializer.instance))
+
+    def perform_update(self, serializer):
+        # An item moved between outlets leaves one menu and joins another
+        before = self.get_invalidation_scopes(serializer.instance)
+        super().perform_update(serializer)
+        bump_version(*before, *self.get_invalidation_scopes(serializer.instance))
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        bump_version(*self.get_invalidation_scopes(instance))
+
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def _menu_item_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_version, *menu_cache_scopes(instance.outlet_id)), using=instance._state.db)
@@ -0,0 +1,313 @@
+"""
+Demand forecasting for inventory restock planning.
+
+Historical OrderItem quantities are aggregated per menu item, outlet and
+hour by each order database, streamed back in time order (merged across the
+outlet databases and the archive of old orders, see core/archive.py) and
+folded into a (menu item and outlet, weekday, hour) demand grid. The grid is smoothed with either an exponentially weighted
+average or a moving average over the last few weeks, and turned into
+suggested stock levels and thresholds stored in InventoryForecast. Each
+outlet's stock is forecast from its own orders, like decrement_stock takes
+it out; rows without an outlet go with orders without one.
+
+numpy is imported by the forecaster itself, so serving requests (which only
+read the stored forecasts) does not pay for loading it.
+"""
+
+import heapq
+import math
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ArchivedOrder, Inventory, InventoryForecast, MenuItem, OrderItem
+from .outlets import shard_aliases
+
+WEEKDAYS = 7
+HOURS = 24
+
+METHODS = ('ewma', 'sma')
+
+
+def stream_hourly_demand(since=None, chunk_size=2000, using=DEFAULT_DB_ALIAS, until=None):
+    """
+    Yield ((menu_item_id, outlet_id), hour, quantity) rows of the orders in
+    database `using` placed from `since` and before `until`, ordered by hour.
+
+    The grouping happens in SQL so years of history arrive as one row per
+    item, outlet and hour instead of one row per order line.
+    """
+    queryset = OrderItem.objects.using(using).exclude(order__status='cancelled')
+    if since is not None:
+        queryset = queryset.filter(order__created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(order__created_at__lt=until)
+
+    queryset = (
+        queryset
+        .annotate(hour=TruncHour('order__created_at'))
+        .values_list('menu_item_id', 'order__outlet_id', 'hour')
+        .annotate(total=Sum('quantity'))
+        .order_by('hour')
+    )
+    for menu_item_id, outlet_id, hour, total in queryset.iterator(chunk_size=chunk_size):
+        yield (menu_item_id, outlet_id), hour, total
+
+
+def stream_archived_demand(since=None, chunk_size=2000, until=None):
+    """
+    Like stream_hourly_demand, for archived orders. Their items are JSON, so
+    the hours are summed here, one hour at a time as the orders stream in.
+    """
+    queryset = ArchivedOrder.objects.exclude(status='cancelled')
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+
+    current, totals = None, Counter()
+    for outlet_id, created_at, items in (
+        queryset.order_by('created_at').values_list('outlet_id', 'created_at', 'items').iterator(chunk_size=chunk_size)
+    ):
+        # Same hours as TruncHour in the current time zone
+        hour = timezone.localtime(created_at).replace(minute=0, second=0, microsecond=0)
+        if hour != current:
+            yield from ((key, current, total) for key, total in totals.items())
+            current, totals = hour, Counter()
+        for item in items:
+            totals[item['menu_item_id'], outlet_id] += item['quantity']
+    yield from ((key, current, total) for key, total in totals.items())
+
+
+def stream_demand(since=None, chunk_size=2000, until=None):
+    """stream_hourly_demand over every order database and the archive, merged in hour order."""
+    aliases = [DEFAULT_DB_ALIAS, *sorted(shard_aliases())]
+    streams = [stream_hourly_demand(since, chunk_size, using=alias, until=until) for alias in aliases]
+    streams.append(stream_archived_demand(since, chunk_size, until=until))
+    return heapq.merge(*streams, key=lambda row: row[1])
+
+
+class DemandForecaster:
+    """
+    Streaming weekday/hour demand model.
+
+    `keys` are the (menu item, outlet) pairs to forecast. Rows are
+    accumulated into a single day buffer; whenever the date changes the
+    buffer is folded into the per-weekday state for every key at once, so
+    memory stays at O(keys x 7 x 24) however long the history is. Days
+    without any orders are folded in as zero demand.
+    """
+
+    def __init__(self, keys, method='ewma', alpha=0.3, window=4):
+        if method not in METHODS:
+            raise ValueError(f"Unknown forecasting method '{method}'.")
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1].")
+        if window < 1:
+            raise ValueError("window must be at least 1.")
+
+        import numpy as np
+
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.method = method
+        self.alpha = alpha
+        self.window = window
+
+        size = len(self.keys)
+        self.level = np.zeros((size, WEEKDAYS, HOURS))
+        self.weeks_seen = np.zeros(WEEKDAYS, dtype=np.int64)
+        if method == 'sma':
+            # Ring buffer holding the last `window` occurrences of each weekday
+            self.history = np.zeros((window, size, WEEKDAYS, HOURS))
+
+        self._day = np.zeros((size, HOURS))
+        self._date = None
+
+    def feed(self, rows):
+        for key, hour, quantity in rows:
+            column = self.index.get(key)
+            if column is None:
+                continue
+            self._advance_to(hour.date())
+            self._day[column, hour.hour] += quantity
+        return self
+
+    def finish(self, until=None):
+        """Close the current day and pad with empty days up to `until` (exclusive)."""
+        if self._date is not None:
+            self._close_day()
+            if until is not None:
+                while self._date < until:
+                    self._close_day()
+
+        if self.method == 'sma':
+            import numpy as np
+
+            filled = np.minimum(self.weeks_seen, self.window)
+            totals = self.history.sum(axis=0)
+            self.level = np.divide(
+                totals, filled[None, :, None],
+                out=np.zeros_like(totals), where=filled[None, :, None] > 0
+            )
+        return self
+
+    def _advance_to(self, date):
+        if self._date is None:
+            self._date = date
+            return
+        while self._date < date:
+            self._close_day()
+
+    def _close_day(self):
+        weekday = self._date.weekday()
+        if self.method == 'ewma':
+            if self.weeks_seen[weekday] == 0:
+                self.level[:, weekday, :] = self._day
+            else:
+                self.level[:, weekday, :] *= 1 - self.alpha
+                self.level[:, weekday, :] += self.alpha * self._day
+        else:
+            slot = self.weeks_seen[weekday] % self.window
+            self.history[slot, :, weekday, :] = self._day
+
+        self.weeks_seen[weekday] += 1
+        self._day[:] = 0
+        self._date += timedelta(days=1)
+
+    def suggestions(self, safety=0.2, lead_hours=2):
+        """
+        Return (daily_demand, peak_hour, stock_level, threshold) arrays shaped (keys, 7).
+
+        The stock level covers a full day of expected demand plus the safety
+        margin; the threshold covers the busiest `lead_hours` stretch of the
+        day so a restock triggered at the threshold lands before stock runs out.
+        """
+        import numpy as np
+
+        lead_hours = max(1, min(lead_hours, HOURS))
+        daily = self.level.sum(axis=2)
+
+        cumulative = np.concatenate(
+            [np.zeros(self.level.shape[:2] + (1,)), np.cumsum(self.level, axis=2)], axis=2
+        )
+        windows = cumulative[:, :, lead_hours:] - cumulative[:, :, :-lead_hours]
+        peak_hour = windows.argmax(axis=2)
+
+        stock_level = np.ceil(daily * (1 + safety))
+        threshold = np.ceil(windows.max(axis=2) * (1 + safety))
+        return daily, peak_hour, stock_level, threshold
+
+
+def target_date():
+    """Forecasts are applied for the next trading day by default."""
+    return timezone.localdate() + timedelta(days=1)
+
+
+def run_forecast(method='ewma', alpha=0.3, window=4, safety=0.2, lead_hours=2,
+                 history_days=None, apply=False, chunk_size=2000):
+    """
+    Rebuild InventoryForecast from order history, for every menu item
+    without an outlet and for every outlet's inventory rows.
+
+    When `apply` is set the suggestions for the next trading day are also
+    written to Inventory.stock_level and Inventory.threshold.
+    Returns the number of forecast rows written.
+    """
+    keys = {(menu_item_id, None) for menu_item_id in MenuItem.objects.values_list('id', flat=True)}
+    keys.update(Inventory.objects.values_list('menu_item_id', 'outlet_id'))
+    if not keys:
+        return 0
+    keys = sorted(keys, key=lambda key: (key[0], key[1] or 0))
+
+    since = None
+    if history_days:
+        since = timezone.now() - timedelta(days=history_days)
+
+    # Only complete days: today so far would count as a whole, slow day
+    today = timezone.localdate()
+    start_of_today = timezone.make_aware(datetime.combine(today, time.min))
+
+    forecaster = DemandForecaster(keys, method=method, alpha=alpha, window=window)
+    forecaster.feed(stream_demand(since=since, chunk_size=chunk_size, until=start_of_today))
+    forecaster.finish(until=today)
+    daily, peak_hour, stock_level, threshold = forecaster.suggestions(safety, lead_hours)
+
+    forecasts = [
+        InventoryForecast(
+            menu_item_id=menu_item_id,
+            outlet_id=outlet_id,
+            weekday=weekday,
+            expected_demand=round(float(daily[i, weekday]), 2),
+            peak_hour=int(peak_hour[i, weekday]),
+            suggested_stock_level=int(stock_level[i, weekday]),
+            suggested_threshold=int(threshold[i, weekday]),
+        )
+        for i, (menu_item_id, outlet_id) in enumerate(keys)
+        for weekday in range(WEEKDAYS)
+    ]
+
+    with transaction.atomic():
+        # A full rebuild; upserts cannot match the rows without an outlet (NULL is never a conflict)
+        InventoryForecast.objects.all().delete()
+        InventoryForecast.objects.bulk_create(forecasts, batch_size=500)
+        if apply:
+            apply_forecast(target_date().weekday())
+
+    return len(forecasts)
+
+
+def apply_forecast(weekday):
+    """Copy the suggestions for `weekday` onto the Inventory rows of the same item and outlet."""
+    suggestions = {
+        (forecast.menu_item_id, forecast.outlet_id): forecast
+        for forecast in InventoryForecast.objects.filter(weekday=weekday)
+    }
+    inventories = [
+        inventory for inventory in Inventory.objects.filter(menu_item_id__in={key[0] for key in suggestions})
+        if (inventory.menu_item_id, inventory.outlet_id) in suggestions
+    ]
+    for inventory in inventories:
+        forecast = suggestions[inventory.menu_item_id, inventory.outlet_id]
+        inventory.stock_level = forecast.suggested_stock_level
+        inventory.threshold = forecast.suggested_threshold
+    Inventory.objects.bulk_update(inventories, ['stock_level', 'threshold'], batch_size=500)
+    return len(inventories)
+
+
+def restock_report(date=None, outlet=None):
+    """Compare current inventory (of `outlet`, or all of it) against the forecast for `date`'s weekday."""
+    date = date or target_date()
+    forecasts = InventoryForecast.objects.filter(weekday=date.weekday())
+    inventories = Inventory.objects.select_related('menu_item').order_by('menu_item__name')
+    if outlet is not None:
+        forecasts, inventories = forecasts.filter(outlet=outlet), inventories.filter(outlet=outlet)
+    forecasts = {(forecast.menu_item_id, forecast.outlet_id): forecast for forecast in forecasts}
+
+    report = []
+    for inventory in inventories:
+        forecast = forecasts.get((inventory.menu_item_id, inventory.outlet_id))
+        suggested_stock = forecast.suggested_stock_level if forecast else inventory.stock_level
+        suggested_threshold = forecast.suggested_threshold if forecast else inventory.threshold
+        report.append({
+            'inventory_id': inventory.id,
+            'outlet': inventory.outlet_id,
+            'menu_item': inventory.menu_item_id,
+            'menu_item_name': inventory.menu_item.name,
+            'quantity': inventory.quantity,
+            'stock_level': inventory.stock_level,
+            'threshold': inventory.threshold,
+            'expected_demand': forecast.expected_demand if forecast else None,
+            'peak_hour': forecast.peak_hour if forecast else None,
+            'suggested_stock_level': suggested_stock,
+            'suggested_threshold': suggested_threshold,
+            'restock_quantity': max(0, math.ceil(suggested_stock - inventory.quantity)),
+            'below_threshold': inventory.quantity <= suggested_threshold,
+        })
+
+    report.sort(key=lambda row: row['restock_quantity'], reverse=True)
+    return {'date': date, 'weekday': date.strftime('%A'), 'items': report}
@@ -0,0 +1,273 @@
+"""
+Kitchen display board.
+
+Keeps a per-process tally of what still has to be cooked, i.e. OrderItem
+quantities per menu item and pickup time across confirmed/preparing orders,
+one tally per outlet (read from the outlet's order database) plus one for
+orders without an outlet. A tally is loaded with one grouped query and then
+kept current by the order status events from core/orders.py, so polling the
+board normally costs no queries at all. The board for all outlets adds up
+the outlet tallies.
+
+Each worker only sees its own events directly. To pick up changes made by
+other workers, every event bumps the outlet's generation counter in the
+cache and a worker that notices a generation it did not produce reloads the
+tally; with the default per-process cache this falls back to the
+KITCHEN_BOARD_TTL. Edited order items (saved rows, items deleted through
+the API) throw the tallies of their database away.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import MenuItem, OrderItem
+from .outlets import database_for, outlets
+
+ACTIVE_STATUSES = ('confirmed', 'preparing')
+
+
+def _window_start(pickup_time, minutes):
+    if pickup_time is None:
+        return None
+    minute_of_day = pickup_time.hour * 60 + pickup_time.minute
+    start = minute_of_day - minute_of_day % minutes
+    return f"{start // 60:02d}:{start % 60:02d}"
+
+
+def _window_end(start, minutes):
+    if start is None:
+        return None
+    hours, mins = map(int, start.split(':'))
+    end = min(hours * 60 + mins + minutes, 24 * 60)
+    return f"{end // 60:02d}:{end % 60:02d}"
+
+
+def _render(tally, names, window_minutes):
+    """(etag, payload) for `tally` ({(pickup_time, menu_item_id): quantity}) grouped by pickup window."""
+    windows = defaultdict(lambda: defaultdict(int))
+    for (pickup_time, menu_item_id), quantity in tally.items():
+        windows[_window_start(pickup_time, window_minutes)][menu_item_id] += quantity
+
+    # Orders without a pickup time are wanted as soon as possible
+    ordered = sorted(windows, key=lambda start: (start is not None, start or ''))
+    payload = {
+        'generated_at': timezone.now(),
+        'window_minutes': window_minutes,
+        'windows': [
+            {
+                'window_start': start,
+                'window_end': _window_end(start, window_minutes),
+                'items': sorted(
+                    (
+                        {'menu_item': menu_item_id, 'name': names.get(menu_item_id), 'quantity': quantity}
+                        for menu_item_id, quantity in windows[start].items()
+                    ),
+                    key=lambda item: -item['quantity'],
+                ),
+            }
+            for start in ordered
+        ],
+    }
+    # Hash the content rather than the revision so every worker agrees on the tag
+    digest = hashlib.md5(json.dumps(payload['windows'], sort_keys=True).encode()).hexdigest()
+    return f'"{digest}"', payload
+
+
+class KitchenBoard:
+    """The tally of one outlet's orders (`outlet_id` None: orders without an outlet)."""
+
+    def __init__(self, outlet_id=None):
+        self.outlet_id = outlet_id
+        self.generation_key = f'kitchen-board:{outlet_id or "-"}:generation'
+        self._lock = threading.Lock()
+        self._tally = None
+        self._names = {}
+        self._generation = None
+        self._loaded_at = 0
+        self._rendered = {}
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'KITCHEN_BOARD_TTL', 30)
+
+    def _shared_generation(self):
+        return cache.get_or_set(self.generation_key, 0, None)
+
+    def _bump_generation(self):
+        try:
+            return cache.incr(self.generation_key)
+        except ValueError:
+            cache.add(self.generation_key, 0, None)
+            return cache.incr(self.generation_key)
+
+    def _items(self):
+        return OrderItem.objects.using(database_for(self.outlet_id)).filter(order__outlet_id=self.outlet_id)
+
+    def _learn_names(self, menu_item_ids):
+        # Menu items stay in default, so no join from an outlet database
+        missing = set(menu_item_ids) - self._names.keys()
+        if missing:
+            self._names.update(MenuItem.objects.filter(id__in=missing).values_list('id', 'name'))
+
+    def _load(self):
+        tally = defaultdict(int)
+        generation = self._shared_generation()
+        rows = (
+            self._items().filter(order__status__in=ACTIVE_STATUSES)
+            .values_list('order__pickup_time', 'menu_item_id')
+            .annotate(total=Sum('quantity'))
+            .order_by()
+        )
+        for pickup_time, menu_item_id, total in rows:
+            tally[(pickup_time, menu_item_id)] += total
+        self._names = {}
+        self._learn_names(menu_item_id for _, menu_item_id in tally)
+        self._tally = tally
+        self._generation = generation
+        self._loaded_at = time.monotonic()
+        self._changed()
+
+    def _changed(self):
+        self._rendered = {}
+
+    def _is_stale(self):
+        if self._tally is None:
+            return True
+        if time.monotonic() - self._loaded_at > self.ttl:
+            return True
+        return self._shared_generation() != self._generation
+
+    def invalidate(self):
+        with self._lock:
+            self._tally = None
+        self._bump_generation()
+
+    def orders_changed(self, before, after):
+        """
+        Apply order events to the tally.
+
+        `before` and `after` map order ids to (status, pickup_time) as they
+        were before and after the change. Only orders entering, leaving or
+        moving within the active statuses affect the board.
+        """
+        removed = {}
+        added = {}
+        for order_id, (status, pickup_time) in before.items():
+            new_status, new_pickup_time = after.get(order_id, (None, None))
+            was_active = status in ACTIVE_STATUSES
+            is_active = new_status in ACTIVE_STATUSES
+            if was_active and (not is_active or pickup_time != new_pickup_time):
+                removed[order_id] = pickup_time
+            if is_active and (not was_active or pickup_time != new_pickup_time):
+                added[order_id] = new_pickup_time
+        if not removed and not added:
+            return
+
+        with self._lock:
+            if self._tally is not None:
+                rows = list(
+                    self._items().filter(order_id__in=set(removed) | set(added))
+                    .values_list('order_id', 'menu_item_id')
+                    .annotate(total=Sum('quantity'))
+                    .order_by()
+                )
+                self._learn_names(menu_item_id for _, menu_item_id, _ in rows)
+                for order_id, menu_item_id, total in rows:
+                    if order_id in removed:
+                        key = (removed[order_id], menu_item_id)
+                        self._tally[key] -= total
+                        if self._tally[key] <= 0:
+                            del self._tally[key]
+                    if order_id in added:
+                        self._tally[(added[order_id], menu_item_id)] += total
+                self._changed()
+
+            generation = self._bump_generation()
+            if self._generation is not None and generation == self._generation + 1:
+                # Nobody else changed the board since we last looked
+                self._generation = generation
+            else:
+                self._tally = None
+
+    def current(self):
+        """A copy of the up to date tally and the item names."""
+        with self._lock:
+            if self._is_stale():
+                self._load()
+            return dict(self._tally), dict(self._names)
+
+    def snapshot(self, window_minutes=15):
+        """Return (etag, payload) with quantities grouped by pickup window."""
+        with self._lock:
+            if self._is_stale():
+                self._load()
+            if window_minutes not in self._rendered:
+                self._rendered[window_minutes] = _render(self._tally, self._names, window_minutes)
+            return self._rendered[window_minutes]
+
+
+class KitchenBoards:
+    """The boards of every outlet of this process, created on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards = {}
+
+    def board(self, outlet_id=None):
+        with self._lock:
+            if outlet_id not in self._boards:
+                self._boards[outlet_id] = KitchenBoard(outlet_id)
+            return self._boards[outlet_id]
+
+    def reset(self):
+        with self._lock:
+            self._boards.clear()
+
+    def _outlet_ids(self):
+        return [None, *(outlet.pk for outlet in outlets.all())]
+
+    def orders_changed(self, before, after, outlet_id=None):
+        """Events of orders of `outlet_id`; see KitchenBoard.orders_changed."""
+        self.board(outlet_id).orders_changed(before, after)
+
+    def invalidate(self, outlet_id=None):
+        self.board(outlet_id).invalidate()
+
+    def invalidate_database(self, using):
+        """Throw away the tallies of every outlet whose orders are in database `using`."""
+        for outlet_id in self._outlet_ids():
+            if database_for(outlet_id) == using:
+                self.invalidate(outlet_id)
+
+    def snapshot(self, window_minutes=15, outlet_id=None, all_outlets=False):
+        """(etag, payload) of the board of `outlet_id`, or of every outlet together."""
+        if not all_outlets:
+            return self.board(outlet_id).snapshot(window_minutes)
+        tally, names = defaultdict(int), {}
+        for board_outlet_id in self._outlet_ids():
+            board_tally, board_names = self.board(board_outlet_id).current()
+            for key, quantity in board_tally.items():
+                tally[key] += quantity
+            names.update(board_names)
+        return _render(tally, names, window_minutes)
+
+
+kitchen_board = KitchenBoards()
+
+
+@receiver(post_save, sender=OrderItem)
+def _order_item_saved(sender, instance, raw=False, **kwargs):
+    # No post_delete receiver: it would make every bulk delete of items (archiving) load them first
+    using = instance._state.db
+    transaction.on_commit(lambda: kitchen_board.invalidate_database(using), using=using)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = "Move completed/cancelled orders older than --days into the order archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Archive orders older than this (default: ORDER_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Orders moved per transaction.")
+        parser.add_argument('--max-batches', type=int, default=None)
+
+    def handle(self, *args, **options):
+        moved = archive_orders(
+            older_than_days=options['days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} orders."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.forecasting import METHODS, run_forecast
+
+
+class Command(BaseCommand):
+    help = "Forecast per-item demand from order history and suggest stock levels and thresholds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--method', choices=METHODS, default='ewma',
+                            help="ewma (exponential smoothing) or sma (moving average over --window weeks).")
+        parser.add_argument('--alpha', type=float, default=0.3, help="Smoothing factor for ewma.")
+        parser.add_argument('--window', type=int, default=4, help="Number of weeks averaged by sma.")
+        parser.add_argument('--safety', type=float, default=0.2, help="Safety margin added to suggestions.")
+        parser.add_argument('--lead-hours', type=int, default=2, help="Hours needed to restock an item.")
+        parser.add_argument('--history-days', type=int, default=None,
+                            help="Only use this many days of history (default: all of it).")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--apply', action='store_true',
+                            help="Write tomorrow's suggestions to Inventory.stock_level and Inventory.threshold.")
+
+    def handle(self, *args, **options):
+        try:
+            written = run_forecast(
+                method=options['method'],
+                alpha=options['alpha'],
+                window=options['window'],
+                safety=options['safety'],
+                lead_hours=options['lead_hours'],
+                history_days=options['history_days'],
+                apply=options['apply'],
+                chunk_size=options['chunk_size'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} forecast rows."))
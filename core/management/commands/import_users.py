@@ -0,0 +1,52 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.provisioning import UserImporter
+
+
+class Command(BaseCommand):
+    help = "Bulk-create student accounts from a registrar CSV (reg_number, name, email, phone, gender)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processes used for password hashing (default: one per CPU).")
+        parser.add_argument('--role', default='student', choices=['student', 'staff', 'admin'])
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, create nothing.")
+        parser.add_argument('--invite', action='store_true',
+                            help="Email students created without a password a link to set one.")
+        parser.add_argument('--report', help="Write the per-row error report to this CSV file.")
+
+    def handle(self, *args, **options):
+        importer = UserImporter(
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            role=options['role'],
+            dry_run=options['dry_run'],
+            invite=options['invite'],
+        )
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as stream:
+                report = importer.run(stream)
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['row', 'reg_number', 'errors'])
+                for error in report.errors:
+                    writer.writerow([error['row'], error['reg_number'] or '', json.dumps(error['errors'])])
+
+        verb = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {report.created} of {report.rows} users."))
+        if report.invited:
+            self.stdout.write(f"Sent {report.invited} password links.")
+        if report.errors:
+            self.stdout.write(self.style.WARNING(f"{len(report.errors)} rows failed."))
+            if not options['report']:
+                for error in report.errors[:20]:
+                    self.stdout.write(f"  row {error['row']} ({error['reg_number']}): {error['errors']}")
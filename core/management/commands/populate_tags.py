@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Tag
+from core.tagindex import rebuild
+
+DEFAULT_TAGS = [
+    # Meal type: what kind of dish
+    ('Main Course', 'meal_type', 'Primary dishes like rice, pasta, burgers'),
+    ('Appetizer', 'meal_type', 'Starters like salads, soups, spring rolls'),
+    ('Dessert', 'meal_type', 'Sweet endings like cakes, ice cream, pudding'),
+    ('Beverage', 'meal_type', 'Drinks like juice, soda, coffee, tea'),
+    ('Snack', 'meal_type', 'Light bites like chips, sandwiches, wraps'),
+    # Time of day: when it's served
+    ('Breakfast', 'time_of_day', 'Morning meals (7AM - 11AM)'),
+    ('Lunch', 'time_of_day', 'Midday meals (11AM - 3PM)'),
+    ('Dinner', 'time_of_day', 'Evening meals (5PM - 9PM)'),
+    ('All-Day', 'time_of_day', 'Available throughout the day'),
+    # Temperature: how it's served
+    ('Hot', 'temperature', 'Served hot or warm'),
+    ('Cold', 'temperature', 'Served cold or chilled'),
+    ('Frozen', 'temperature', 'Frozen items like ice cream'),
+]
+
+
+class Command(BaseCommand):
+    help = "Create the default menu tags (safe to run repeatedly) and rebuild the tag index."
+
+    def handle(self, *args, **options):
+        before = Tag.objects.count()
+        Tag.objects.bulk_create(
+            [Tag(name=name, tag_type=tag_type, description=description)
+             for name, tag_type, description in DEFAULT_TAGS],
+            ignore_conflicts=True,
+        )
+        total = Tag.objects.count()
+        rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {total - before} tags ({len(DEFAULT_TAGS) - (total - before)} already existed), "
+            f"{total} tags in total."
+        ))
@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.admission import process_tickets, release_stale_claims
+from core.models import OrderTicket
+
+
+class Command(BaseCommand):
+    help = (
+        "Place order tickets still queued after --stale seconds (e.g. left behind by a restarted worker). "
+        "With --loop it keeps running as a dedicated queue consumer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale', type=float, default=30,
+                            help="Only pick up tickets queued for at least this many seconds (0: all).")
+        parser.add_argument('--reclaim', type=float, default=300,
+                            help="Requeue tickets a consumer claimed this many seconds ago but never finished.")
+        parser.add_argument('--batch-size', type=int, default=50, help="Tickets placed per transaction.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for queued tickets.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls with --loop.")
+
+    def drain(self, stale, batch_size, reclaim):
+        handled = 0
+        last_id = 0
+        release_stale_claims(timezone.now() - timedelta(seconds=reclaim))
+        while True:
+            cutoff = timezone.now() - timedelta(seconds=stale)
+            ids = list(
+                OrderTicket.objects.filter(status='queued', created_at__lte=cutoff, id__gt=last_id)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return handled
+            handled += process_tickets(ids)
+            last_id = ids[-1]
+
+    def handle(self, *args, **options):
+        while True:
+            handled = self.drain(options['stale'], options['batch_size'], options['reclaim'])
+            if handled or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Processed {handled} order tickets."))
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
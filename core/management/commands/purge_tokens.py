@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.tokens import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding refresh tokens and their blacklist entries, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Tokens deleted per transaction.")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_tokens(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired tokens."))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.models import Payment
+from core.outlets import shard_aliases
+from core.receipts import ReceiptRenderer
+
+
+class Command(BaseCommand):
+    help = "Render the receipts of a day's completed payments that do not have one yet (end-of-day run)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', default=None, help="Day to process, YYYY-MM-DD (default: today).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Payments loaded and rendered per batch.")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Rendering processes (default: RECEIPT_WORKERS).")
+        parser.add_argument('--force', action='store_true', help="Also re-render payments that have a receipt.")
+
+    def handle(self, *args, **options):
+        try:
+            day = parse_date(options['date']) if options['date'] else timezone.localdate()
+        except ValueError:  # well formed but not a day, e.g. 2026-02-30
+            day = None
+        if day is None:
+            raise CommandError("--date must be YYYY-MM-DD.")
+
+        started = time.perf_counter()
+        rendered = 0
+        with ReceiptRenderer(workers=options['workers'], force=options['force']) as renderer:
+            for using in [DEFAULT_DB_ALIAS, *sorted(shard_aliases())]:
+                payments = Payment.objects.using(using).filter(payment_status='completed', created_at__date=day)
+                if not options['force']:
+                    payments = payments.filter(receipt_url__isnull=True)
+                ids = list(payments.order_by('id').values_list('id', flat=True))
+                for start in range(0, len(ids), options['batch_size']):
+                    rendered += renderer.render_ids(ids[start:start + options['batch_size']], using=using)
+
+        elapsed = time.perf_counter() - started
+        rate = rendered / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} receipts in {elapsed:.1f}s ({rate:.0f}/s)."))
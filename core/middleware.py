@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """
+    Gzip JSON responses once they pass GZIP_MIN_LENGTH bytes.
+
+    Small payloads are not worth the CPU, and files already carry their own
+    (pre)compression, so everything that is not JSON is left alone.
+    """
+
+    def process_response(self, request, response):
+        if not response.get('Content-Type', '').startswith('application/json'):
+            return response
+        if response.streaming or len(response.content) < getattr(settings, 'GZIP_MIN_LENGTH', 1024):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_delete_category_remove_menuitem_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('expected_demand', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('peak_hour', models.PositiveSmallIntegerField()),
+                ('suggested_stock_level', models.PositiveIntegerField()),
+                ('suggested_threshold', models.PositiveIntegerField()),
+                ('generated_at', models.DateTimeField(auto_now=True)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='core.menuitem')),
+            ],
+            options={
+                'ordering': ['menu_item', 'weekday'],
+                'unique_together': {('menu_item', 'weekday')},
+            },
+        ),
+    ]
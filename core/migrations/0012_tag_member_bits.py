@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:04
+
+from django.db import migrations, models
+
+
+def build_member_bits(apps, schema_editor):
+    Tag = apps.get_model('core', 'Tag')
+    MenuItemTags = apps.get_model('core', 'MenuItem').tags.through
+    members = {}
+    for tag_id, menu_item_id in MenuItemTags.objects.values_list('tag_id', 'menuitem_id').iterator():
+        members[tag_id] = members.get(tag_id, 0) | 1 << menu_item_id
+    tags = list(Tag.objects.only('id'))
+    for tag in tags:
+        bits = members.get(tag.id, 0)
+        tag.member_bits = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    Tag.objects.bulk_update(tags, ['member_bits'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_sync_change_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='member_bits',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(build_member_bits, migrations.RunPython.noop),
+    ]
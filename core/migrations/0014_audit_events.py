@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_outlets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('order', 'Order'), ('menuitem', 'Menu item'), ('inventory', 'Inventory')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('field', models.CharField(max_length=50)),
+                ('old_value', models.CharField(blank=True, max_length=100, null=True)),
+                ('new_value', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('outlet', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.outlet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'object_id', 'created_at'], name='core_audite_model_fe6ade_idx'), models.Index(fields=['model', 'field', 'new_value', 'created_at'], name='core_audite_model_491a37_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:40
+
+from django.db import migrations, models, router
+
+# token_blacklist's expires_at is not indexed; purge_tokens deletes by it in batches
+INDEX = models.Index(fields=['expires_at'], name='outstandingtoken_expires_idx')
+
+
+def add_index(apps, schema_editor):
+    OutstandingToken = apps.get_model('token_blacklist', 'OutstandingToken')
+    if router.allow_migrate_model(schema_editor.connection.alias, OutstandingToken):
+        schema_editor.add_index(OutstandingToken, INDEX)
+
+
+def remove_index(apps, schema_editor):
+    OutstandingToken = apps.get_model('token_blacklist', 'OutstandingToken')
+    if router.allow_migrate_model(schema_editor.connection.alias, OutstandingToken):
+        schema_editor.remove_index(OutstandingToken, INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_order_tickets'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
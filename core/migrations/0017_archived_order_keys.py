@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_order_ids(apps, schema_editor):
+    ArchivedOrder = apps.get_model('core', 'ArchivedOrder')
+    # Archive rows so far were keyed by the id of the order they came from
+    ArchivedOrder.objects.using(schema_editor.connection.alias).update(order_id=models.F('id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_outstanding_token_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='order_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(copy_order_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='archivedorder',
+            name='order_id',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='outlet',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.outlet'),
+        ),
+        migrations.AlterField(
+            model_name='archivedorder',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['order_id', 'outlet'], name='core_archiv_order_i_112950_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_archived_order_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderticket',
+            name='claim',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='orderticket',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='orderticket',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('placed', 'Placed'), ('failed', 'Failed')], default='queued', max_length=10),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_order_ticket_claims'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='inventoryforecast',
+            options={'ordering': ['menu_item', 'outlet', 'weekday']},
+        ),
+        migrations.AlterUniqueTogether(
+            name='inventoryforecast',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='inventoryforecast',
+            name='outlet',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.outlet'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='inventoryforecast',
+            unique_together={('menu_item', 'outlet', 'weekday')},
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_inventory_forecast_outlet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='outlet',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.outlet'),
+        ),
+    ]
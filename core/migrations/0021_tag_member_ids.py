@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:10
+
+import struct
+
+from django.db import migrations
+
+
+def _members(apps):
+    MenuItemTags = apps.get_model('core', 'MenuItem').tags.through
+    members = {}
+    for tag_id, menu_item_id in MenuItemTags.objects.values_list('tag_id', 'menuitem_id').iterator():
+        members.setdefault(tag_id, set()).add(menu_item_id)
+    return members
+
+
+def build_member_ids(apps, schema_editor):
+    Tag = apps.get_model('core', 'Tag')
+    members = _members(apps)
+    tags = list(Tag.objects.only('id'))
+    for tag in tags:
+        ids = sorted(members.get(tag.id, ()))
+        tag.member_ids = struct.pack(f'<{len(ids)}Q', *ids)
+    Tag.objects.bulk_update(tags, ['member_ids'], batch_size=500)
+
+
+def build_member_bits(apps, schema_editor):
+    Tag = apps.get_model('core', 'Tag')
+    members = _members(apps)
+    tags = list(Tag.objects.only('id'))
+    for tag in tags:
+        bits = 0
+        for menu_item_id in members.get(tag.id, ()):
+            bits |= 1 << menu_item_id
+        tag.member_ids = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    Tag.objects.bulk_update(tags, ['member_ids'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_tombstone_outlet'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='tag',
+            old_name='member_bits',
+            new_name='member_ids',
+        ),
+        # Bitsets indexed by raw ids become packed, sorted id lists
+        migrations.RunPython(build_member_ids, build_member_bits),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 from django.contrib import admin
 
 # Create your models here.
@@ -16,6 +17,7 @@ class User(AbstractUser):
     gender = models.CharField(max_length=10, choices=[('male', 'Male'), ('female', 'Female'), ('other', 'Other')])
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False) # It’s used internally by Django’s admin and permission system/Allows user to login to Django's admin panel
+    outlet = models.ForeignKey('Outlet', on_delete=models.SET_NULL, null=True, blank=True, related_name='staff') # Home outlet of staff members
 
     REQUIRED_FIELDS = ['email', 'name', 'role']
 
@@ -29,6 +31,17 @@ class User(AbstractUser):
         return f"{self.name} ({self.reg_number})"
 
 
+# A canteen outlet. Orders of an outlet can be routed to their own database (see core/outlets.py)
+class Outlet(models.Model):
+    name = models.CharField(max_length=100)
+    code = models.SlugField(max_length=30, unique=True) # Key into settings.OUTLET_DATABASES
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
 # Tag Model for categorizing menu items
 class Tag(models.Model):
     TAG_TYPES = [
@@ -41,6 +54,9 @@ class Tag(models.Model):
     tag_type = models.CharField(max_length=20, choices=TAG_TYPES)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Sorted ids of the menu items carrying this tag, maintained by core/tagindex.py
+    member_ids = models.BinaryField(default=b'', editable=False)
     
     class Meta:
         unique_together = ['name', 'tag_type']
@@ -58,15 +74,32 @@ class MenuItem(models.Model):
     availability = models.BooleanField(default=True)
     image_url = models.ImageField(upload_to='menu_item_pictures/', null=True, blank=True)
     tags = models.ManyToManyField(Tag, related_name='menu_items', blank=True)
+    outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, null=True, blank=True, related_name='menu_items') # Null: sold at every outlet
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.name
 
 #Handles orders
 class Order(models.Model):
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    # Allowed status moves; anything not listed here is rejected by the API
+    STATUS_TRANSITIONS = {
+        'pending': ['confirmed', 'cancelled'],
+        'confirmed': ['preparing', 'cancelled'],
+        'preparing': ['ready', 'cancelled'],
+        'ready': ['completed', 'cancelled'],
+        'completed': [],
+        'cancelled': [],
+    }
+    # Students may only cancel their own orders before the kitchen starts on them
+    CUSTOMER_CANCELLABLE = ['pending', 'confirmed']
+    # Orders hold the stock they took while open; cancelling or deleting one puts it back
+    HOLDS_STOCK = ['pending', 'confirmed', 'preparing', 'ready']
+
+    # Orders may live in an outlet database, so references to shared tables carry no DB constraint
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, db_constraint=False)
+    outlet = models.ForeignKey(Outlet, on_delete=models.PROTECT, null=True, blank=True, db_constraint=False)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(choices= [
         ('pending', 'Pending'), 
@@ -78,16 +111,34 @@ class Order(models.Model):
     ], max_length=20, default='pending')
     order_date = models.DateField(auto_now_add=True)
     pickup_time = models.TimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=1) # Bumped on every update, used for optimistic concurrency
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', 'updated_at']),
+            models.Index(fields=['outlet', 'status', 'created_at']),
+        ]
+
     def __str__(self):
-        return f"Order #{self.id} by {self.user.name} - {self.status}"
+        customer = self.user.name if self.user_id else 'deleted user'
+        return f"Order #{self.id} by {customer} - {self.status}"
+
+    def can_transition(self, status):
+        return status == self.status or status in self.STATUS_TRANSITIONS[self.status]
+
+    @classmethod
+    def sources_for(cls, status):
+        """Statuses an order can move to `status` from."""
+        return [source for source, targets in cls.STATUS_TRANSITIONS.items() if status in targets]
 
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order,related_name='items', on_delete=models.CASCADE)
-    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, db_constraint=False)
     quantity = models.PositiveIntegerField()
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
@@ -95,6 +146,67 @@ class OrderItem(models.Model):
         return f"{self.menu_item.name} x{self.quantity}"
 
 
+# Orders accepted at peak times and placed later in micro-batches (see core/admission.py).
+# Lives in the default database; `order_id` points into the outlet's order database.
+class OrderTicket(models.Model):
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('processing', 'Processing'),
+        ('placed', 'Placed'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_tickets')
+    outlet = models.ForeignKey(Outlet, on_delete=models.PROTECT, null=True, blank=True)
+    payload = models.JSONField() # The validated order: total_price, pickup_time, items_data
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    order_id = models.BigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    claim = models.CharField(max_length=32, blank=True, db_index=True) # Set by the consumer placing it (see core/admission.py)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Order ticket #{self.id} - {self.status}"
+
+
+# Completed/cancelled orders moved out of the hot tables by core/archive.py.
+# Items and payments are kept as JSON snapshots so one row holds a whole order.
+class ArchivedOrder(models.Model):
+    # The id the order had while it was live. Order ids are only unique per database (and can be
+    # reused once the newest orders are deleted), so together with the outlet and created_at it
+    # tells archived orders apart, but it is not a key.
+    order_id = models.BigIntegerField()
+    outlet = models.ForeignKey(Outlet, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='archived_orders')
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20)
+    order_date = models.DateField()
+    pickup_time = models.TimeField(null=True, blank=True)
+    items = models.JSONField(default=list)
+    payments = models.JSONField(default=list)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['order_id', 'outlet']),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.order_id} - {self.status}"
+
+
 class Payment(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     payment_ref = models.CharField(max_length=100)
@@ -111,10 +223,17 @@ class Notification(models.Model):
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     read_status = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
 
 
 class Inventory(models.Model):
     menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, null=True, blank=True) # Each outlet counts its own stock
     quantity = models.PositiveIntegerField()
     stock_level = models.PositiveIntegerField()
     threshold = models.PositiveIntegerField()
@@ -123,7 +242,91 @@ class Inventory(models.Model):
 
     class Meta:
         verbose_name_plural = 'Inventories'
+        indexes = [
+            models.Index(fields=['outlet', 'menu_item']),
+        ]
     def __str__(self):
-        return self.name
-    
+        return f"{self.menu_item.name} ({self.quantity})"
+
+
+# Suggested stock levels produced by the demand forecasting job (core/forecasting.py)
+class InventoryForecast(models.Model):
+    WEEKDAYS = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    menu_item = models.ForeignKey(MenuItem, related_name='forecasts', on_delete=models.CASCADE)
+    outlet = models.ForeignKey(Outlet, on_delete=models.CASCADE, null=True, blank=True) # Forecast for the outlet's stock
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    expected_demand = models.DecimalField(max_digits=10, decimal_places=2)
+    peak_hour = models.PositiveSmallIntegerField()
+    suggested_stock_level = models.PositiveIntegerField()
+    suggested_threshold = models.PositiveIntegerField()
+    generated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['menu_item', 'outlet', 'weekday']
+        ordering = ['menu_item', 'outlet', 'weekday']
+
+    def __str__(self):
+        return f"{self.menu_item.name} ({self.get_weekday_display()})"
 
+
+# Records deletions so /api/sync/ can tell clients what to drop (see core/sync.py)
+class Tombstone(models.Model):
+    SCOPES = [
+        ('menu', 'Menu item'),
+        ('tags', 'Tag'),
+        ('orders', 'Order'),
+        ('notifications', 'Notification'),
+    ]
+
+    scope = models.CharField(max_length=20, choices=SCOPES)
+    object_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True) # Owner, for per-user scopes
+    # Outlet of a deleted order: order ids are only unique per database
+    outlet = models.ForeignKey(Outlet, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+')
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at']),
+            models.Index(fields=['user', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} #{self.object_id} deleted"
+
+
+# Append-only change log for order status, menu prices and stock (see core/audit.py).
+# Rows outlive what they describe, so the references carry no constraint and are never cascaded.
+class AuditEvent(models.Model):
+    MODELS = [
+        ('order', 'Order'),
+        ('menuitem', 'Menu item'),
+        ('inventory', 'Inventory'),
+    ]
+
+    model = models.CharField(max_length=20, choices=MODELS)
+    object_id = models.BigIntegerField()
+    field = models.CharField(max_length=50)
+    old_value = models.CharField(max_length=100, null=True, blank=True) # Null when the object was created
+    new_value = models.CharField(max_length=100, null=True, blank=True)
+    actor = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+')
+    outlet = models.ForeignKey(Outlet, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id', 'created_at']),
+            models.Index(fields=['model', 'field', 'new_value', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id} {self.field}: {self.old_value} -> {self.new_value}"
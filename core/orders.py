@@ -0,0 +1,163 @@
+"""
+Order status state machine and optimistic concurrency helpers.
+
+Every write to an order is a conditional `UPDATE ... WHERE version = n` that
+bumps the version, so two tablets editing the same order cannot silently
+overwrite each other: the slower one gets a 412 and has to reload.
+
+Open orders hold the stock they took (see core/alerts.py). It goes back to
+the outlet's inventory once a cancellation, a deletion or an item edit that
+lowers a quantity commits.
+"""
+
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.db import router, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from . import audit
+from .alerts import restock
+from .kitchen import kitchen_board
+from .models import Order, OrderItem
+
+
+class StaleOrderError(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'This order was changed by someone else. Reload it and try again.'
+    default_code = 'stale_order'
+
+
+def etag_for(order):
+    return f'"{order.version}"'
+
+
+def touch_orders(order_ids, using):
+    """
+    Bump the version of orders whose items changed, so their ETag and
+    Last-Modified change with them.
+    """
+    Order.objects.using(using).filter(pk__in=order_ids).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def held_stock(order_ids, using):
+    """The stock the orders `order_ids` took, as {outlet_id: Counter({menu_item_id: quantity})}."""
+    held = defaultdict(Counter)
+    rows = (
+        OrderItem.objects.using(using).filter(order_id__in=order_ids)
+        .values_list('order__outlet_id', 'menu_item_id').annotate(quantity=Sum('quantity')).order_by()
+    )
+    for outlet_id, menu_item_id, quantity in rows:
+        held[outlet_id][menu_item_id] += quantity
+    return held
+
+
+def release_stock(quantities, outlet_id, using):
+    """Put `quantities` back into `outlet_id`'s stock once the order change on `using` commits."""
+    if +quantities:
+        transaction.on_commit(partial(restock, +quantities, outlet_id), using=using)
+
+
+def parse_version(value):
+    """
+    Read an expected version from an If-Match header or a `version` field.
+    Accepts `3`, `"3"` and `W/"3"`; `*` or an empty value means "any version".
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    value = value.strip('"')
+    if value in ('', '*'):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({'version': 'Must be an integer order version.'})
+
+
+def conditional_update(order, expected_version, **changes):
+    """
+    Apply `changes` only if the order is still at `expected_version`.
+    Refreshes `order` on success and raises StaleOrderError otherwise.
+    """
+    before = {order.pk: (order.status, order.pickup_time)}
+    updated = Order.objects.using(order._state.db).filter(pk=order.pk, version=expected_version).update(
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+        **changes
+    )
+    if not updated:
+        raise StaleOrderError()
+    # Only reload what changed so prefetched items survive for the response
+    order.refresh_from_db(fields=['version', 'updated_at', *changes])
+
+    after = {order.pk: (order.status, order.pickup_time)}
+    transaction.on_commit(partial(kitchen_board.orders_changed, before, after, order.outlet_id), using=order._state.db)
+    if order.status == 'cancelled' and before[order.pk][0] in Order.HOLDS_STOCK:
+        for outlet_id, quantities in held_stock([order.pk], order._state.db).items():
+            release_stock(quantities, outlet_id, order._state.db)
+    if 'status' in changes:
+        audit.record([audit.change(Order, order.pk, 'status', before[order.pk][0], order.status, order.outlet_id)],
+                     using=order._state.db)
+    return order
+
+
+def bulk_transition(target, ids=None, versions=None, outlet=None):
+    """
+    Move many orders to `target` at once.
+
+    Orders are selected by `ids`, or by `versions` ({id: expected_version})
+    when the caller wants the same optimistic check as single updates, and
+    only among `outlet`'s orders when one is given. Only orders whose
+    current status allows the move are touched; the rest are reported back
+    as skipped. Returns (updated_ids, skipped_ids).
+    """
+    if target not in Order.STATUS_TRANSITIONS:
+        raise ValidationError({'status': f"'{target}' is not a valid order status."})
+
+    if versions:
+        requested = set(versions)
+        selector = Q()
+        for pk, version in versions.items():
+            selector |= Q(pk=pk, version=version)
+    else:
+        requested = set(ids or [])
+        selector = Q(pk__in=requested)
+    if not requested:
+        return [], []
+    if outlet is not None:
+        # Outlets without a database of their own share default, so ids alone can name another outlet's orders
+        selector &= Q(outlet=outlet)
+
+    # Orders may live in an outlet database (see core/outlets.py)
+    using = router.db_for_write(Order)
+    with transaction.atomic(using=using):
+        eligible = Order.objects.using(using).select_for_update().filter(selector, status__in=Order.sources_for(target))
+        rows = list(eligible.values_list('id', 'status', 'pickup_time', 'outlet_id'))
+        before = {pk: (current, pickup_time) for pk, current, pickup_time, outlet_id in rows}
+        updated_ids = list(before)
+        if updated_ids:
+            Order.objects.using(using).filter(pk__in=updated_ids).update(
+                status=target,
+                version=F('version') + 1,
+                updated_at=timezone.now(),
+            )
+            by_outlet = defaultdict(dict)
+            for pk, current, pickup_time, outlet_id in rows:
+                by_outlet[outlet_id][pk] = (current, pickup_time)
+            for outlet_id, outlet_before in by_outlet.items():
+                after = {pk: (target, pickup_time) for pk, (current, pickup_time) in outlet_before.items()}
+                transaction.on_commit(partial(kitchen_board.orders_changed, outlet_before, after, outlet_id), using=using)
+            audit.record([
+                audit.change(Order, pk, 'status', current, target, outlet_id) for pk, current, pickup_time, outlet_id in rows
+            ], using=using)
+            if target == 'cancelled':
+                for outlet_id, quantities in held_stock(updated_ids, using).items():
+                    release_stock(quantities, outlet_id, using)
+    skipped_ids = sorted(requested - set(updated_ids))
+    return sorted(updated_ids), skipped_ids
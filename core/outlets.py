@@ -0,0 +1,245 @@
+"""
+Outlets: several canteens served by one backend.
+
+Menu items (optionally), inventory counters and orders belong to an
+outlet. API requests pick their outlet with ?outlet=<id> or the X-Outlet
+header; staff members default to their home outlet and may only change
+their own outlet's rows.
+
+The hot order tables (Order, OrderItem, Payment) can live in a separate
+database per outlet. Map outlet codes to database aliases in
+OUTLET_DATABASES and those aliases only get the order tables; everything
+else, and orders of unmapped outlets, stays in `default`. OutletRouter sends
+order queries to the database of the outlet active for the current request
+(see `use_outlet`) or of the instance being saved. Queries never join
+across databases, so order endpoints prefetch related rows instead.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import Http404
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from .models import Outlet
+
+# Models whose tables are split by outlet
+SHARDED_MODELS = {'order', 'orderitem', 'payment'}
+
+_current_outlet = ContextVar('current_outlet', default=None)
+
+
+def current_outlet():
+    return _current_outlet.get()
+
+
+@contextmanager
+def use_outlet(outlet):
+    """Route order queries in the block to `outlet`'s database."""
+    token = _current_outlet.set(outlet)
+    try:
+        yield outlet
+    finally:
+        _current_outlet.reset(token)
+
+
+class OutletDirectory:
+    """
+    Per-process copy of the (small) outlet table, so resolving a request's
+    outlet or its database needs no query once warm. Reloaded on a miss,
+    after OUTLET_DIRECTORY_TTL seconds and when an outlet is saved here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._outlets = {}
+        self._loaded_at = 0
+
+    def clear(self):
+        self._loaded_at = 0
+
+    def _stale(self):
+        return time.monotonic() - self._loaded_at > getattr(settings, 'OUTLET_DIRECTORY_TTL', 60)
+
+    def _load(self):
+        with self._lock:
+            self._outlets = {outlet.pk: outlet for outlet in Outlet.objects.using(DEFAULT_DB_ALIAS)}
+            self._loaded_at = time.monotonic()
+
+    def get(self, outlet_id):
+        outlet = self._outlets.get(outlet_id)
+        if outlet is None or self._stale():
+            self._load()
+            outlet = self._outlets.get(outlet_id)
+        return outlet
+
+    def all(self):
+        if self._stale():
+            self._load()
+        return list(self._outlets.values())
+
+
+outlets = OutletDirectory()
+
+
+@receiver([post_save, post_delete], sender=Outlet)
+def _outlet_changed(sender, **kwargs):
+    outlets.clear()
+
+
+def shard_aliases():
+    return {alias for alias in getattr(settings, 'OUTLET_DATABASES', {}).values() if alias != DEFAULT_DB_ALIAS}
+
+
+def order_databases():
+    """Every database holding order tables, default first."""
+    return [DEFAULT_DB_ALIAS, *sorted(shard_aliases())]
+
+
+def database_for(outlet):
+    """Database alias holding the orders of `outlet` (an Outlet, an id or None)."""
+    databases = getattr(settings, 'OUTLET_DATABASES', {})
+    if outlet is None or not databases:
+        return DEFAULT_DB_ALIAS
+    if not isinstance(outlet, Outlet):
+        outlet = outlets.get(outlet)
+    return databases.get(outlet.code, DEFAULT_DB_ALIAS) if outlet else DEFAULT_DB_ALIAS
+
+
+def menu_cache_scopes(outlet_id):
+    """
+    Cache scopes to bump when menu items of `outlet_id` change. Outlet menus
+    are cached under 'menu:<id>' and the all-outlet menu under 'menu:all';
+    shared items (no outlet) appear everywhere, so they bump 'menu', which
+    every menu cache key includes.
+    """
+    if outlet_id is None:
+        return ('menu',)
+    return (f'menu:{outlet_id}', 'menu:all')
+
+
+class OutletRouter:
+    def _sharded(self, model):
+        return model._meta.app_label == 'core' and model._meta.model_name in SHARDED_MODELS
+
+    def _db_for(self, model, instance=None, **hints):
+        if not self._sharded(model):
+            # Say so explicitly; otherwise Django follows the hint instance into an outlet database
+            return DEFAULT_DB_ALIAS
+        if instance is not None and self._sharded(type(instance)):
+            # Saved rows stay where they are; new ones follow their outlet or their order
+            if instance._state.db:
+                return instance._state.db
+            if getattr(instance, 'outlet_id', None):
+                return database_for(instance.outlet_id)
+            if type(instance)._meta.model_name != 'order' and instance.order_id:
+                return instance.order._state.db or database_for(instance.order.outlet_id)
+        return database_for(current_outlet())
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Orders reference users, outlets and menu items across databases on purpose
+        if self._sharded(type(obj1)) or self._sharded(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in shard_aliases():
+            return app_label == 'core' and model_name in SHARDED_MODELS
+        return None
+
+
+def resolve_outlet(request):
+    """
+    The outlet a request works on: ?outlet=<id>, else the X-Outlet header,
+    else the staff member's home outlet. Returns None for "all outlets".
+    """
+    outlet_id = request.query_params.get('outlet') or request.headers.get('X-Outlet')
+    if not outlet_id:
+        user = request.user
+        if user.is_authenticated and user.role == 'staff' and user.outlet_id:
+            return outlets.get(user.outlet_id)
+        return None
+    try:
+        outlet = outlets.get(int(outlet_id))
+    except ValueError:
+        outlet = None
+    if outlet is None or not outlet.is_active:
+        raise ValidationError({'outlet': 'Unknown or inactive outlet.'})
+    return outlet
+
+
+class OutletMixin:
+    """
+    Resolve `self.outlet` for every request and route order queries made
+    while handling it to that outlet's database.
+    """
+
+    outlet = None
+    _outlet_token = None
+
+    def initial(self, request, *args, **kwargs):
+        # Resolved before the permission checks so they can look at it
+        self.outlet = resolve_outlet(request)
+        self._outlet_token = _current_outlet.set(self.outlet)
+        super().initial(request, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._outlet_token is not None:
+                _current_outlet.reset(self._outlet_token)
+                self._outlet_token = None
+
+
+class OwnOrdersMixin:
+    """
+    For OutletMixin viewsets over the order tables. Students order at any
+    outlet, so without a selected outlet their own rows are read from every
+    order database: `list` merges them, newest first, and single rows are
+    looked up in default and then in each outlet database. Staff pick an
+    outlet (or get default's rows). Viewsets implement
+    `get_queryset_for(using)`.
+    """
+
+    def reads_every_database(self):
+        user = self.request.user
+        return self.outlet is None and user.is_authenticated and user.role not in ['staff', 'admin']
+
+    def get_queryset(self):
+        return self.get_queryset_for(database_for(self.outlet))
+
+    def list(self, request, *args, **kwargs):
+        if not self.reads_every_database():
+            return super().list(request, *args, **kwargs)
+        rows = [row for using in order_databases() for row in self.get_queryset_for(using)]
+        rows.sort(key=lambda row: row.created_at, reverse=True)
+        return Response(self.get_serializer(rows, many=True).data)
+
+    def get_object(self):
+        if not self.reads_every_database():
+            return super().get_object()
+        # Ids are only unique per database; default's row wins
+        lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        for using in order_databases():
+            try:
+                row = get_object_or_404(self.get_queryset_for(using), **lookup)
+            except Http404:
+                continue
+            self.check_object_permissions(self.request, row)
+            return row
+        raise Http404
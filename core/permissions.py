@@ -32,4 +32,28 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (
             request.user.is_authenticated and (obj == request.user or request.user.role == 'admin')
-        )
\ No newline at end of file
+        )
+
+
+class OutletStaffPermission(permissions.BasePermission):
+    """
+    Staff members with a home outlet only work on that outlet: they cannot
+    switch a view to another outlet or change another outlet's rows.
+    Viewsets set `outlet_public_reads` to let them read other outlets.
+    """
+    def _restricted(self, request):
+        user = request.user
+        return user.is_authenticated and user.role == 'staff' and user.outlet_id is not None
+
+    def has_permission(self, request, view):
+        if not self._restricted(request):
+            return True
+        if request.method in permissions.SAFE_METHODS and getattr(view, 'outlet_public_reads', False):
+            return True
+        outlet = getattr(view, 'outlet', None)
+        return outlet is not None and outlet.pk == request.user.outlet_id
+
+    def has_object_permission(self, request, view, obj):
+        if not self._restricted(request) or request.method in permissions.SAFE_METHODS:
+            return True
+        return getattr(obj, 'outlet_id', None) == request.user.outlet_id
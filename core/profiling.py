@@ -0,0 +1,286 @@
+"""
+Profiling in production, without a redeploy.
+
+On demand: an admin adds ?profile=1 (or an X-Profile: 1 header) to any
+request. ProfilingMiddleware then runs it under cProfile and records every
+SQL statement on every database with its offset and duration. Both go to
+PROFILE_DIR: `<name>.prof` (pstats format, e.g. for snakeviz) and
+`<name>.json` (request, timings, SQL timeline). The response carries the
+name in X-Profile-Id. Only the newest PROFILE_KEEP profiles are kept, and
+/admin/profiles/ lists them. The switch is ignored for anyone else.
+
+Sampling: with PROFILE_SAMPLE_RATE above 0, that share of requests is
+marked for `sampler`, a background thread that looks at the stacks of the
+marked threads every PROFILE_SAMPLE_INTERVAL seconds (the way py-spy does
+from outside the process) and counts the functions of PROFILE_SAMPLE_MODULES
+it finds there. Nothing runs inside the request itself. Each worker writes
+its counts to PROFILE_DIR every PROFILE_SAMPLE_FLUSH seconds, and the admin
+page adds up all workers' counts into a hot function list.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .permissions import IsAdmin
+
+logger = logging.getLogger(__name__)
+
+# Profile names are generated here; anything else is not looked up on disk
+PROFILE_NAME = re.compile(r'^\d{8}-\d{6}-[A-Z]+-[\w-]*-[0-9a-f]{8}$')
+SQL_MAX_LENGTH = 2000
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def _requested(request):
+    return request.GET.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+
+
+def _is_admin(request):
+    """IsAdmin for a plain Django request: the session user, else the request's JWT."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        if authenticated is None:
+            return False
+        user = authenticated[0]
+    # DRF only hands permissions the request for its user
+    return IsAdmin().has_permission(SimpleNamespace(user=user), None)
+
+
+class SQLTimeline:
+    """Records each statement run on any database while active."""
+
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+
+    def _wrapper(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            began = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append({
+                    'alias': alias,
+                    'start_ms': round((began - self.started) * 1000, 2),
+                    'duration_ms': round((time.perf_counter() - began) * 1000, 2),
+                    'sql': sql[:SQL_MAX_LENGTH],
+                    'many': many,
+                })
+        return wrapper
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self._wrapper(alias)))
+            yield self
+
+
+def _profile_name(request):
+    slug = re.sub(r'[^\w-]+', '-', request.path).strip('-')[:60]
+    return f"{timezone.localtime():%Y%m%d-%H%M%S}-{request.method}-{slug}-{uuid.uuid4().hex[:8]}"
+
+
+def _prune(directory):
+    keep = getattr(settings, 'PROFILE_KEEP', 200)
+    profiles = sorted(directory.glob('[0-9]*.json'), reverse=True)
+    for stale in profiles[keep:]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def profile_request(get_response, request):
+    """Run the request under cProfile and store the profile; returns the response."""
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    timeline = SQLTimeline(started)
+    with timeline.capture():
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    elapsed = time.perf_counter() - started
+
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = _profile_name(request)
+    profiler.dump_stats(directory / f'{name}.prof')
+    (directory / f'{name}.json').write_text(json.dumps({
+        'name': name,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 2),
+        'sql_ms': round(sum(query['duration_ms'] for query in timeline.queries), 2),
+        'created_at': timezone.now().isoformat(),
+        'queries': timeline.queries,
+    }))
+    _prune(directory)
+    response['X-Profile-Id'] = name
+    return response
+
+
+def recent_profiles(limit=100):
+    """Summaries of the newest stored profiles, newest first."""
+    summaries = []
+    for path in sorted(profile_dir().glob('[0-9]*.json'), reverse=True)[:limit]:
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # pruned or half written by another worker
+        data['query_count'] = len(data.pop('queries'))
+        summaries.append(data)
+    return summaries
+
+
+def load_profile(name):
+    """The stored profile `name` and the path of its pstats file, or None."""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = profile_dir() / f'{name}.json'
+    try:
+        return json.loads(path.read_text()), path.with_suffix('.prof')
+    except (OSError, ValueError):
+        return None
+
+
+class Sampler:
+    """Statistical sampler of the threads serving sampled requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._threads = set()
+        self._thread = None
+        self.own = Counter()    # function on top of the sampled app stack
+        self.total = Counter()  # function anywhere on it
+        self.samples = 0
+        self._flushed_at = time.monotonic()
+
+    @contextmanager
+    def track(self):
+        """Sample the current thread while the block runs."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+            ident = threading.get_ident()
+            self._threads.add(ident)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads.discard(ident)
+
+    def sample(self, frames):
+        """Count the app functions on the stacks in `frames` (thread id -> frame)."""
+        modules = tuple(getattr(settings, 'PROFILE_SAMPLE_MODULES', ['core.views', 'core.serializers']))
+        with self._lock:
+            for ident in self._threads & frames.keys():
+                seen = []
+                frame = frames[ident]
+                while frame is not None:
+                    module = frame.f_globals.get('__name__', '')
+                    if module.startswith(modules):
+                        code = frame.f_code
+                        key = f'{module}.{code.co_qualname}:{code.co_firstlineno}'
+                        if key not in seen:
+                            seen.append(key)
+                    frame = frame.f_back
+                if seen:
+                    self.own[seen[0]] += 1
+                    self.total.update(seen)
+                self.samples += 1
+
+    def flush(self):
+        """Write this worker's counts to PROFILE_DIR."""
+        with self._lock:
+            data = {'samples': self.samples, 'own': dict(self.own), 'total': dict(self.total)}
+            self._flushed_at = time.monotonic()
+        if not data['samples']:
+            return
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'samples-{os.getpid()}.json'
+        partial = path.with_suffix('.tmp')
+        partial.write_text(json.dumps(data))
+        os.replace(partial, path)
+
+    def _run(self):
+        while True:
+            time.sleep(getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.01))
+            try:
+                self.sample(sys._current_frames())
+                if time.monotonic() - self._flushed_at >= getattr(settings, 'PROFILE_SAMPLE_FLUSH', 60):
+                    self.flush()
+            except Exception:
+                logger.exception("Profile sampling failed")
+
+
+sampler = Sampler()
+
+
+def hot_functions(limit=30):
+    """
+    Sampled app functions across all workers, hottest first: `own` counts
+    samples with the function on top of the app stack, `total` samples with
+    it anywhere on the stack.
+    """
+    sampler.flush()
+    samples, own, total = 0, Counter(), Counter()
+    for path in profile_dir().glob('samples-*.json'):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        samples += data['samples']
+        own.update(data['own'])
+        total.update(data['total'])
+    rows = [
+        {'function': function, 'own': own[function], 'total': count,
+         'own_percent': round(100 * own[function] / samples, 1), 'total_percent': round(100 * count / samples, 1)}
+        for function, count in total.items()
+    ]
+    rows.sort(key=lambda row: (row['own'], row['total']), reverse=True)
+    return {'samples': samples, 'functions': rows[:limit]}
+
+
+class ProfilingMiddleware:
+    """Profiles requests admins ask for, and marks a share of all requests for the sampler."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if _requested(request) and _is_admin(request):
+            return profile_request(self.get_response, request)
+        rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        if rate and random.random() < rate:
+            with sampler.track():
+                return self.get_response(request)
+        return self.get_response(request)
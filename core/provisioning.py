@@ -0,0 +1,208 @@
+"""
+Bulk student provisioning from a registrar CSV.
+
+The CSV (reg_number, name, email, phone, gender and an optional password
+column) is streamed in chunks. Each chunk is checked against the database
+with one query per unique field, passwords are hashed in a process pool and
+the valid rows are inserted with a single bulk_create. Rows that fail are
+collected in a per-row error report instead of stopping the import.
+
+Students without a password get an unusable one and set theirs through the
+password link flow (core/accounts.py); with `invite` they are mailed a link
+right away.
+"""
+
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .accounts import send_password_links
+from .models import User
+from .workers import pool_initargs, setup_django_worker
+
+REQUIRED_COLUMNS = ['reg_number', 'name', 'email', 'phone', 'gender']
+GENDERS = {value for value, label in User._meta.get_field('gender').choices}
+POOL_MIN_BATCH = 100
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.invited = 0
+        self.errors = []
+
+    def fail(self, line, reg_number, errors):
+        self.errors.append({'row': line, 'reg_number': reg_number, 'errors': errors})
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'invited': self.invited,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+
+class UserImporter:
+    def __init__(self, chunk_size=1000, workers=None, role='student', dry_run=False, invite=False):
+        self.chunk_size = chunk_size
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.role = role
+        self.dry_run = dry_run
+        self.invite = invite
+        self._seen_reg_numbers = set()
+        self._seen_emails = set()
+
+    def run(self, stream):
+        """Import every row of the CSV text `stream` and return an ImportReport."""
+        report = ImportReport()
+        reader = csv.DictReader(stream)
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            report.fail(1, None, {'columns': f"Missing columns: {', '.join(missing)}."})
+            return report
+
+        self._executor = None
+        try:
+            chunk = []
+            # Line 1 is the header
+            for line, row in enumerate(reader, start=2):
+                report.rows += 1
+                chunk.append((line, row))
+                if len(chunk) >= self.chunk_size:
+                    self._import_chunk(chunk, report)
+                    chunk = []
+            if chunk:
+                self._import_chunk(chunk, report)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+        return report
+
+    def _hash_passwords(self, passwords):
+        # Starting worker processes only pays off for reasonably large batches
+        if self.workers <= 1 or len(passwords) < POOL_MIN_BATCH:
+            return [make_password(password) for password in passwords]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context('spawn'),
+                initializer=setup_django_worker,
+                initargs=pool_initargs(),
+            )
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._executor.map(make_password, passwords, chunksize=chunksize))
+
+    def _clean(self, row):
+        data = {
+            'reg_number': (row.get('reg_number') or '').strip(),
+            'name': (row.get('name') or '').strip(),
+            'email': (row.get('email') or '').strip().lower(),
+            'phone_number': (row.get('phone') or '').strip(),
+            'gender': (row.get('gender') or '').strip().lower(),
+            'password': (row.get('password') or '').strip(),
+        }
+        errors = {}
+        for field in ['reg_number', 'name', 'email', 'phone_number', 'gender']:
+            if not data[field]:
+                errors[field] = 'This field is required.'
+            elif len(data[field]) > User._meta.get_field(field).max_length:
+                errors[field] = 'Value is too long.'
+        if data['email'] and 'email' not in errors:
+            try:
+                validate_email(data['email'])
+            except ValidationError:
+                errors['email'] = 'Enter a valid email address.'
+        if data['gender'] and data['gender'] not in GENDERS:
+            errors['gender'] = f"Must be one of: {', '.join(sorted(GENDERS))}."
+        return data, errors
+
+    def _import_chunk(self, chunk, report):
+        cleaned = []
+        for line, row in chunk:
+            data, errors = self._clean(row)
+            if errors:
+                report.fail(line, data['reg_number'] or None, errors)
+            else:
+                cleaned.append((line, data))
+
+        reg_numbers = [data['reg_number'] for line, data in cleaned]
+        emails = [data['email'] for line, data in cleaned]
+        taken_reg_numbers = set()
+        for reg_number, username in User.objects.filter(
+            Q(reg_number__in=reg_numbers) | Q(username__in=reg_numbers)
+        ).values_list('reg_number', 'username'):
+            taken_reg_numbers.update([reg_number, username])
+        # Emails are stored as given elsewhere; compare them case-insensitively
+        taken_emails = set(
+            User.objects.annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=emails).values_list('email_lower', flat=True)
+        )
+
+        valid = []
+        for line, data in cleaned:
+            errors = {}
+            if data['reg_number'] in taken_reg_numbers:
+                errors['reg_number'] = 'A user with this reg_number already exists.'
+            elif data['reg_number'] in self._seen_reg_numbers:
+                errors['reg_number'] = 'Duplicate reg_number in file.'
+            if data['email'] in taken_emails:
+                errors['email'] = 'A user with this email already exists.'
+            elif data['email'] in self._seen_emails:
+                errors['email'] = 'Duplicate email in file.'
+            self._seen_reg_numbers.add(data['reg_number'])
+            self._seen_emails.add(data['email'])
+            if errors:
+                report.fail(line, data['reg_number'], errors)
+            else:
+                valid.append((line, data))
+
+        if not valid:
+            return
+        if self.dry_run:
+            # Dry runs report how many users would have been created
+            report.created += len(valid)
+            return
+
+        passwords = [data.pop('password') for line, data in valid]
+        # Rows without a password get an unusable one, which costs no hashing
+        given = [password for password in passwords if password]
+        given_hashes = iter(self._hash_passwords(given))
+        hashes = [next(given_hashes) if password else make_password(None) for password in passwords]
+
+        users = [
+            User(username=data['reg_number'], role=self.role, password=password_hash, **data)
+            for (line, data), password_hash in zip(valid, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=self.chunk_size)
+            created = users
+        except IntegrityError:
+            # Someone registered one of these users meanwhile; insert row by row to find out who
+            created = []
+            for (line, data), user in zip(valid, users):
+                try:
+                    with transaction.atomic():
+                        user.save()
+                    created.append(user)
+                except IntegrityError:
+                    report.fail(line, data['reg_number'], {'reg_number': 'Conflicts with an existing user.'})
+        report.created += len(created)
+
+        if self.invite:
+            # MySQL does not return the ids of bulk inserted rows; reload the new accounts
+            invited = [user.reg_number for user in created if not user.has_usable_password()]
+            if invited:
+                report.invited += send_password_links(User.objects.filter(reg_number__in=invited), kind='invite')
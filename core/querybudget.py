@@ -0,0 +1,163 @@
+"""
+SQL query budgets.
+
+Viewsets declare how many queries each action may run, independent of how
+many rows it returns:
+
+    class OrderViewset(QueryBudgetMixin, viewsets.ModelViewSet):
+        query_budgets = {'list': 5, 'retrieve': 5}
+
+Function views get theirs from the `query_budget` decorator, put above
+@api_view so authentication is counted too:
+
+    @query_budget(2)
+    @api_view(['GET'])
+    def kitchen_view(request): ...
+
+A sampled fraction of requests (QUERY_BUDGET_SAMPLE_RATE) is counted. Going
+over budget logs a warning with every statement and the stack of the first
+query past the limit, or raises QueryBudgetExceeded when QUERY_BUDGET_RAISE
+is set, which the test profile does so every API test enforces the budgets.
+Tests can also wrap arbitrary code with `QueryBudget(n)`, as a context
+manager or decorator.
+"""
+
+import logging
+import random
+import traceback
+from contextlib import ContextDecorator, ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Frames from these packages are noise in the reported stacks
+_LIBRARY_MARKERS = ('/django/', '/rest_framework/', '/rest_framework_simplejwt/', '/site-packages/')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _project_stack():
+    frames = traceback.extract_stack()[:-3]
+    relevant = [frame for frame in frames if not any(marker in frame.filename for marker in _LIBRARY_MARKERS)]
+    return ''.join(traceback.format_list(relevant[-8:] or frames[-8:]))
+
+
+class QueryBudget(ContextDecorator):
+    """
+    Count the queries run inside the block on every database connection.
+    With `limit` set, going over it raises QueryBudgetExceeded on exit
+    (unless `strict` is off; check `exceeded` yourself then).
+    """
+
+    def __init__(self, limit=None, label=None, strict=True):
+        self.limit = limit
+        self.label = label
+        self.strict = strict
+        self.queries = []
+
+    def __call__(self, func):
+        self.label = self.label or func.__qualname__
+        return super().__call__(func)
+
+    def _record(self, execute, sql, params, many, context):
+        # Stacks are only worth their cost once the budget is blown
+        over = self.limit is not None and len(self.queries) >= self.limit
+        self.queries.append((sql, _project_stack() if over else None))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.queries = []
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self._record))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stack.close()
+        if self.strict and exc_type is None and self.exceeded:
+            raise QueryBudgetExceeded(self.report())
+        return False
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def exceeded(self):
+        return self.limit is not None and self.count > self.limit
+
+    def report(self):
+        lines = [f"{self.label or 'Block'} ran {self.count} queries (budget {self.limit}):"]
+        lines += [f"  {number}. {sql}" for number, (sql, stack) in enumerate(self.queries, 1)]
+        first_over = next((stack for sql, stack in self.queries if stack), None)
+        if first_over:
+            lines += ["First query over budget was run from:", first_over.rstrip()]
+        return '\n'.join(lines)
+
+
+def _sampled():
+    sample_rate = getattr(settings, 'QUERY_BUDGET_SAMPLE_RATE', 0)
+    return sample_rate and random.random() < sample_rate
+
+
+def _check(budget):
+    if budget.exceeded:
+        if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+            raise QueryBudgetExceeded(budget.report())
+        logger.warning(budget.report())
+
+
+def query_budget(limit):
+    """Enforce `limit` queries on a function view, the way QueryBudgetMixin does for viewsets."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not _sampled():
+                return view(request, *args, **kwargs)
+            # @api_view hands back a generic `view`; its class carries the function's name
+            budget = QueryBudget(limit, label=getattr(view, 'cls', view).__name__, strict=False)
+            with budget:
+                response = view(request, *args, **kwargs)
+            _check(budget)
+            return response
+        return wrapped
+    return decorator
+
+
+class QueryBudgetMixin:
+    """
+    Enforce `query_budgets` ({action: max queries}) on a viewset. Actions
+    without an entry are not checked.
+    """
+
+    query_budgets = {}
+    _query_budget = None
+
+    def get_query_budget(self):
+        return self.query_budgets.get(getattr(self, 'action', None))
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        # The action is known from here on, before authentication runs any query
+        if self._query_budget is not None:
+            self._query_budget.limit = self.get_query_budget()
+            self._query_budget.label = f"{self.__class__.__name__}.{self.action}"
+        return request
+
+    def dispatch(self, request, *args, **kwargs):
+        if not _sampled():
+            return super().dispatch(request, *args, **kwargs)
+
+        budget = self._query_budget = QueryBudget(strict=False)
+        try:
+            with budget:
+                response = super().dispatch(request, *args, **kwargs)
+        finally:
+            self._query_budget = None
+        _check(budget)
+        return response
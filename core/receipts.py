@@ -0,0 +1,256 @@
+"""
+Payment receipts.
+
+Receipts are PNG images (thermal printer width) rendered with Pillow and
+stored under MEDIA_ROOT/receipts/ with a content hash in the name, which
+core.assets serves with immutable caching. The hash covers the receipt
+data and the layout version, so a payment whose receipt already exists is
+never rendered twice.
+
+Checkout never waits for rendering: once a completed payment is committed
+its id goes to `receipt_queue`, a background thread that collects ids for
+RECEIPT_BATCH_WINDOW seconds, loads them with a handful of queries, renders
+the batch (in a process pool of RECEIPT_WORKERS for larger batches) and
+fills `Payment.receipt_url` with one bulk update. End-of-day runs use the
+same renderer through the render_receipts command, which also picks up
+any payment the queue missed (e.g. a worker restarted mid-batch). Pillow is
+only imported once something is rendered.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Payment
+from .workers import pool_initargs, setup_django_worker
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so existing receipts are not reused
+LAYOUT_VERSION = 1
+WIDTH = 384
+MARGIN = 16
+FONT_SIZE = 18
+LINE_HEIGHT = 26
+POOL_MIN_BATCH = 16
+
+_fonts = {}
+
+
+def _font(size):
+    from PIL import ImageFont
+
+    if size not in _fonts:
+        _fonts[size] = ImageFont.load_default(size=size)
+    return _fonts[size]
+
+
+def receipt_data(payment):
+    """
+    Everything printed on `payment`'s receipt, as plain (picklable) values.
+    Expects order, order.user, order.outlet and order.items__menu_item to be
+    loaded already.
+    """
+    order = payment.order
+    customer = (order.user.name or order.user.username) if order.user else ''
+    return {
+        'payment_id': payment.id,
+        'payment_ref': payment.payment_ref,
+        'outlet': order.outlet.name if order.outlet else 'Smart Canteen',
+        'order_id': order.id,
+        'customer': customer,
+        'date': timezone.localtime(payment.created_at).strftime('%Y-%m-%d %H:%M'),
+        'method': payment.get_payment_method_display(),
+        'items': [[item.quantity, item.menu_item.name, str(item.subtotal)] for item in order.items.all()],
+        'total': str(order.total_price),
+        'amount': str(payment.amount),
+    }
+
+
+def receipt_name(data):
+    """Storage name for the receipt of `data`; changes whenever its content would."""
+    payload = json.dumps([LAYOUT_VERSION, data], sort_keys=True).encode()
+    digest = hashlib.sha256(payload).hexdigest()[:12]
+    month = data['date'][:7].replace('-', '/')
+    return f"receipts/{month}/receipt-{data['payment_id']}.{digest}.png"
+
+
+def render_receipt(data):
+    """Render the receipt for `data` and return the PNG bytes."""
+    from PIL import Image, ImageDraw
+
+    font, title_font = _font(FONT_SIZE), _font(FONT_SIZE + 6)
+    right = WIDTH - MARGIN
+    lines = 8 + len(data['items'])
+    image = Image.new('L', (WIDTH, MARGIN * 2 + LINE_HEIGHT * lines + 12), 255)
+    draw = ImageDraw.Draw(image)
+
+    y = MARGIN
+    draw.text((WIDTH // 2, y), data['outlet'], font=title_font, fill=0, anchor='ma')
+    y += LINE_HEIGHT + 6
+    for text in (f"Receipt {data['payment_ref']}", f"Order #{data['order_id']}  {data['date']}", data['customer']):
+        draw.text((MARGIN, y), text, font=font, fill=0)
+        y += LINE_HEIGHT
+    draw.line((MARGIN, y, right, y), fill=0)
+    y += 6
+
+    for quantity, name, subtotal in data['items']:
+        draw.text((MARGIN, y), f"{quantity} x {name}"[:32], font=font, fill=0)
+        draw.text((right, y), subtotal, font=font, fill=0, anchor='ra')
+        y += LINE_HEIGHT
+    draw.line((MARGIN, y, right, y), fill=0)
+    y += 6
+
+    for label, value in (('Total', data['total']), (f"Paid ({data['method']})", data['amount'])):
+        draw.text((MARGIN, y), label, font=font, fill=0)
+        draw.text((right, y), value, font=font, fill=0, anchor='ra')
+        y += LINE_HEIGHT
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class ReceiptRenderer:
+    """
+    Renders receipts in batches. Use as a context manager (or call close())
+    so the process pool, if one was started, is shut down.
+    """
+
+    def __init__(self, workers=None, force=False):
+        self.workers = workers if workers is not None else getattr(settings, 'RECEIPT_WORKERS', os.cpu_count() or 1)
+        self.force = force
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _render_all(self, batch):
+        # Starting worker processes only pays off for reasonably large batches
+        if self.workers <= 1 or len(batch) < POOL_MIN_BATCH:
+            return [render_receipt(data) for data in batch]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context('spawn'),
+                initializer=setup_django_worker,
+                initargs=pool_initargs(),
+            )
+        chunksize = max(1, len(batch) // (self.workers * 4))
+        return list(self._executor.map(render_receipt, batch, chunksize=chunksize))
+
+    def store(self, batch):
+        """
+        Render and store the receipts of `batch` (receipt_data dicts) that
+        do not exist yet. Returns {payment_id: receipt url}.
+        """
+        names = {data['payment_id']: receipt_name(data) for data in batch}
+        missing = [data for data in batch if not default_storage.exists(names[data['payment_id']])]
+        for data, image in zip(missing, self._render_all(missing)):
+            default_storage.save(names[data['payment_id']], ContentFile(image))
+        return {payment_id: default_storage.url(name) for payment_id, name in names.items()}
+
+    def render_ids(self, ids, using=DEFAULT_DB_ALIAS):
+        """Fill receipt_url for the completed payments `ids` in database `using`. Returns the count."""
+        payments = Payment.objects.using(using).filter(id__in=ids, payment_status='completed')
+        if not self.force:
+            payments = payments.filter(receipt_url__isnull=True)
+        # Users, outlets and menu items may live in another database, so prefetch rather than join
+        payments = list(payments.select_related('order').prefetch_related(
+            'order__user', 'order__outlet', 'order__items__menu_item',
+        ))
+        if not payments:
+            return 0
+
+        urls = self.store([receipt_data(payment) for payment in payments])
+        now = timezone.now()
+        for payment in payments:
+            payment.receipt_url = urls[payment.id]
+            payment.updated_at = now
+        Payment.objects.using(using).bulk_update(payments, ['receipt_url', 'updated_at'], batch_size=500)
+        return len(payments)
+
+
+class ReceiptQueue:
+    """Collects committed payment ids and renders them in batches on a background thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._thread = None
+        self._renderer = None
+
+    def submit(self, payment_id, using=DEFAULT_DB_ALIAS):
+        if not getattr(settings, 'RECEIPT_ASYNC', True):
+            with ReceiptRenderer(workers=0) as renderer:
+                renderer.render_ids([payment_id], using=using)
+            return
+        with self._lock:
+            self._pending.setdefault(using, set()).add(payment_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='receipt-renderer', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _take(self, limit):
+        with self._lock:
+            batches = []
+            for using in list(self._pending):
+                ids = self._pending[using]
+                taken = [ids.pop() for _ in range(min(limit, len(ids)))]
+                if not ids:
+                    del self._pending[using]
+                batches.append((using, taken))
+            return batches
+
+    def _run(self):
+        window = getattr(settings, 'RECEIPT_BATCH_WINDOW', 0.5)
+        batch_size = getattr(settings, 'RECEIPT_BATCH_SIZE', 100)
+        self._renderer = ReceiptRenderer()
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Let more payments of the same rush join the batch
+            time.sleep(window)
+            while batches := self._take(batch_size):
+                for using, ids in batches:
+                    try:
+                        self._renderer.render_ids(ids, using=using)
+                    except Exception:
+                        logger.exception("Rendering receipts for payments %s failed", ids)
+                close_old_connections()
+
+
+receipt_queue = ReceiptQueue()
+
+
+@receiver(post_save, sender=Payment)
+def _payment_saved(sender, instance, raw=False, **kwargs):
+    if raw or instance.payment_status != 'completed' or instance.receipt_url:
+        return
+    using = instance._state.db
+    transaction.on_commit(partial(receipt_queue.submit, instance.id, using), using=using)
@@ -1,5 +1,11 @@
+from collections import Counter
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from .models import User, MenuItem, Order, OrderItem, Payment, Notification, Inventory, Tag
+from . import audit
+from .alerts import decrement_stock, stock_transaction
+from .orders import conditional_update
+from .outlets import current_outlet
+from .models import User, Outlet, MenuItem, Order, OrderItem, Payment, Notification, Inventory, Tag, ArchivedOrder, AuditEvent, OrderTicket
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -44,6 +50,22 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 
+class PasswordResetSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+
+
+class PasswordResetConfirmSerializer(serializers.Serializer):
+    uid = serializers.CharField()
+    token = serializers.CharField()
+    password = serializers.CharField(write_only=True, min_length=8)
+
+
+class OutletSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Outlet
+        fields = ['id', 'name', 'code', 'is_active']
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -63,7 +85,7 @@ class MenuItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = MenuItem
         fields = ['id', 'name', 'description', 'price', 'availability', 
-                  'image_url', 'tags', 'tag_ids', 'created_at', 'updated_at']
+                  'image_url', 'tags', 'tag_ids', 'outlet', 'created_at', 'updated_at']
     
     def create(self, validated_data):
         tags = validated_data.pop('tags', [])
@@ -73,11 +95,13 @@ class MenuItemSerializer(serializers.ModelSerializer):
     
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags', None)
+        old_price = instance.price
         
         # Update all other fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
+        audit.record([audit.change(MenuItem, instance.pk, 'price', old_price, instance.price, instance.outlet_id)])
         
         # Update tags if provided
         if tags is not None:
@@ -110,28 +134,147 @@ class OrderSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Order
-        fields = ['id', 'user', 'total_price', 'total_amount', 'status', 'order_date', 'pickup_time', 'created_at', 'updated_at', 'items', 'items_data']
+        fields = ['id', 'user', 'outlet', 'total_price', 'total_amount', 'status', 'order_date', 'pickup_time', 'version', 'created_at', 'updated_at', 'items', 'items_data']
+        read_only_fields = ['version']
+
+    def validate_status(self, value):
+        """
+        Enforce the order state machine (see Order.STATUS_TRANSITIONS).
+        """
+        if self.instance is None:
+            if value != 'pending':
+                raise serializers.ValidationError("New orders must start as pending.")
+            return value
+
+        if not self.instance.can_transition(value):
+            raise serializers.ValidationError(
+                f"Cannot move an order from {self.instance.status} to {value}."
+            )
+
+        request = self.context.get('request')
+        is_staff = request is not None and request.user.role in ['staff', 'admin']
+        if value != self.instance.status and not is_staff:
+            if value != 'cancelled' or self.instance.status not in Order.CUSTOMER_CANCELLABLE:
+                raise serializers.ValidationError("You can only cancel an order before it is being prepared.")
+        return value
+
+    def validate_outlet(self, value):
+        """
+        Orders go to active outlets only, stay at the outlet they were placed
+        at, and staff with a home outlet only work on that outlet's orders
+        (see OutletStaffPermission).
+        """
+        if self.instance is not None:
+            if value != self.instance.outlet:
+                raise serializers.ValidationError("An order cannot move to another outlet.")
+            return value
+        if value is not None and not value.is_active:
+            raise serializers.ValidationError("Unknown or inactive outlet.")
+        request = self.context.get('request')
+        user = request.user if request is not None else None
+        if user is not None and user.is_authenticated and user.role == 'staff' and user.outlet_id is not None:
+            if value is not None and value.pk != user.outlet_id:
+                raise serializers.ValidationError("You can only work on your own outlet's orders.")
+        return value
 
     def create(self, validated_data):
+        # The order goes to its outlet's database while stock stays in the default one
+        with stock_transaction(validated_data.get('outlet')) as taken:
+            order = self.create_order(validated_data, taken)
+        prefetch_related_objects([order], 'items__menu_item__tags')
+        return order
+
+    def create_order(self, validated_data, taken):
         items_data = validated_data.pop('items_data', [])
         order = Order.objects.create(**validated_data)
+        audit.record([audit.change(Order, order.pk, 'status', None, order.status, order.outlet_id)], using=order._state.db)
+        ordered = Counter()
+        order_items = []
         for item_data in items_data:
             menu_item_id = item_data.get('menu_item_id')
             quantity = item_data.get('quantity')
             subtotal = item_data.get('subtotal')
-            OrderItem.objects.create(
+            order_items.append(OrderItem(
                 order=order,
                 menu_item_id=menu_item_id,
                 quantity=quantity,
                 subtotal=subtotal
-            )
+            ))
+            ordered[menu_item_id] += int(quantity)
+        # One INSERT for all items keeps order creation within its query budget
+        OrderItem.objects.bulk_create(order_items)
+
+        # Take the ordered quantities out of the outlet's stock and raise low-stock alerts
+        decrement_stock(ordered, outlet_id=order.outlet_id)
+        taken.update(ordered)
         return order
 
+    def update(self, instance, validated_data):
+        validated_data.pop('items_data', None)
+        expected_version = validated_data.pop('expected_version', None)
+        if expected_version is None:
+            expected_version = instance.version
+        return conditional_update(instance, expected_version, **validated_data)
+
+
+class OrderTicketSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderTicket
+        fields = ['id', 'status', 'order_id', 'outlet', 'error', 'created_at', 'processed_at']
+        read_only_fields = fields
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """Read-only view of an archived order, shaped like OrderSerializer."""
+    id = serializers.IntegerField(source='order_id', read_only=True) # The id the order had while live
+    total_amount = serializers.DecimalField(source='total_price', max_digits=10, decimal_places=2, read_only=True)
+    user = UserSerializer(read_only=True)
+    archived = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'user', 'outlet', 'total_price', 'total_amount', 'status', 'order_date', 'pickup_time', 'created_at', 'updated_at', 'archived_at', 'items', 'payments', 'archived']
+        read_only_fields = fields
+
+    def get_archived(self, obj):
+        return True
+
+
+class OrderVersionSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    version = serializers.IntegerField()
+
+
+class OrderBulkTransitionSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=list(Order.STATUS_TRANSITIONS))
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    orders = OrderVersionSerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('ids') and not attrs.get('orders'):
+            raise serializers.ValidationError("Provide either ids or orders.")
+        return attrs
+
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
 
+    def validate_order(self, value):
+        """
+        The order is looked up in the request outlet's database (see
+        OutletMixin), and must be that outlet's order. Students only pay for
+        their own orders.
+        """
+        outlet = current_outlet()
+        if outlet is not None and value.outlet_id != outlet.pk:
+            raise serializers.ValidationError("This order was placed at another outlet.")
+        request = self.context.get('request')
+        user = request.user if request is not None else None
+        if user is not None and user.role not in ['staff', 'admin'] and value.user_id != user.pk:
+            raise serializers.ValidationError("You can only pay for your own orders.")
+        return value
+
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -144,3 +287,11 @@ class InventorySerializer(serializers.ModelSerializer):
         model = Inventory
         fields = '__all__'
 
+
+class AuditEventSerializer(serializers.ModelSerializer):
+    actor_name = serializers.CharField(source='actor.name', default=None, read_only=True)
+
+    class Meta:
+        model = AuditEvent
+        fields = ['id', 'field', 'old_value', 'new_value', 'actor', 'actor_name', 'created_at']
+        read_only_fields = fields
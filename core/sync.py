@@ -0,0 +1,155 @@
+"""
+Delta sync for the student app.
+
+Clients send the watermark from their previous sync and get back only the
+menu items, tags, orders and notifications whose updated_at moved past it
+(all range scans on updated_at indexes), plus tombstones for rows deleted in
+the meantime. A repeat open with nothing new costs a handful of empty index
+lookups and an almost empty payload.
+
+Watermarks are server timestamps. Each sync re-reads a short SYNC_OVERLAP
+window before the watermark so rows from transactions that committed late
+are not missed; clients apply the rows as upserts, so repeats are harmless.
+
+Orders are read from every order database (see core/outlets.py). Their ids
+are only unique per database, so order tombstones name the outlet too:
+`deleted['orders']` lists {"id", "outlet"} pairs, the other scopes plain ids.
+Tombstones all live in `default`. Bulk deletes of orders (archiving) write
+their tombstones in one insert instead of one per order.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import MenuItem, Notification, Order, Tag, Tombstone, User
+from .outlets import shard_aliases
+from .serializers import MenuItemSerializer, NotificationSerializer, OrderSerializer, TagSerializer
+
+
+def _overlap():
+    return timedelta(seconds=getattr(settings, 'SYNC_OVERLAP', 5))
+
+
+def _tombstone_retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_DAYS', 30))
+
+
+_bulk_deletes = ContextVar('sync_bulk_deletes', default=False)
+
+
+@contextmanager
+def bulk_order_deletes():
+    """
+    Skip the per-order tombstones of order deletes in the block. The caller
+    writes them itself, with `order_tombstones`.
+    """
+    token = _bulk_deletes.set(True)
+    try:
+        yield
+    finally:
+        _bulk_deletes.reset(token)
+
+
+def order_tombstones(orders):
+    """Unsaved tombstones for deleting `orders`, for bulk_create."""
+    return [
+        Tombstone(scope='orders', object_id=order.pk, user_id=order.user_id, outlet_id=order.outlet_id)
+        for order in orders if order.user_id
+    ]
+
+
+def _user_orders(user, cutoff):
+    """The orders of `user` in every order database, newest first."""
+    orders = []
+    for using in [DEFAULT_DB_ALIAS, *sorted(shard_aliases())]:
+        queryset = Order.objects.using(using).filter(user=user).prefetch_related('items__menu_item__tags')
+        # Users are not in outlet databases, so no join there
+        queryset = queryset.select_related('user') if using == DEFAULT_DB_ALIAS else queryset.prefetch_related('user')
+        if cutoff is not None:
+            queryset = queryset.filter(updated_at__gte=cutoff)
+        orders.extend(queryset)
+    orders.sort(key=lambda order: order.created_at, reverse=True)
+    return orders
+
+
+def build_sync(request, since=None):
+    """
+    Return the sync payload for `request.user`.
+
+    `since` is the client's last watermark (or None for a first sync). A
+    watermark older than the tombstone retention cannot be served as a
+    delta, so the client gets a full snapshot with `full` set.
+    """
+    user = request.user
+    watermark = timezone.now()
+    full = since is None or since < watermark - _tombstone_retention()
+
+    menu = MenuItem.objects.prefetch_related('tags')
+    tags = Tag.objects.all()
+    notifications = Notification.objects.filter(user=user)
+
+    deleted = {scope: [] for scope, label in Tombstone.SCOPES}
+    cutoff = None
+    if not full:
+        cutoff = since - _overlap()
+        menu = menu.filter(updated_at__gte=cutoff)
+        tags = tags.filter(updated_at__gte=cutoff)
+        notifications = notifications.filter(updated_at__gte=cutoff)
+
+        tombstones = Tombstone.objects.filter(Q(user__isnull=True) | Q(user=user), deleted_at__gte=cutoff)
+        for scope, object_id, outlet_id in tombstones.values_list('scope', 'object_id', 'outlet_id'):
+            deleted[scope].append({'id': object_id, 'outlet': outlet_id} if scope == 'orders' else object_id)
+
+    context = {'request': request}
+    return {
+        'watermark': watermark,
+        'full': full,
+        'menu': MenuItemSerializer(menu, many=True, context=context).data,
+        'tags': TagSerializer(tags, many=True, context=context).data,
+        'orders': OrderSerializer(_user_orders(user, cutoff), many=True, context=context).data,
+        'notifications': NotificationSerializer(notifications.order_by('-timestamp'), many=True, context=context).data,
+        'deleted': deleted,
+    }
+
+
+def purge_tombstones():
+    """Drop tombstones no client can still need. Returns the number deleted."""
+    cutoff = timezone.now() - _tombstone_retention()
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
+
+
+@receiver(post_delete, sender=MenuItem)
+def _menu_item_deleted(sender, instance, **kwargs):
+    Tombstone.objects.create(scope='menu', object_id=instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+def _tag_deleted(sender, instance, **kwargs):
+    Tombstone.objects.create(scope='tags', object_id=instance.pk)
+
+
+def _user_deleted(origin):
+    # Rows deleted along with their user need no tombstone (and it would point at the deleted user)
+    return isinstance(origin, User) or getattr(origin, 'model', None) is User
+
+
+@receiver(post_delete, sender=Order)
+def _order_deleted(sender, instance, origin=None, **kwargs):
+    if instance.user_id and not _bulk_deletes.get() and not _user_deleted(origin):
+        Tombstone.objects.create(scope='orders', object_id=instance.pk, user_id=instance.user_id,
+                                 outlet_id=instance.outlet_id)
+
+
+@receiver(post_delete, sender=Notification)
+def _notification_deleted(sender, instance, origin=None, **kwargs):
+    if not _user_deleted(origin):
+        Tombstone.objects.create(scope='notifications', object_id=instance.pk, user_id=instance.user_id)
@@ -0,0 +1,164 @@
+"""
+Precomputed tag -> menu item index.
+
+Every Tag row stores `member_ids`, the sorted ids of the menu items that
+carry it (packed as 8-byte integers). Workers load them into memory as
+bitsets over dense positions: the menu item ids found in any tag, in id
+order, are numbered 0, 1, 2, ..., so a bitset is as long as the tagged part
+of the menu however large or sparse the ids are. "Hot AND Lunch AND Main
+Course" is then two `&` operations instead of a join per tag plus DISTINCT;
+the menu query only needs `id IN (...)`.
+
+The id lists are rebuilt from the M2M table whenever MenuItem.tags changes
+(or a tagged menu item is deleted) and written back to the tag rows. The
+'tags' cache version from core/caching.py doubles as the index generation,
+so a worker reloads its copy (one query over the tag table) once anyone
+changed tags or menu items. With a per-process cache other workers do not
+see that version move, so copies are also reloaded after TAG_INDEX_TTL
+seconds.
+"""
+
+import struct
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from .caching import bump_version, get_version
+from .models import MenuItem, Tag
+
+MenuItemTags = MenuItem.tags.through
+
+
+def encode(ids):
+    """Ids -> the packed, sorted form stored in Tag.member_ids."""
+    ids = sorted(set(ids))
+    return struct.pack(f'<{len(ids)}Q', *ids)
+
+
+def decode(data):
+    """Tag.member_ids -> list of ids."""
+    return list(struct.unpack(f'<{len(data) // 8}Q', data))
+
+
+def rebuild(tag_ids=None):
+    """
+    Recompute `member_ids` for `tag_ids` (all tags when None) with one read
+    of the M2M table and one bulk update, then invalidate cached copies.
+    """
+    tags = Tag.objects.all() if tag_ids is None else Tag.objects.filter(id__in=tag_ids)
+    tags = list(tags.only('id'))
+    if not tags:
+        return 0
+
+    members = {tag.id: [] for tag in tags}
+    links = MenuItemTags.objects.filter(tag_id__in=members).values_list('tag_id', 'menuitem_id')
+    for tag_id, menu_item_id in links.iterator():
+        members[tag_id].append(menu_item_id)
+
+    for tag in tags:
+        tag.member_ids = encode(members[tag.id])
+    Tag.objects.bulk_update(tags, ['member_ids'], batch_size=500)
+    bump_version('menu', 'tags')
+    return len(tags)
+
+
+def _bitset(positions, size):
+    """Int with the bits at `positions` set, built in one pass over a byte buffer."""
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class TagIndex:
+    """Per-process copy of the tag index, as bitsets over dense positions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bits = None
+        self._ids = []
+        self._generation = None
+        self._loaded_at = 0
+
+    def reset(self):
+        with self._lock:
+            self._bits = None
+
+    def _load(self):
+        members = {tag_id: decode(member_ids) for tag_id, member_ids in Tag.objects.values_list('id', 'member_ids')}
+        ids = sorted(set().union(*members.values()))
+        position = {item_id: number for number, item_id in enumerate(ids)}
+        bits = {
+            tag_id: _bitset((position[item_id] for item_id in item_ids), len(ids))
+            for tag_id, item_ids in members.items()
+        }
+        return bits, ids
+
+    def _stale(self, generation):
+        if self._bits is None or generation != self._generation:
+            return True
+        return time.monotonic() - self._loaded_at > getattr(settings, 'TAG_INDEX_TTL', 60)
+
+    def _current(self):
+        generation = get_version('tags')
+        with self._lock:
+            if self._stale(generation):
+                self._bits, self._ids = self._load()
+                self._generation = generation
+                self._loaded_at = time.monotonic()
+            return self._bits, self._ids
+
+    def match(self, tag_ids, match_all=True):
+        """
+        Ids of menu items carrying all (or, with match_all=False, any) of
+        `tag_ids`. Unknown tag ids match nothing.
+        """
+        bits, ids = self._current()
+        sets = [bits.get(tag_id, 0) for tag_id in tag_ids]
+        if not sets:
+            return []
+        result = sets[0]
+        for other in sets[1:]:
+            result = result & other if match_all else result | other
+
+        matched = []
+        while result:
+            low = result & -result
+            matched.append(ids[low.bit_length() - 1])
+            result ^= low
+        return matched
+
+
+tag_index = TagIndex()
+
+
+@receiver(m2m_changed, sender=MenuItemTags)
+def _menu_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # Remember which tags lose members; pk_set is not given for clears
+        if reverse:
+            instance._cleared_tag_ids = {instance.pk}
+        else:
+            instance._cleared_tag_ids = set(instance.tags.values_list('id', flat=True))
+        return
+    if action == 'post_clear':
+        tag_ids = getattr(instance, '_cleared_tag_ids', None)
+    elif action in ('post_add', 'post_remove'):
+        tag_ids = {instance.pk} if reverse else set(pk_set or ())
+    else:
+        return
+    if tag_ids:
+        transaction.on_commit(partial(rebuild, tag_ids))
+
+
+@receiver(pre_delete, sender=MenuItem)
+def _menu_item_deleting(sender, instance, **kwargs):
+    # The M2M rows go with the item without an m2m_changed signal
+    tag_ids = set(MenuItemTags.objects.filter(menuitem_id=instance.pk).values_list('tag_id', flat=True))
+    if tag_ids:
+        transaction.on_commit(partial(rebuild, tag_ids))
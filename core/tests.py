@@ -1,3 +1,1887 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connections, transaction
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from smartcanteen import settings as profiles
+
+from . import admission, audit
+from .assets import _compress, serve_file
+from .archive import _snapshot, archive_orders
+from .admission import process_tickets
+from .alerts import stock_alerts
+from .admin import ESTIMATED_COUNT_MIN, EstimatedCountPaginator, InventoryAdmin, MenuItemAdmin, OrderAdmin, estimated_count
+from .caching import SingleFlight, get_version
+from .forecasting import DemandForecaster, apply_forecast, run_forecast, stream_demand
+from .kitchen import kitchen_board
+from .middleware import JSONGZipMiddleware
+from .models import (
+    User, Outlet, MenuItem, Order, OrderItem, OrderTicket, Payment, Notification, Inventory, Tag, AuditEvent,
+    ArchivedOrder, InventoryForecast, Tombstone,
+)
+from .outlets import outlets, use_outlet
+from .profiling import Sampler
+from .provisioning import UserImporter
+from .querybudget import QueryBudget, QueryBudgetExceeded, query_budget
+from .receipts import POOL_MIN_BATCH, ReceiptQueue, ReceiptRenderer
+from .throttling import AnonIPBucketThrottle, CacheBucketStore, LocalBucketStore
+from .tagindex import decode, encode, tag_index
+from .tokens import RefreshToken, TokenVerifyView, purge_expired_tokens, revoked_tokens
+from .urls import router
+from .views import OrderViewset, OutletViewset
+
+
+def make_user(username, role='student'):
+    return User.objects.create_user(
+        username=username, password='secret123', email=f'{username}@example.com',
+        reg_number=username.upper(), role=role,
+    )
+
+
+def api_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    return client
+
+
+class QueryBudgetTests(TestCase):
+    def test_within_budget(self):
+        with QueryBudget(2) as budget:
+            list(User.objects.all())
+            list(Tag.objects.all())
+        self.assertEqual(budget.count, 2)
+
+    def test_over_budget_reports_sql_and_stack(self):
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            with QueryBudget(1, label='two queries'):
+                list(User.objects.all())
+                list(Tag.objects.all())
+        report = str(raised.exception)
+        self.assertIn('two queries ran 2 queries (budget 1)', report)
+        self.assertIn('core_tag', report)
+        self.assertIn('First query over budget was run from:', report)
+        self.assertIn('tests.py', report)
+
+    def test_decorator(self):
+        @QueryBudget(0)
+        def touches_db():
+            return User.objects.count()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            touches_db()
+
+
+class ViewsetQueryBudgetTests(TestCase):
+    """
+    Requests made here go through QueryBudgetMixin with the test profile's
+    QUERY_BUDGET_RAISE, so any view over its declared budget fails the test.
+    """
+
+    databases = {'default', 'outlet_north'}
+
+    def setUp(self):
+        cache.clear()
+        self.student = make_user('student1')
+        self.staff = make_user('staff1', role='staff')
+        self.tags = [
+            Tag.objects.create(name='Hot', tag_type='temperature'),
+            Tag.objects.create(name='Lunch', tag_type='time_of_day'),
+        ]
+        self.items = []
+        for number in range(3):
+            item = MenuItem.objects.create(name=f'Dish {number}', description='', price=Decimal('2.50'))
+            item.tags.set(self.tags)
+            Inventory.objects.create(menu_item=item, quantity=50, stock_level=50, threshold=5)
+            self.items.append(item)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(
+                user=self.student, total_price=Decimal('5.00'), status='pending',
+                order_date=datetime.date.today(),
+            )
+            for item in self.items:
+                OrderItem.objects.create(order=order, menu_item=item, quantity=1, subtotal=Decimal('2.50'))
+            Payment.objects.create(order=order, payment_ref='ref', amount=Decimal('5.00'),
+                                   payment_method='cash', payment_status='completed')
+            Notification.objects.create(user=self.student, message='Order placed')
+
+    def test_order_list_cost_does_not_grow_with_orders(self):
+        client = api_client(self.student)
+        self.add_orders(2)
+        with QueryBudget() as few:
+            self.assertEqual(client.get('/api/order/').status_code, 200)
+        self.add_orders(20)
+        with QueryBudget() as many:
+            self.assertEqual(len(client.get('/api/order/').json()), 22)
+        self.assertEqual(few.count, many.count)
+        self.assertLessEqual(many.count, OrderViewset.query_budgets['list'])
+
+    def test_read_endpoints_within_budget(self):
+        self.add_orders(5)
+        order = Order.objects.first()
+        student, staff = api_client(self.student), api_client(self.staff)
+        for client, url in [
+            (staff, '/api/users/'),
+            (staff, f'/api/users/{self.student.id}/'),
+            (student, '/api/menu/'),
+            (student, f'/api/menu/{self.items[0].id}/'),
+            (student, '/api/order/'),
+            (student, f'/api/order/{order.id}/'),
+            (staff, '/api/order/history/'),
+            (student, '/api/order-item/'),
+            (student, f'/api/order-item/{order.items.first().id}/'),
+            (student, '/api/payment/'),
+            (student, '/api/notification/'),
+            (staff, '/api/inventory/'),
+            (staff, '/api/inventory/restock-report/'),
+            (student, '/api/tags/'),
+            (student, f'/api/tags/{self.tags[0].id}/'),
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 200)
+
+    def test_write_endpoints_within_budget(self):
+        student, staff = api_client(self.student), api_client(self.staff)
+        response = student.post('/api/order/', {
+            'total_price': '7.50', 'status': 'pending', 'order_date': str(datetime.date.today()),
+            'items_data': [{'menu_item_id': item.id, 'quantity': 1, 'subtotal': '2.50'} for item in self.items],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        order_id = response.json()['id']
+
+        response = student.patch(f'/api/order/{order_id}/', {'status': 'cancelled', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = staff.patch(f'/api/menu/{self.items[0].id}/', {'price': '3.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        inventory = Inventory.objects.first()
+        response = staff.patch(f'/api/inventory/{inventory.id}/', {'quantity': 4}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_every_action_has_a_budget(self):
+        for prefix, viewset, basename in router.registry:
+            actions = [name for name in ('list', 'retrieve', 'create', 'update', 'partial_update', 'destroy')
+                       if hasattr(viewset, name)]
+            actions += [extra.__name__ for extra in viewset.get_extra_actions()]
+            with self.subTest(viewset=viewset.__name__):
+                self.assertEqual([name for name in actions if name not in viewset.query_budgets], [])
+
+    def test_function_views_are_budgeted(self):
+        @query_budget(1)
+        @api_view(['GET'])
+        @permission_classes([])
+        def two_queries(request):
+            return Response({'users': User.objects.count(), 'tags': Tag.objects.count()})
+
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            two_queries(RequestFactory().get('/'))
+        self.assertIn('two_queries ran 2 queries (budget 1)', str(raised.exception))
+
+    def test_over_budget_raises_in_tests(self):
+        with mock.patch.object(OrderViewset, 'query_budgets', {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                api_client(self.student).get('/api/order/')
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_over_budget_only_warns_at_runtime(self):
+        with mock.patch.object(OrderViewset, 'query_budgets', {'list': 1}):
+            with self.assertLogs('core.querybudget', 'WARNING') as logs:
+                response = api_client(self.student).get('/api/order/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('OrderViewset.list ran', logs.output[0])
+
+
+class OutletShardingTests(TestCase):
+    """
+    The test profile maps the 'north' outlet to its own SQLite database
+    (outlet_north); 'south' keeps its orders in default.
+    """
+    databases = {'default', 'outlet_north'}
+
+    def setUp(self):
+        cache.clear()
+        self.north = Outlet.objects.create(name='North Canteen', code='north')
+        self.south = Outlet.objects.create(name='South Canteen', code='south')
+        outlets.get(self.north.pk)  # warm the directory like a running worker
+        self.student = make_user('student1')
+        self.admin = make_user('admin1', role='admin')
+        self.north_staff = make_user('staff1', role='staff')
+        self.north_staff.outlet = self.north
+        self.north_staff.save()
+
+        self.shared = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+        self.south_only = MenuItem.objects.create(name='Pilau', description='', price=Decimal('3.00'), outlet=self.south)
+        self.north_stock = Inventory.objects.create(menu_item=self.shared, outlet=self.north,
+                                                    quantity=20, stock_level=20, threshold=2)
+        self.south_stock = Inventory.objects.create(menu_item=self.shared, outlet=self.south,
+                                                    quantity=20, stock_level=20, threshold=2)
+
+    def place_order(self, outlet, quantity=2):
+        response = api_client(self.student).post(f'/api/order/?outlet={outlet.pk}', {
+            'total_price': '2.00', 'status': 'pending', 'order_date': str(datetime.date.today()),
+            'items_data': [{'menu_item_id': self.shared.id, 'quantity': quantity, 'subtotal': '2.00'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def test_shard_database_only_has_order_tables(self):
+        tables = connections['outlet_north'].introspection.table_names()
+        self.assertIn('core_order', tables)
+        self.assertIn('core_orderitem', tables)
+        self.assertNotIn('core_user', tables)
+        self.assertNotIn('core_menuitem', tables)
+
+    def test_orders_are_routed_to_their_outlet_database(self):
+        north_order = self.place_order(self.north)
+        south_order = self.place_order(self.south)
+
+        self.assertEqual(north_order['outlet'], self.north.pk)
+        self.assertEqual(north_order['items'][0]['menu_item']['name'], 'Chapati')
+        self.assertTrue(Order.objects.using('outlet_north').filter(pk=north_order['id'], outlet=self.north).exists())
+        self.assertTrue(OrderItem.objects.using('outlet_north').filter(order_id=north_order['id']).exists())
+        self.assertFalse(Order.objects.using('default').filter(outlet=self.north).exists())
+        self.assertTrue(Order.objects.using('default').filter(pk=south_order['id'], outlet=self.south).exists())
+
+        client = api_client(self.student)
+        listed = client.get(f'/api/order/?outlet={self.north.pk}').json()
+        self.assertEqual([order['id'] for order in listed], [north_order['id']])
+        self.assertEqual(listed[0]['user']['id'], self.student.id)
+        response = client.get(f'/api/order/{north_order["id"]}/?outlet={self.north.pk}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_stock_is_counted_per_outlet(self):
+        self.place_order(self.north, quantity=5)
+        self.north_stock.refresh_from_db()
+        self.south_stock.refresh_from_db()
+        self.assertEqual(self.north_stock.quantity, 15)
+        self.assertEqual(self.south_stock.quantity, 20)
+
+    def test_shared_item_stays_available_when_one_outlet_sells_out(self):
+        self.place_order(self.north, quantity=20)
+        self.shared.refresh_from_db()
+        self.assertTrue(self.shared.availability)
+
+    def test_staff_are_limited_to_their_outlet(self):
+        staff = api_client(self.north_staff)
+        self.assertEqual(staff.get('/api/inventory/').status_code, 200)
+        self.assertEqual(
+            [row['id'] for row in staff.get('/api/inventory/').json()], [self.north_stock.id]
+        )
+        self.assertEqual(staff.get(f'/api/inventory/?outlet={self.south.pk}').status_code, 403)
+        self.assertEqual(staff.get(f'/api/order/?outlet={self.south.pk}').status_code, 403)
+        response = staff.patch(f'/api/inventory/{self.north_stock.id}/', {'quantity': 30}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = staff.patch(f'/api/menu/{self.south_only.id}/?outlet={self.south.pk}', {'price': '9.00'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        # Menus of other outlets are public
+        self.assertEqual(staff.get(f'/api/menu/?outlet={self.south.pk}').status_code, 200)
+
+    def test_bulk_transition_in_outlet_database(self):
+        order = self.place_order(self.north)
+        response = api_client(self.admin).post(f'/api/order/bulk-transition/?outlet={self.north.pk}', {
+            'status': 'confirmed', 'ids': [order['id']],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Order.objects.using('outlet_north').get(pk=order['id']).status, 'confirmed')
+
+    def test_bulk_transition_only_moves_the_outlets_orders(self):
+        # South and east both keep their orders in default
+        east = Outlet.objects.create(name='East Canteen', code='east')
+        Inventory.objects.create(menu_item=self.shared, outlet=east, quantity=20, stock_level=20, threshold=2)
+        south_staff = make_user('staff2', role='staff')
+        south_staff.outlet = self.south
+        south_staff.save()
+        east_order, south_order = self.place_order(east), self.place_order(self.south)
+
+        response = api_client(south_staff).post(f'/api/order/bulk-transition/?outlet={self.south.pk}', {
+            'status': 'confirmed', 'ids': [east_order['id'], south_order['id']],
+        }, format='json')
+        self.assertEqual((response.json()['updated'], response.json()['skipped']), ([south_order['id']], [east_order['id']]))
+        self.assertEqual(Order.objects.get(pk=east_order['id']).status, 'pending')
+
+    def test_students_see_their_orders_at_every_outlet(self):
+        south_order = self.place_order(self.south)
+        north_orders = [self.place_order(self.north), self.place_order(self.north)]
+        # Ids are per database; the second north order has no twin in default
+        north_order = north_orders[1]
+        client = api_client(self.student)
+
+        listed = client.get('/api/order/').json()
+        self.assertEqual([(order['id'], order['outlet']) for order in listed],
+                         [(north_order['id'], self.north.pk), (north_orders[0]['id'], self.north.pk),
+                          (south_order['id'], self.south.pk)])
+        response = client.get(f'/api/order/{north_order["id"]}/')
+        self.assertEqual((response.status_code, response.json()['outlet']), (200, self.north.pk))
+        response = client.patch(f'/api/order/{north_order["id"]}/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Order.objects.using('outlet_north').get(pk=north_order['id']).status, 'cancelled')
+        self.assertEqual(api_client(make_user('student2')).get(f'/api/order/{north_order["id"]}/').status_code, 404)
+
+    def test_payments_for_outlet_database_orders(self):
+        self.place_order(self.south)
+        north_order = [self.place_order(self.north), self.place_order(self.north)][1]
+        payment = {'order': north_order['id'], 'payment_ref': 'MP1', 'amount': '2.00',
+                   'payment_method': 'm-pesa', 'payment_status': 'pending'}
+        client = api_client(self.student)
+
+        response = client.post(f'/api/payment/?outlet={self.north.pk}', payment, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(Payment.objects.using('outlet_north').filter(pk=response.json()['id']).exists())
+        self.assertEqual([row['order'] for row in client.get('/api/payment/').json()], [north_order['id']])
+        self.assertEqual(client.get(f'/api/payment/{response.json()["id"]}/').status_code, 200)
+
+        response = api_client(make_user('student2')).post(f'/api/payment/?outlet={self.north.pk}', payment, format='json')
+        self.assertEqual(response.json(), {'order': ['You can only pay for your own orders.']})
+
+    def test_menu_caches_are_per_outlet(self):
+        client = APIClient()
+        north_menu = client.get(f'/api/menu/?outlet={self.north.pk}').json()
+        self.assertEqual([item['name'] for item in north_menu], ['Chapati'])
+        south_menu = client.get(f'/api/menu/?outlet={self.south.pk}').json()
+        self.assertEqual(sorted(item['name'] for item in south_menu), ['Chapati', 'Pilau'])
+
+        north_version = get_version(f'menu:{self.north.pk}')
+        response = api_client(self.admin).post('/api/menu/', {
+            'name': 'Samosa', 'description': 'Fried', 'price': '0.50', 'outlet': self.south.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Only the south menu (and the all-outlet menu) were invalidated
+        self.assertEqual(get_version(f'menu:{self.north.pk}'), north_version)
+        south_menu = client.get(f'/api/menu/?outlet={self.south.pk}').json()
+        self.assertIn('Samosa', [item['name'] for item in south_menu])
+        self.assertNotIn('Samosa', [item['name'] for item in client.get(f'/api/menu/?outlet={self.north.pk}').json()])
+
+    def test_unknown_outlet(self):
+        response = APIClient().get('/api/menu/?outlet=999')
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_outlet_in_the_body_is_checked(self):
+        order = {
+            'total_price': '2.00', 'status': 'pending', 'order_date': str(datetime.date.today()),
+            'items_data': [{'menu_item_id': self.shared.id, 'quantity': 1, 'subtotal': '1.00'}],
+        }
+        response = api_client(self.north_staff).post('/api/order/', {**order, 'outlet': self.south.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('outlet', response.json())
+
+        Outlet.objects.filter(pk=self.south.pk).update(is_active=False)
+        response = api_client(self.student).post('/api/order/', {**order, 'outlet': self.south.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+        placed = self.place_order(self.north)
+        response = api_client(self.admin).patch(f'/api/order/{placed["id"]}/?outlet={self.north.pk}',
+                                                {'outlet': self.south.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stock_is_given_back_when_the_order_fails_to_commit(self):
+        # Stock commits in default first; the outlet database then refuses the order
+        with mock.patch.object(connections['outlet_north'], 'savepoint_commit', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.place_order(self.north, quantity=5)
+        self.north_stock.refresh_from_db()
+        self.assertEqual(self.north_stock.quantity, 20)
+
+    def test_queued_tickets_are_not_placed_when_the_outlet_refuses_the_orders(self):
+        ticket = OrderTicket.objects.create(user=self.student, outlet=self.north, status='queued', payload={
+            'total_price': '2.00', 'pickup_time': None,
+            'items_data': [{'menu_item_id': self.shared.id, 'quantity': 2, 'subtotal': '2.00'}],
+        })
+        with mock.patch.object(connections['outlet_north'], 'savepoint_commit', side_effect=DatabaseError), \
+                self.assertLogs('core.admission', 'WARNING'):
+            self.assertEqual(process_tickets([ticket.id]), 1)
+        ticket.refresh_from_db()
+        self.assertEqual((ticket.status, ticket.order_id), ('failed', None))
+        self.assertFalse(Notification.objects.filter(message__contains='has been placed').exists())
+        self.north_stock.refresh_from_db()
+        self.assertEqual(self.north_stock.quantity, 20)
+
+    def test_forecasts_are_per_outlet(self):
+        last_week = timezone.now() - datetime.timedelta(days=7)
+        for _ in range(3):
+            order = self.place_order(self.north, quantity=4)
+            Order.objects.using('outlet_north').filter(pk=order['id']).update(created_at=last_week)
+        run_forecast()
+        weekday = timezone.localdate(last_week).weekday()
+
+        apply_forecast(weekday)
+        self.north_stock.refresh_from_db()
+        self.south_stock.refresh_from_db()
+        self.assertEqual(self.north_stock.stock_level, 15)  # 12 ordered, plus the safety margin
+        self.assertEqual(self.south_stock.stock_level, 0)
+
+        report = api_client(self.north_staff).get(f'/api/inventory/restock-report/?date={timezone.localdate(last_week)}')
+        self.assertEqual(report.status_code, 200)
+        self.assertEqual([(row['outlet'], row['suggested_stock_level']) for row in report.json()['items']],
+                         [(self.north.pk, 15)])
+
+
+class ReceiptTests(TestCase):
+    databases = {'default', 'outlet_north'}
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.student = make_user('student1')
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+
+    def pay(self, status='completed', outlet=None):
+        order = Order.objects.create(user=self.student, outlet=outlet, total_price=Decimal('2.00'),
+                                     status='pending', order_date=datetime.date.today())
+        OrderItem.objects.create(order=order, menu_item=self.item, quantity=2, subtotal=Decimal('2.00'))
+        return Payment.objects.create(order=order, payment_ref='MP123', amount=Decimal('2.00'),
+                                      payment_method='m-pesa', payment_status=status)
+
+    def test_completed_payment_gets_receipt_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = self.pay()
+        payment.refresh_from_db()
+        self.assertRegex(payment.receipt_url, r'/media/receipts/\d{4}/\d{2}/receipt-\d+\.[0-9a-f]{12}\.png$')
+        name = payment.receipt_url.removeprefix('/media/')
+        with default_storage.open(name) as receipt:
+            self.assertEqual(receipt.read(8), b'\x89PNG\r\n\x1a\n')
+
+        # Unchanged payments reuse the stored file instead of rendering again
+        with mock.patch('core.receipts.render_receipt') as render:
+            self.assertEqual(ReceiptRenderer(workers=0, force=True).render_ids([payment.id]), 1)
+        render.assert_not_called()
+
+    def test_receipt_endpoint(self):
+        client = api_client(self.student)
+        pending = self.pay(status='pending')
+        self.assertEqual(client.get(f'/api/payment/{pending.id}/receipt/').status_code, 400)
+
+        payment = self.pay()  # commit callbacks do not run here, so no receipt yet
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.get(f'/api/payment/{payment.id}/receipt/')
+        self.assertEqual(response.status_code, 202)
+        response = client.get(f'/api/payment/{payment.id}/receipt/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['receipt_url'].endswith('.png'))
+
+        # Only the student who paid and staff see the receipt
+        self.assertEqual(APIClient().get(f'/api/payment/{payment.id}/receipt/').status_code, 401)
+        self.assertEqual(api_client(make_user('student2')).get(f'/api/payment/{payment.id}/receipt/').status_code, 404)
+        self.assertEqual(api_client(make_user('staff1', role='staff')).get(f'/api/payment/{payment.id}/receipt/').status_code,
+                         200)
+
+    def test_payments_are_only_listed_to_the_payer_and_staff(self):
+        payment = self.pay()
+        other = make_user('student2')
+        self.assertEqual(APIClient().get('/api/payment/').status_code, 401)
+        self.assertEqual(APIClient().get(f'/api/payment/{payment.id}/').status_code, 401)
+        self.assertEqual(api_client(other).get('/api/payment/').json(), [])
+        self.assertEqual(api_client(other).get(f'/api/payment/{payment.id}/').status_code, 404)
+        self.assertEqual([row['id'] for row in api_client(self.student).get('/api/payment/').json()], [payment.id])
+        self.assertEqual(api_client(make_user('staff1', role='staff')).get(f'/api/payment/{payment.id}/').status_code, 200)
+
+    def test_outlet_database_payments(self):
+        north = Outlet.objects.create(name='North Canteen', code='north')
+        with use_outlet(north):
+            payment = self.pay(outlet=north)
+        self.assertEqual(payment._state.db, 'outlet_north')
+        self.assertEqual(ReceiptRenderer(workers=0).render_ids([payment.id], using='outlet_north'), 1)
+        payment.refresh_from_db()
+        self.assertIsNotNone(payment.receipt_url)
+
+    def test_render_receipts_rejects_bad_dates(self):
+        for day in ('yesterday', '2026-02-30'):
+            with self.subTest(day=day), self.assertRaisesMessage(CommandError, 'YYYY-MM-DD'):
+                call_command('render_receipts', '--date', day, stdout=io.StringIO())
+
+
+@override_settings(RECEIPT_ASYNC=True, RECEIPT_BATCH_WINDOW=0, RECEIPT_WORKERS=2)
+class ReceiptQueueTests(TransactionTestCase):
+    """The production path: a background thread rendering batches on a process pool."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.queue = ReceiptQueue()
+        patcher = mock.patch('core.receipts.receipt_queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: self.queue._renderer and self.queue._renderer.close())
+
+    def test_committed_payments_are_rendered_in_the_background(self):
+        student = make_user('student1')
+        item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+        with transaction.atomic():
+            for number in range(POOL_MIN_BATCH):
+                order = Order.objects.create(user=student, total_price=Decimal('1.00'), status='completed')
+                OrderItem.objects.create(order=order, menu_item=item, quantity=1, subtotal=Decimal('1.00'))
+                Payment.objects.create(order=order, payment_ref=f'MP{number}', amount=Decimal('1.00'),
+                                       payment_method='m-pesa', payment_status='completed')
+            self.assertIsNone(self.queue._thread)  # nothing is queued before the commit
+
+        deadline = time.monotonic() + 60
+        while Payment.objects.filter(receipt_url__isnull=True).exists() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertFalse(Payment.objects.filter(receipt_url__isnull=True).exists())
+        self.assertIsNotNone(self.queue._renderer._executor)
+        for payment in Payment.objects.all():
+            with default_storage.open(payment.receipt_url.removeprefix('/media/')) as receipt:
+                self.assertEqual(receipt.read(8), b'\x89PNG\r\n\x1a\n')
+
+
+class AuditLogTests(TestCase):
+    databases = {'default', 'outlet_north'}
+
+    def setUp(self):
+        self.student = make_user('student1')
+        self.staff = make_user('staff1', role='staff')
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+        self.stock = Inventory.objects.create(menu_item=self.item, quantity=10, stock_level=10, threshold=2)
+
+    def place_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api_client(self.student).post('/api/order/', {
+                'total_price': '2.00', 'status': 'pending', 'order_date': str(datetime.date.today()),
+                'items_data': [{'menu_item_id': self.item.id, 'quantity': 2, 'subtotal': '2.00'}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_order_timeline(self):
+        order_id = self.place_order()
+        staff = api_client(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            staff.patch(f'/api/order/{order_id}/', {'status': 'confirmed'}, format='json')
+            staff.post('/api/order/bulk-transition/', {'status': 'preparing', 'ids': [order_id]}, format='json')
+
+        response = api_client(self.student).get(f'/api/order/{order_id}/timeline/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(event['old_value'], event['new_value'], event['actor']) for event in response.json()],
+            [(None, 'pending', self.student.id), ('pending', 'confirmed', self.staff.id),
+             ('confirmed', 'preparing', self.staff.id)],
+        )
+        other = api_client(make_user('student2'))
+        self.assertEqual(other.get(f'/api/order/{order_id}/timeline/').status_code, 404)
+
+    def test_price_and_stock_changes(self):
+        self.place_order()
+        stock_event = AuditEvent.objects.get(model='inventory')
+        self.assertEqual((stock_event.old_value, stock_event.new_value), ('10', '8'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            api_client(self.staff).patch(f'/api/menu/{self.item.id}/', {'price': '1.50'}, format='json')
+            api_client(self.staff).patch(f'/api/inventory/{self.stock.id}/', {'quantity': 30}, format='json')
+        price = AuditEvent.objects.get(model='menuitem', field='price')
+        self.assertEqual((price.old_value, price.new_value, price.actor_id), ('1.00', '1.50', self.staff.id))
+        self.assertTrue(AuditEvent.objects.filter(model='inventory', old_value='8', new_value='30').exists())
+
+    def test_rolled_back_changes_are_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    audit.record([audit.change(MenuItem, self.item.id, 'price', '1.00', '2.00')])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertFalse(AuditEvent.objects.exists())
+
+    def test_request_events_are_written_together(self):
+        def view(request):
+            with self.captureOnCommitCallbacks(execute=True):
+                for price in ('1.10', '1.20', '1.30'):
+                    audit.record([audit.change(MenuItem, self.item.id, 'price', '1.00', price)])
+            self.assertFalse(AuditEvent.objects.exists())
+            return None
+
+        with self.assertNumQueries(2):  # the check above and one INSERT
+            audit.AuditMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(AuditEvent.objects.count(), 3)
+
+    def test_prep_times(self):
+        start = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) - datetime.timedelta(days=1)
+        events = []
+        for order_id, minutes in ((1, 5), (2, 10), (3, 20)):
+            events += [
+                AuditEvent(model='order', object_id=order_id, field='status', old_value='pending',
+                           new_value='confirmed', created_at=start),
+                AuditEvent(model='order', object_id=order_id, field='status', old_value='preparing',
+                           new_value='ready', created_at=start + datetime.timedelta(minutes=minutes)),
+            ]
+        AuditEvent.objects.bulk_create(events)
+
+        response = api_client(self.staff).get('/api/order/prep-times/')
+        self.assertEqual(response.status_code, 200)
+        metrics = response.json()
+        self.assertEqual(metrics['orders'], 3)
+        self.assertEqual(metrics['p50_seconds'], 600)
+        self.assertEqual(metrics['max_seconds'], 1200)
+        self.assertEqual(metrics['by_hour'][0]['hour'], timezone.localtime(start).hour)
+        self.assertEqual(api_client(self.student).get('/api/order/prep-times/').status_code, 403)
+
+    def test_prep_times_rejects_bad_dates(self):
+        staff = api_client(self.staff)
+        for query in ('date_from=last-week', 'date_from=2026-13-01', 'date_to=2026-02-30'):
+            with self.subTest(query=query):
+                response = staff.get(f'/api/order/prep-times/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('YYYY-MM-DD', response.json()['error'])
+
+
+@override_settings(ORDER_QUEUE=True)
+class OrderQueueTests(TestCase):
+    def setUp(self):
+        self.student = make_user('student1')
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+        self.stock = Inventory.objects.create(menu_item=self.item, quantity=10, stock_level=10, threshold=2)
+
+    def order(self, client, quantity=1):
+        return client.post('/api/order/', {
+            'total_price': '1.00', 'status': 'pending', 'order_date': str(datetime.date.today()),
+            'pickup_time': '12:30:00',
+            'items_data': [{'menu_item_id': self.item.id, 'quantity': quantity, 'subtotal': '1.00'}],
+        }, format='json')
+
+    def test_order_is_accepted_with_a_ticket_and_placed_later(self):
+        client = api_client(self.student)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.order(client, quantity=3)
+        self.assertEqual(response.status_code, 202)
+        ticket = response.json()
+        self.assertEqual(ticket['status'], 'queued')
+        self.assertTrue(response['Location'].endswith(f"/api/order-tickets/{ticket['id']}/"))
+        self.assertFalse(Order.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        polled = client.get(f"/api/order-tickets/{ticket['id']}/").json()
+        self.assertEqual(polled['status'], 'placed')
+        order = Order.objects.get(pk=polled['order_id'])
+        self.assertEqual((order.user, order.status, str(order.pickup_time)), (self.student, 'pending', '12:30:00'))
+        self.assertEqual(order.items.get().quantity, 3)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 7)
+        self.assertTrue(Notification.objects.filter(user=self.student, message__contains=f'#{order.id}').exists())
+        other = api_client(make_user('student2'))
+        self.assertEqual(other.get(f"/api/order-tickets/{ticket['id']}/").status_code, 404)
+
+    def test_batch_is_placed_in_ticket_order_in_one_transaction(self):
+        client = api_client(self.student)
+        with self.captureOnCommitCallbacks():  # keep the tickets queued
+            ids = [self.order(client).json()['id'] for _ in range(5)]
+
+        with self.assertNumQueries(14):
+            # Ticket claim + read, savepoint, 5 order inserts, items, stock update + read, ticket update,
+            # notifications, release: the per-order cost is a single INSERT
+            self.assertEqual(process_tickets(ids), 5)
+        tickets = OrderTicket.objects.filter(id__in=ids).order_by('id')
+        order_ids = [ticket.order_id for ticket in tickets]
+        self.assertEqual(order_ids, sorted(order_ids))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 5)
+        # Already placed tickets are not placed twice
+        self.assertEqual(process_tickets(ids), 0)
+
+    def test_bad_ticket_does_not_sink_the_batch(self):
+        client = api_client(self.student)
+        with self.captureOnCommitCallbacks():
+            good = self.order(client).json()['id']
+            bad = self.order(client).json()['id']
+        OrderTicket.objects.filter(pk=bad).update(payload={'total_price': '1.00', 'items_data': [{'quantity': None}]})
+
+        with self.assertLogs('core.admission', 'WARNING'):
+            process_tickets([good, bad])
+        self.assertEqual(OrderTicket.objects.get(pk=good).status, 'placed')
+        self.assertEqual(OrderTicket.objects.get(pk=bad).status, 'failed')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_two_consumers_never_place_the_same_ticket(self):
+        client = api_client(self.student)
+        with self.captureOnCommitCallbacks():
+            ticket_id = self.order(client).json()['id']
+
+        place = admission._place
+
+        def place_while_another_consumer_drains(tickets, outlet_id):
+            # e.g. process_order_queue picking up the backlog while the worker's thread is placing it
+            self.assertEqual(process_tickets([ticket_id]), 0)
+            place(tickets, outlet_id)
+
+        with mock.patch('core.admission._place', side_effect=place_while_another_consumer_drains) as placed:
+            self.assertEqual(process_tickets([ticket_id]), 1)
+        self.assertEqual(placed.call_count, 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 9)
+        self.assertEqual(Notification.objects.filter(user=self.student).count(), 1)
+
+    def test_abandoned_claims_are_requeued(self):
+        client = api_client(self.student)
+        with self.captureOnCommitCallbacks():
+            ticket_id = self.order(client).json()['id']
+        # Claimed by a consumer that died before placing it
+        OrderTicket.objects.filter(pk=ticket_id).update(
+            status='processing', claim='dead', claimed_at=timezone.now() - datetime.timedelta(minutes=10),
+        )
+        call_command('process_order_queue', stale=0, reclaim=300, stdout=io.StringIO())
+        self.assertEqual(OrderTicket.objects.get(pk=ticket_id).status, 'placed')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_full_queue_turns_orders_away(self):
+        with mock.patch('core.admission.order_queue.has_room', return_value=False):
+            response = self.order(api_client(self.student))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertFalse(OrderTicket.objects.exists())
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        # Row ids restart with every test; start from an empty filter
+        revoked_tokens.reset()
+        self.student = make_user('student1')
+        self.client = APIClient()
+
+    def refresh(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': str(token)}, format='json')
+
+    def test_rotated_refresh_token_is_refused(self):
+        token = self.client.post('/api/token/', {'username': 'student1', 'password': 'secret123'}).json()['refresh']
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()['refresh']
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(rotated).status_code, 200)
+        self.assertEqual(OutstandingToken.objects.filter(user=self.student).count(), 3)
+
+    def test_replay_missed_by_the_filter_is_refused(self):
+        token = RefreshToken.for_user(self.student)
+        with override_settings(TOKEN_REVOCATION_SYNC=60):
+            revoked_tokens.is_revoked('warm-up')
+            # Rotated on another worker; this one has not synced yet
+            BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+            self.assertFalse(revoked_tokens.is_revoked(token['jti']))
+            self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_blacklist_rows_committed_late_are_picked_up(self):
+        early, late = RefreshToken.for_user(self.student), RefreshToken.for_user(self.student)
+        with override_settings(TOKEN_REVOCATION_SYNC=0):
+            revoked_tokens.is_revoked('warm-up')
+            # The later row's transaction commits first; the earlier id shows up after it was synced past
+            BlacklistedToken.objects.create(id=10, token=OutstandingToken.objects.get(jti=late['jti']))
+            self.assertTrue(revoked_tokens.is_revoked(late['jti']))
+            self.assertFalse(revoked_tokens.is_revoked(early['jti']))
+            BlacklistedToken.objects.create(id=5, token=OutstandingToken.objects.get(jti=early['jti']))
+            self.assertTrue(revoked_tokens.is_revoked(early['jti']))
+
+    def test_verify_needs_no_query_for_live_tokens(self):
+        token = RefreshToken.for_user(self.student)
+        with override_settings(TOKEN_REVOCATION_SYNC=60), self.assertNumQueries(1):
+            revoked_tokens.is_revoked('warm-up')  # loads the filter
+            response = self.client.post('/api/token/verify/', {'token': str(token)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        token.blacklist()
+        response = self.client.post('/api/token/verify/', {'token': str(token)}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_purge_deletes_expired_tokens_only(self):
+        live = RefreshToken.for_user(self.student)
+        for _ in range(3):
+            RefreshToken.for_user(self.student).blacklist()
+        expired = timezone.now() - datetime.timedelta(hours=1)
+        OutstandingToken.objects.exclude(jti=live['jti']).update(expires_at=expired)
+        self.assertEqual(purge_expired_tokens(batch_size=2), 3)
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        settings_override = override_settings(PROFILE_DIR=profile_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.admin = make_user('admin1', role='admin')
+
+    def test_only_admins_can_profile_a_request(self):
+        response = api_client(self.admin).get('/api/notification/?profile=1')
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile-Id']
+        profile_dir = Path(settings.PROFILE_DIR)
+        self.assertTrue((profile_dir / f'{name}.prof').exists())
+        profile = json.loads((profile_dir / f'{name}.json').read_text())
+        self.assertEqual((profile['path'], profile['status']), ('/api/notification/?profile=1', 200))
+        self.assertTrue(any('core_notification' in query['sql'] for query in profile['queries']))
+
+        response = api_client(make_user('staff1', role='staff')).get('/api/notification/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(len(list(profile_dir.glob('*.prof'))), 1)
+
+    def test_admin_page_lists_profiles(self):
+        name = api_client(self.admin).get('/api/notification/?profile=1')['X-Profile-Id']
+        User.objects.filter(pk=self.admin.pk).update(is_staff=True)
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get('/admin/profiles/'), name)
+        self.assertContains(self.client.get(f'/admin/profiles/{name}/'), 'core_notification')
+        self.assertEqual(self.client.get(f'/admin/profiles/{name}/?download=1').status_code, 200)
+        self.assertEqual(self.client.get('/admin/profiles/..%2Fsettings/').status_code, 404)
+
+        staff = make_user('staff1', role='staff')
+        User.objects.filter(pk=staff.pk).update(is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/admin/profiles/').status_code, 403)
+
+    def test_sampler_counts_app_functions_on_sampled_threads(self):
+        sampler = Sampler()
+        frames = {threading.get_ident(): sys._getframe()}
+        # Keep the sampler's own thread out of the counts
+        with override_settings(PROFILE_SAMPLE_MODULES=['core.tests'], PROFILE_SAMPLE_INTERVAL=3600):
+            sampler.sample(frames)
+            with sampler.track():
+                sampler.sample(frames)
+                sampler.sample(frames)
+        code = frames[threading.get_ident()].f_code
+        key = f'core.tests.{code.co_qualname}:{code.co_firstlineno}'
+        self.assertEqual(sampler.samples, 2)
+        self.assertEqual((sampler.own[key], sampler.total[key]), (2, 2))
+
+
+class UserImportTests(TestCase):
+    HEADER = 'reg_number,name,email,phone,gender,password\n'
+
+    def csv(self, rows):
+        return io.StringIO(self.HEADER + ''.join(f'{row}\n' for row in rows))
+
+    def test_students_without_password_set_one_through_a_link(self):
+        report = UserImporter(workers=1, invite=True).run(self.csv([
+            'S001,Amina,amina@example.com,0700,female,',
+            'S002,Brian,brian@example.com,0701,male,secret-pass-1',
+        ]))
+        self.assertEqual((report.created, report.invited), (2, 1))
+        amina, brian = User.objects.get(reg_number='S001'), User.objects.get(reg_number='S002')
+        self.assertFalse(amina.has_usable_password())
+        self.assertFalse(amina.check_password('S001'))
+        self.assertTrue(brian.check_password('secret-pass-1'))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['amina@example.com'])
+        uid, token = mail.outbox[0].body.split('/set-password/')[1].split('/')[:2]
+        client = APIClient()
+        confirm = {'uid': uid, 'token': token, 'password': 'a-new-password-9'}
+        response = client.post('/api/users/password-reset/confirm/', confirm, format='json')
+        self.assertEqual(response.status_code, 200)
+        amina.refresh_from_db()
+        self.assertTrue(amina.check_password('a-new-password-9'))
+        # Links are single use
+        response = client.post('/api/users/password-reset/confirm/', confirm, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_password_reset_does_not_reveal_accounts(self):
+        make_user('student1')
+        client = APIClient()
+        for email in ('STUDENT1@example.com', 'nobody@example.com'):
+            response = client.post('/api/users/password-reset/', {'email': email}, format='json')
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual([message.to for message in mail.outbox], [['student1@example.com']])
+
+    def test_emails_are_unique_regardless_of_case(self):
+        User.objects.create_user(username='X1', reg_number='X1', email='Foo@Example.com', role='student')
+        report = UserImporter(workers=1).run(self.csv(['S001,Foo,foo@example.com,0700,male,']))
+        self.assertEqual(report.created, 0)
+        self.assertIn('email', report.errors[0]['errors'])
+
+    def test_upload_is_imported_without_a_process_pool(self):
+        rows = [f'S{number:03d},Student,s{number}@example.com,0700,other,pass-{number:05d}' for number in range(120)]
+        upload = SimpleUploadedFile('students.csv', ''.join([self.HEADER, *(f'{row}\n' for row in rows)]).encode())
+        with mock.patch('core.provisioning.ProcessPoolExecutor') as pool:
+            response = api_client(make_user('admin1', role='admin')).post(
+                '/api/users/bulk-import/', {'file': upload}, format='multipart',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 120)
+        pool.assert_not_called()
+
+
+class ArchiveTests(TestCase):
+    databases = {'default', 'outlet_north'}
+
+    def setUp(self):
+        self.north = Outlet.objects.create(name='North Canteen', code='north')
+        self.student = make_user('student1')
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+        self.old = timezone.now() - datetime.timedelta(days=120)
+
+    def order(self, status='completed', outlet=None, old=True):
+        with use_outlet(outlet):
+            order = Order.objects.create(user=self.student, outlet=outlet, total_price=Decimal('2.00'), status=status)
+            OrderItem.objects.create(order=order, menu_item=self.item, quantity=2, subtotal=Decimal('2.00'))
+            Payment.objects.create(order=order, payment_ref=f'MP{order.id}', amount=Decimal('2.00'),
+                                   payment_method='m-pesa', payment_status='completed')
+            if old:
+                Order.objects.filter(pk=order.pk).update(created_at=self.old)
+                order.refresh_from_db()
+        return order
+
+    def test_finished_orders_of_every_database_are_archived(self):
+        here = self.order()
+        north = self.order(status='cancelled', outlet=self.north)
+        north_item = OrderItem.objects.using('outlet_north').get(order=north)
+        recent = self.order(old=False)
+        pending = self.order(status='pending')
+
+        self.assertEqual(archive_orders(batch_size=1), 2)
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {recent.id, pending.id})
+        self.assertFalse(Order.objects.using('outlet_north').exists())
+        self.assertFalse(OrderItem.objects.using('outlet_north').exists())
+        self.assertEqual(Payment.objects.count(), 2)
+
+        archived = ArchivedOrder.objects.get(outlet=self.north)
+        self.assertEqual((archived.order_id, archived.status, archived.created_at), (north.id, 'cancelled', self.old))
+        self.assertEqual(archived.items, [{
+            'id': north_item.id, 'menu_item_id': self.item.id,
+            'menu_item_name': 'Chapati', 'price': '1.00', 'quantity': 2, 'subtotal': '2.00',
+        }])
+        self.assertEqual(archived.payments[0]['payment_ref'], f'MP{north.id}')
+        self.assertTrue(ArchivedOrder.objects.filter(order_id=here.id, outlet=None).exists())
+
+        # Read back through the API like a live order
+        response = api_client(self.student).get(f'/api/order/{here.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['id'], response.json()['archived']), (here.id, True))
+
+        # Running again moves nothing and duplicates nothing
+        self.assertEqual(archive_orders(), 0)
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+
+    def test_interrupted_run_is_finished_without_duplicates(self):
+        order = self.order()
+        # Archived by a run whose delete never committed
+        _snapshot(order).save()
+        self.assertEqual(archive_orders(), 1)
+        self.assertEqual(ArchivedOrder.objects.filter(order_id=order.id).count(), 1)
+        self.assertFalse(Order.objects.exists())
+
+    def test_reused_order_id_keeps_both_snapshots(self):
+        order = self.order()
+        earlier = _snapshot(order)
+        earlier.created_at = self.old - datetime.timedelta(days=365)
+        earlier.status = 'cancelled'
+        earlier.save()
+        self.assertEqual(archive_orders(), 1)
+        self.assertEqual(
+            sorted(ArchivedOrder.objects.filter(order_id=order.id).values_list('status', flat=True)),
+            ['cancelled', 'completed'],
+        )
+
+    def test_history_filters_by_student(self):
+        self.order()
+        archive_orders()
+        other = make_user('student2')
+        client = api_client(make_user('staff1', role='staff'))
+        self.assertEqual(client.get(f'/api/order/history/?user={self.student.id}').json()['count'], 1)
+        self.assertEqual(client.get(f'/api/order/history/?user={other.id}').json()['count'], 0)
+        self.assertEqual(client.get('/api/order/history/?user=abc').status_code, 400)
+
+
+class OrderTransitionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_user('student1')
+        self.staff = make_user('staff1', role='staff')
+        self.order = self.place()
+
+    def place(self, status='pending'):
+        return Order.objects.create(user=self.student, total_price=Decimal('2.00'), status=status,
+                                    order_date=datetime.date.today())
+
+    def patch(self, user, order, data, **headers):
+        return api_client(user).patch(f'/api/order/{order.pk}/', data, format='json', **headers)
+
+    def test_staff_moves_orders_along_the_state_machine(self):
+        response = self.patch(self.staff, self.order, {'status': 'confirmed'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.json()['status'], response.json()['version']), ('confirmed', 2))
+        self.assertEqual(response['ETag'], '"2"')
+
+        # No skipping ahead, and no way back
+        self.assertEqual(self.patch(self.staff, self.order, {'status': 'ready'}).status_code, 400)
+        self.assertEqual(self.patch(self.staff, self.order, {'status': 'pending'}).status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), ('confirmed', 2))
+
+    def test_students_may_only_cancel_before_preparation(self):
+        self.assertEqual(self.patch(self.student, self.order, {'status': 'confirmed'}).status_code, 400)
+        self.assertEqual(self.patch(self.student, self.order, {'status': 'cancelled'}).status_code, 200)
+
+        preparing = self.place(status='preparing')
+        self.assertEqual(self.patch(self.student, preparing, {'status': 'cancelled'}).status_code, 400)
+
+    def test_stale_version_is_refused(self):
+        self.assertEqual(self.patch(self.staff, self.order, {'status': 'confirmed'}, HTTP_IF_MATCH='"1"').status_code, 200)
+
+        # Another tablet still holds version 1
+        response = self.patch(self.staff, self.order, {'status': 'cancelled'}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 412)
+        self.assertIn('Reload it', response.json()['detail'])
+        response = self.patch(self.staff, self.order, {'status': 'cancelled', 'version': 1})
+        self.assertEqual(response.status_code, 412)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), ('confirmed', 2))
+
+    def test_version_zero_is_checked_not_ignored(self):
+        response = self.patch(self.staff, self.order, {'status': 'confirmed', 'version': 0})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(self.patch(self.staff, self.order, {'status': 'confirmed'}, HTTP_IF_MATCH='0').status_code, 412)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+    def test_bulk_transition_skips_stale_and_ineligible_orders(self):
+        current = self.place(status='confirmed')
+        stale = self.place(status='confirmed')
+        Order.objects.filter(pk=stale.pk).update(version=3)
+        finished = self.place(status='completed')
+
+        response = api_client(self.staff).post('/api/order/bulk-transition/', {'status': 'preparing', 'orders': [
+            {'id': current.pk, 'version': 1}, {'id': stale.pk, 'version': 2},
+            {'id': finished.pk, 'version': 1}, {'id': self.order.pk, 'version': 0},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['updated'], [current.pk])
+        self.assertEqual(response.json()['skipped'], sorted([self.order.pk, stale.pk, finished.pk]))
+        current.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertEqual((current.status, current.version), ('preparing', 2))
+        self.assertEqual((stale.status, stale.version), ('confirmed', 3))
+
+        # Selecting by id only moves the orders the state machine allows
+        response = api_client(self.staff).post('/api/order/bulk-transition/',
+                                               {'status': 'cancelled', 'ids': [stale.pk, finished.pk]}, format='json')
+        self.assertEqual((response.json()['updated'], response.json()['skipped']), ([stale.pk], [finished.pk]))
+
+
+class StockAlertTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_user('student1')
+        self.staff = make_user('staff1', role='staff')
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+        self.stock = Inventory.objects.create(menu_item=self.item, quantity=5, stock_level=10, threshold=2)
+
+    def post_order(self, quantity):
+        return api_client(self.student).post('/api/order/', {
+            'total_price': f'{quantity}.00', 'status': 'pending', 'order_date': str(datetime.date.today()),
+            'items_data': [{'menu_item_id': self.item.id, 'quantity': quantity, 'subtotal': f'{quantity}.00'}],
+        }, format='json')
+
+    def place_order(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.post_order(quantity)
+
+    def staff_messages(self):
+        return list(Notification.objects.filter(user=self.staff).order_by('id').values_list('message', flat=True))
+
+    def test_crossing_the_threshold_alerts_once(self):
+        self.assertEqual(self.place_order(3).status_code, 201)
+        self.assertEqual(self.staff_messages(), ['Low stock: Chapati is down to 2 (threshold 2).'])
+        self.assertTrue(AuditEvent.objects.filter(model='inventory', old_value='5', new_value='2').exists())
+
+        # Already below the threshold: neither a new crossing nor a sell-out
+        self.assertEqual(self.place_order(1).status_code, 201)
+        self.assertEqual(len(self.staff_messages()), 1)
+        self.item.refresh_from_db()
+        self.assertTrue(self.item.availability)
+
+    def test_sell_out_alert_is_within_the_create_budget(self):
+        with QueryBudget() as plain:
+            self.assertEqual(self.post_order(1).status_code, 201)
+        with QueryBudget() as alerting:
+            self.assertEqual(self.post_order(4).status_code, 201)
+        self.assertEqual(self.staff_messages(), ['Out of stock: Chapati has sold out and was marked unavailable.'])
+        self.assertGreater(alerting.count, plain.count)
+        self.assertLessEqual(alerting.count, OrderViewset.query_budgets['create'])
+
+    def test_selling_out_marks_the_item_unavailable(self):
+        self.assertEqual(self.place_order(5).status_code, 201)
+        self.stock.refresh_from_db()
+        self.item.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 0)
+        self.assertFalse(self.item.availability)
+        self.assertEqual(self.staff_messages(), ['Out of stock: Chapati has sold out and was marked unavailable.'])
+
+    def test_orders_beyond_the_stock_left_are_refused(self):
+        response = self.place_order(6)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'items_data': ['Only 5 Chapati left.']})
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.staff_messages(), [])
+
+    @override_settings(ORDER_QUEUE=True)
+    def test_queued_order_beyond_the_stock_left_fails(self):
+        response = self.place_order(6)
+        self.assertEqual(response.status_code, 202)
+        ticket = OrderTicket.objects.get()
+        self.assertEqual((ticket.status, ticket.error), ('failed', 'Only 5 Chapati left.'))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 5)
+
+    def stock_left(self):
+        self.stock.refresh_from_db()
+        return self.stock.quantity
+
+    def test_cancelled_orders_return_their_stock(self):
+        order_id = self.place_order(4).json()['id']
+        self.assertEqual(self.stock_left(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api_client(self.student).patch(f'/api/order/{order_id}/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock_left(), 5)
+
+        first, second = self.place_order(2).json()['id'], self.place_order(3).json()['id']
+        self.assertEqual(self.stock_left(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api_client(self.staff).post('/api/order/bulk-transition/',
+                                                   {'status': 'cancelled', 'ids': [first, second]}, format='json')
+        self.assertEqual(response.json()['updated'], [first, second])
+        self.assertEqual(self.stock_left(), 5)
+
+        # Cancelled twice is still returned once; deleting a cancelled order returns nothing more
+        with self.captureOnCommitCallbacks(execute=True):
+            api_client(self.staff).patch(f'/api/order/{first}/', {'status': 'cancelled'}, format='json')
+            self.assertEqual(api_client(self.staff).delete(f'/api/order/{first}/').status_code, 204)
+        self.assertEqual(self.stock_left(), 5)
+
+    def test_deleted_orders_return_their_stock(self):
+        order_id = self.place_order(3).json()['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(api_client(self.staff).delete(f'/api/order/{order_id}/').status_code, 204)
+        self.assertEqual(self.stock_left(), 5)
+
+    def test_item_edits_take_and_return_stock(self):
+        order_id = self.place_order(2).json()['id']
+        item = OrderItem.objects.get(order_id=order_id)
+        staff = api_client(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(staff.patch(f'/api/order-item/{item.id}/', {'quantity': 4}, format='json').status_code, 200)
+        self.assertEqual(self.stock_left(), 1)
+        response = staff.patch(f'/api/order-item/{item.id}/', {'quantity': 9}, format='json')
+        self.assertEqual(response.json(), {'items_data': ['Only 1 Chapati left.']})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(staff.patch(f'/api/order-item/{item.id}/', {'quantity': 1}, format='json').status_code, 200)
+        self.assertEqual(self.stock_left(), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(staff.delete(f'/api/order-item/{item.id}/').status_code, 204)
+        self.assertEqual(self.stock_left(), 5)
+
+    def test_staff_list_expires_for_other_workers(self):
+        self.assertEqual(stock_alerts.staff_ids(), [self.staff.pk])
+        # Staff added by another worker: no signal reaches this worker's cache
+        User.objects.bulk_create([User(username='staff2', reg_number='STAFF2', email='staff2@example.com', role='staff')])
+        self.assertEqual(stock_alerts.staff_ids(), [self.staff.pk])
+        later = time.time() + settings.STOCK_ALERT_STAFF_TTL + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual(len(stock_alerts.staff_ids()), 2)
+
+    def test_new_staff_get_alerts(self):
+        self.place_order(3)
+        newcomer = make_user('staff2', role='staff')
+        cache.delete(f'stock-alert:{self.stock.id}:out')
+        self.place_order(2)
+        self.assertEqual(list(Notification.objects.filter(user=newcomer).values_list('message', flat=True)),
+                         ['Out of stock: Chapati has sold out and was marked unavailable.'])
+
+
+class ForecastTests(TestCase):
+    databases = {'default', 'outlet_north'}
+
+    def setUp(self):
+        self.student = make_user('student1')
+        self.staff = make_user('staff1', role='staff')
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+        self.stock = Inventory.objects.create(menu_item=self.item, quantity=10, stock_level=10, threshold=2)
+
+    def order_at(self, when, quantity, status='completed'):
+        order = Order.objects.create(user=self.student, total_price=Decimal(quantity), status=status)
+        OrderItem.objects.create(order=order, menu_item=self.item, quantity=quantity, subtotal=Decimal(quantity))
+        Order.objects.filter(pk=order.pk).update(created_at=when)
+
+    def test_forecaster_smooths_each_weekday(self):
+        monday = datetime.datetime(2026, 1, 5, 12)
+        rows = [(('a', None), monday, 10), (('a', None), monday + datetime.timedelta(days=7), 20)]
+
+        ewma = DemandForecaster([('a', None)], method='ewma', alpha=0.5).feed(rows).finish()
+        self.assertEqual(ewma.level[0, 0, 12], 15)
+        # The Tuesday in between was folded in as an empty day
+        self.assertEqual((ewma.weeks_seen[1], ewma.level[0, 1].sum()), (1, 0))
+
+        sma = DemandForecaster([('a', None)], method='sma', window=1).feed(rows).finish()
+        self.assertEqual(sma.level[0, 0, 12], 20)
+
+        daily, peak_hour, stock_level, threshold = ewma.suggestions(safety=0.2, lead_hours=1)
+        self.assertEqual((daily[0, 0], peak_hour[0, 0], stock_level[0, 0], threshold[0, 0]), (15, 12, 18, 18))
+
+        for options in ({'method': 'median'}, {'alpha': 0}, {'window': 0}):
+            with self.subTest(options=options), self.assertRaises(ValueError):
+                DemandForecaster([], **options)
+
+    def test_forecast_demand_command(self):
+        last_week = timezone.now() - datetime.timedelta(days=7)
+        self.order_at(last_week, 4)
+        self.order_at(last_week, 6)
+        self.order_at(last_week, 50, status='cancelled')
+
+        out = io.StringIO()
+        call_command('forecast_demand', '--safety', '0', stdout=out)
+        self.assertIn('Wrote 7 forecast rows.', out.getvalue())
+        forecast = InventoryForecast.objects.get(menu_item=self.item, weekday=timezone.localdate(last_week).weekday())
+        self.assertEqual((forecast.expected_demand, forecast.suggested_stock_level), (Decimal('10.00'), 10))
+
+        # Rerunning replaces the forecasts
+        call_command('forecast_demand', '--method', 'sma', stdout=io.StringIO())
+        self.assertEqual(InventoryForecast.objects.count(), 7)
+
+        with self.assertRaises(CommandError):
+            call_command('forecast_demand', '--alpha', '2', stdout=io.StringIO())
+
+    def test_today_is_left_out_until_it_is_over(self):
+        last_week = timezone.now() - datetime.timedelta(days=7)
+        self.order_at(last_week, 10)
+        self.order_at(timezone.now(), 1)  # same weekday, but the day is not over
+        run_forecast(safety=0)
+        forecast = InventoryForecast.objects.get(menu_item=self.item, outlet=None,
+                                                 weekday=timezone.localdate().weekday())
+        self.assertEqual(forecast.expected_demand, Decimal('10.00'))
+
+    def test_archived_orders_are_part_of_the_history(self):
+        long_ago = timezone.now() - datetime.timedelta(days=200)
+        self.order_at(long_ago, 6)
+        self.order_at(long_ago, 3)
+        self.order_at(long_ago, 50, status='cancelled')
+        self.order_at(timezone.now() - datetime.timedelta(days=2), 4)
+        self.assertEqual(archive_orders(), 3)
+
+        hour = timezone.localtime(long_ago).replace(minute=0, second=0, microsecond=0)
+        rows = list(stream_demand(since=long_ago - datetime.timedelta(hours=1)))
+        self.assertEqual([(key, total) for key, _, total in rows], [((self.item.pk, None), 9), ((self.item.pk, None), 4)])
+        self.assertEqual(rows[0][1], hour)
+
+    def test_apply_forecast_and_restock_report(self):
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        InventoryForecast.objects.create(menu_item=self.item, weekday=tomorrow.weekday(), expected_demand=30,
+                                         peak_hour=12, suggested_stock_level=36, suggested_threshold=12)
+
+        staff = api_client(self.staff)
+        report = staff.get('/api/inventory/restock-report/').json()
+        self.assertEqual(report['date'], str(tomorrow))
+        self.assertEqual(report['items'][0]['restock_quantity'], 26)
+        self.assertTrue(report['items'][0]['below_threshold'])
+
+        self.assertEqual(apply_forecast(tomorrow.weekday()), 1)
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.stock_level, self.stock.threshold), (36, 12))
+        self.assertEqual(apply_forecast((tomorrow.weekday() + 1) % 7), 0)
+
+    def test_restock_report_rejects_bad_dates(self):
+        staff = api_client(self.staff)
+        for date in ('tomorrow', '2026-02-30', '2026-13-01'):
+            with self.subTest(date=date):
+                self.assertEqual(staff.get(f'/api/inventory/restock-report/?date={date}').status_code, 400)
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = make_user('student1')
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+        self.order = Order.objects.create(user=self.student, total_price=Decimal('2.00'), status='pending')
+        self.order_item = OrderItem.objects.create(order=self.order, menu_item=self.item, quantity=2,
+                                                   subtotal=Decimal('2.00'))
+        self.client = api_client(self.student)
+        self.url = f'/api/order/{self.order.pk}/'
+
+    def test_order_revalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual((response.status_code, response['ETag']), (200, '"1"'))
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"1"')
+        self.assertEqual((response.status_code, response['ETag']), (304, '"1"'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_item_edits_change_the_order_etag(self):
+        response = self.client.patch(f'/api/order-item/{self.order_item.pk}/', {'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"1"')
+        self.assertEqual((response.status_code, response['ETag']), (200, '"2"'))
+        self.assertEqual(response.json()['items'][0]['quantity'], 3)
+
+        self.assertEqual(self.client.delete(f'/api/order-item/{self.order_item.pk}/').status_code, 204)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"2"')
+        self.assertEqual((response.status_code, response.json()['items']), (200, []))
+
+    def test_admin_status_edits_change_the_order_etag(self):
+        admin_user = make_user('admin1', role='admin')
+        self.order.status = 'confirmed'
+        form = SimpleNamespace(changed_data=['status'], initial={'status': 'pending'})
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderAdmin(Order, admin.site).save_model(SimpleNamespace(user=admin_user), self.order, form, True)
+        self.assertEqual(self.order.version, 2)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"1"')
+        self.assertEqual((response.status_code, response['ETag'], response.json()['status']), (200, '"2"', 'confirmed'))
+        self.assertTrue(AuditEvent.objects.filter(model='order', object_id=self.order.pk, new_value='confirmed').exists())
+
+        admin_user.is_staff = admin_user.is_superuser = True
+        admin_user.save()
+        self.client.force_login(admin_user)
+        self.assertContains(self.client.get(f'/admin/core/order/{self.order.pk}/change/'), 'Version')
+
+    @override_settings(GZIP_MIN_LENGTH=200)
+    def test_large_json_is_gzipped(self):
+        for number in range(10):
+            Tag.objects.create(name=f'Tag {number}', tag_type='dietary', description='x' * 20)
+        response = self.client.get('/api/tags/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 10)
+
+        # Small JSON and anything else stay as they are
+        response = self.client.get(f'/api/tags/{Tag.objects.first().pk}/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = JSONGZipMiddleware(lambda request: HttpResponse('x' * 500, content_type='text/plain'))(
+            RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class KitchenBoardTests(TestCase):
+    databases = {'default', 'outlet_north'}
+
+    def setUp(self):
+        cache.clear()
+        kitchen_board.reset()
+        self.north = Outlet.objects.create(name='North Canteen', code='north')
+        self.south = Outlet.objects.create(name='South Canteen', code='south')
+        self.student = make_user('student1')
+        self.admin = make_user('admin1', role='admin')
+        self.north_staff = make_user('staff1', role='staff')
+        self.north_staff.outlet = self.north
+        self.north_staff.save()
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+
+    def order(self, quantity, outlet=None, status='confirmed', pickup_time=datetime.time(12, 5)):
+        with use_outlet(outlet):
+            order = Order.objects.create(user=self.student, outlet=outlet, total_price=Decimal('2.00'),
+                                         status=status, pickup_time=pickup_time)
+            item = OrderItem.objects.create(order=order, menu_item=self.item, quantity=quantity,
+                                            subtotal=Decimal('2.00'))
+        return order, item
+
+    def board(self, user, query=''):
+        response = api_client(user).get(f'/api/kitchen/{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            (window['window_start'], [(item['name'], item['quantity']) for item in window['items']])
+            for window in response.json()['windows']
+        ]
+
+    def test_snapshot_groups_active_orders_by_pickup_window(self):
+        self.order(2)
+        self.order(3, pickup_time=datetime.time(12, 10))
+        self.order(1, pickup_time=None)
+        self.order(5, status='pending')
+        self.assertEqual(self.board(self.admin), [(None, [('Chapati', 1)]), ('12:00', [('Chapati', 5)])])
+        self.assertEqual(self.board(self.admin, '?window=5'),
+                         [(None, [('Chapati', 1)]), ('12:05', [('Chapati', 2)]), ('12:10', [('Chapati', 3)])])
+
+    def test_unchanged_board_is_not_modified(self):
+        self.order(2)
+        client = api_client(self.admin)
+        etag = client.get('/api/kitchen/')['ETag']
+        response = client.get('/api/kitchen/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+        order, _ = self.order(4, pickup_time=datetime.time(13, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            kitchen_board.orders_changed({order.pk: ('pending', None)}, {order.pk: ('confirmed', order.pickup_time)})
+        response = client.get('/api/kitchen/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_order_item_edits_invalidate_the_board(self):
+        order, item = self.order(2)
+        self.assertEqual(self.board(self.admin), [('12:00', [('Chapati', 2)])])
+
+        client = api_client(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(f'/api/order-item/{item.pk}/', {'quantity': 6}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.board(self.admin), [('12:00', [('Chapati', 6)])])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.delete(f'/api/order-item/{item.pk}/').status_code, 204)
+        self.assertEqual(self.board(self.admin), [])
+
+    def test_boards_are_kept_per_outlet(self):
+        self.order(2, outlet=self.north)
+        self.order(3, outlet=self.south)
+        self.order(4)
+
+        self.assertEqual(self.board(self.north_staff), [('12:00', [('Chapati', 2)])])
+        self.assertEqual(self.board(self.admin, f'?outlet={self.south.pk}'), [('12:00', [('Chapati', 3)])])
+        self.assertEqual(self.board(self.admin), [('12:00', [('Chapati', 9)])])
+        response = api_client(self.north_staff).get(f'/api/kitchen/?outlet={self.south.pk}')
+        self.assertEqual(response.status_code, 403)
+
+        # Edits in the outlet database only reach that outlet's board
+        item = OrderItem.objects.using('outlet_north').get()
+        item.quantity = 7
+        with self.captureOnCommitCallbacks(using='outlet_north', execute=True):
+            item.save()
+        self.assertEqual(self.board(self.north_staff), [('12:00', [('Chapati', 7)])])
+        self.assertEqual(self.board(self.admin), [('12:00', [('Chapati', 14)])])
+
+
+class SyncTests(TestCase):
+    databases = {'default', 'outlet_north'}
+
+    def setUp(self):
+        self.north = Outlet.objects.create(name='North Canteen', code='north')
+        self.student = make_user('student1')
+        self.other = make_user('student2')
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'))
+        self.client = api_client(self.student)
+        self.hour_ago = timezone.now() - datetime.timedelta(hours=1)
+
+    def order(self, outlet=None, user=None):
+        with use_outlet(outlet):
+            return Order.objects.create(user=user or self.student, outlet=outlet, total_price=Decimal('2.00'),
+                                        status='completed')
+
+    def sync(self, since=None):
+        response = self.client.get('/api/sync/', {'since': since.isoformat()} if since else {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_since_only_returns_what_changed(self):
+        stale = MenuItem.objects.create(name='Pilau', description='', price=Decimal('3.00'))
+        here = self.order()
+        north = self.order(outlet=self.north)
+        self.order(user=self.other)
+        MenuItem.objects.filter(pk=stale.pk).update(updated_at=self.hour_ago)
+        Order.objects.filter(pk=here.pk).update(updated_at=self.hour_ago)
+
+        first = self.sync()
+        self.assertTrue(first['full'])
+        self.assertEqual({item['id'] for item in first['menu']}, {self.item.pk, stale.pk})
+        self.assertEqual({(order['outlet'], order['id']) for order in first['orders']},
+                         {(None, here.pk), (self.north.pk, north.pk)})
+
+        delta = self.sync(timezone.now() - datetime.timedelta(minutes=1))
+        self.assertFalse(delta['full'])
+        self.assertEqual([item['id'] for item in delta['menu']], [self.item.pk])
+        self.assertEqual([(order['outlet'], order['id']) for order in delta['orders']], [(self.north.pk, north.pk)])
+
+        # Watermarks older than the tombstone retention get a full snapshot
+        self.assertTrue(self.sync(timezone.now() - datetime.timedelta(days=31))['full'])
+
+    def test_deletes_are_reported_as_tombstones(self):
+        since = timezone.now() - datetime.timedelta(minutes=1)
+        item_id = self.item.pk
+        here, north, other = self.order(), self.order(outlet=self.north), self.order(user=self.other)
+        deleted_orders = [(order.outlet_id, order.pk) for order in (here, north)]
+        self.item.delete()
+        for order in (here, north, other):
+            order.delete()
+
+        deleted = self.sync(since)['deleted']
+        self.assertEqual(deleted['menu'], [item_id])
+        self.assertEqual({(order['outlet'], order['id']) for order in deleted['orders']}, set(deleted_orders))
+
+    def test_deleting_a_user_leaves_no_tombstones(self):
+        self.order()
+        Notification.objects.create(user=self.student, message='Order placed')
+        self.student.delete()
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_archived_orders_are_tombstoned_in_bulk(self):
+        since = timezone.now() - datetime.timedelta(minutes=1)
+        orders = [self.order(), self.order(), self.order(outlet=self.north)]
+        archived = {(order.outlet_id, order.pk) for order in orders}
+        for order in orders:
+            Order.objects.using(order._state.db).filter(pk=order.pk).update(
+                created_at=timezone.now() - datetime.timedelta(days=120))
+
+        with mock.patch.object(Tombstone.objects, 'create') as create:
+            self.assertEqual(archive_orders(), 3)
+        create.assert_not_called()
+        deleted = self.sync(since)['deleted']['orders']
+        self.assertEqual({(order['outlet'], order['id']) for order in deleted}, archived)
+
+    def test_invalid_since_is_rejected(self):
+        for since in ['yesterday', '2026-02-30T00:00']:
+            response = self.client.get('/api/sync/', {'since': since})
+            self.assertEqual(response.status_code, 400, since)
+
+
+class CachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.north = Outlet.objects.create(name='North Canteen', code='north')
+        self.south = Outlet.objects.create(name='South Canteen', code='south')
+        self.admin = make_user('admin1', role='admin')
+        self.item = MenuItem.objects.create(name='Chapati', description='', price=Decimal('1.00'), outlet=self.north)
+
+    def menu(self, outlet=None):
+        query = f'?outlet={outlet.pk}' if outlet else ''
+        return sorted(item['name'] for item in APIClient().get(f'/api/menu/{query}').json() if item['availability'])
+
+    def admin_form(self, **initial):
+        return SimpleNamespace(changed_data=list(initial), initial=initial)
+
+    def test_cached_reads_are_dropped_by_api_writes(self):
+        client = APIClient()
+        Tag.objects.create(name='Hot', tag_type='temperature')
+        self.assertEqual(len(client.get('/api/tags/').json()), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(client.get('/api/tags/').json()), 1)
+
+        response = api_client(self.admin).post('/api/tags/', {'name': 'Lunch', 'tag_type': 'time_of_day'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(client.get('/api/tags/').json()), 2)
+
+    def test_menu_edits_outside_the_api_drop_the_cached_menu(self):
+        self.assertEqual(self.menu(self.north), ['Chapati'])
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(name='Samosa', description='', price=Decimal('0.50'), outlet=self.north)
+        self.assertEqual(self.menu(self.north), ['Chapati', 'Samosa'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.delete()
+        self.assertEqual(self.menu(self.north), ['Samosa'])
+
+    def test_admin_moves_drop_both_menus(self):
+        self.assertEqual((self.menu(self.north), self.menu(self.south)), (['Chapati'], []))
+        self.item.outlet = self.south
+        request = SimpleNamespace(user=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItemAdmin(MenuItem, admin.site).save_model(request, self.item, self.admin_form(outlet=self.north.pk), True)
+        self.assertEqual((self.menu(self.north), self.menu(self.south)), ([], ['Chapati']))
+
+    def test_admin_stock_edits_reach_the_menu(self):
+        stock = Inventory.objects.create(menu_item=self.item, outlet=self.north, quantity=5, stock_level=10, threshold=2)
+        self.assertEqual(self.menu(self.north), ['Chapati'])
+        stock.quantity = 0
+        request = SimpleNamespace(user=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            InventoryAdmin(Inventory, admin.site).save_model(request, stock, self.admin_form(quantity=5), True)
+        self.assertEqual(self.menu(self.north), [])
+
+    def test_single_flight_coalesces_concurrent_calls(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def load():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'menu'
+
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', load)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do('key', load))) for _ in range(4)]
+        for follower in followers:
+            follower.start()
+        time.sleep(0.05)  # let the followers reach the wait
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+        self.assertEqual((len(calls), results), (1, ['menu'] * 5))
+
+        # The next call after the flight landed runs again
+        self.assertEqual(flight.do('key', lambda: 'fresh'), 'fresh')
+
+    def test_single_flight_shares_the_leaders_error(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise DatabaseError('down')
+
+        def call():
+            try:
+                flight.do('key', fail)
+            except DatabaseError as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=call))
+        threads[1].start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+
+class ThrottlingTests(TestCase):
+    def test_buckets_refill_over_time(self):
+        for store in (LocalBucketStore(), CacheBucketStore()):
+            with self.subTest(store=type(store).__name__):
+                cache.clear()
+                # Two tokens, one more every second
+                self.assertEqual([store.consume('client', 2, 1.0, now=100.0) for _ in range(3)], [0, 0, 1.0])
+                self.assertEqual(store.consume('client', 2, 1.0, now=100.5), 0.5)
+                self.assertEqual(store.consume('client', 2, 1.0, now=101.0), 0)
+                # A full bucket holds no more than its capacity
+                self.assertEqual([store.consume('client', 2, 1.0, now=200.0) for _ in range(3)], [0, 0, 1.0])
+                self.assertEqual(store.consume('other', 2, 1.0, now=200.0), 0)
+
+    def test_throttled_requests_are_told_when_to_retry(self):
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+            **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'ip_bucket': '2/min',
+        }}
+        with override_settings(REST_FRAMEWORK=rest_framework), \
+                mock.patch('core.throttling._store', LocalBucketStore()), \
+                mock.patch.object(OutletViewset, 'throttle_classes', [AnonIPBucketThrottle]):
+            client = APIClient()
+            self.assertEqual([client.get('/api/outlets/').status_code for _ in range(3)], [200, 200, 429])
+            self.assertEqual(client.get('/api/outlets/')['Retry-After'], '30')
+            # Logged-in users are not limited per IP
+            self.assertEqual(api_client(make_user('student1')).get('/api/outlets/').status_code, 200)
+
+    def test_token_refreshes_have_their_own_ip_buckets(self):
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+            **settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'ip_bucket': '2/min', 'token_ip': '3/min',
+        }}
+        with override_settings(REST_FRAMEWORK=rest_framework), \
+                mock.patch('core.throttling._store', LocalBucketStore()), \
+                mock.patch.object(OutletViewset, 'throttle_classes', [AnonIPBucketThrottle]), \
+                mock.patch.object(TokenVerifyView, 'throttle_classes', [AnonIPBucketThrottle]):
+            client = APIClient()
+            self.assertEqual([client.get('/api/outlets/').status_code for _ in range(3)], [200, 200, 429])
+            # The campus NAT's exhausted ip_bucket does not hold up token checks
+            verify = [client.post('/api/token/verify/', {'token': 'x'}).status_code for _ in range(4)]
+            self.assertEqual(verify, [401, 401, 401, 429])
+
+
+class TagIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tag_index.reset()
+        self.hot = Tag.objects.create(name='Hot', tag_type='temperature')
+        self.lunch = Tag.objects.create(name='Lunch', tag_type='time_of_day')
+        self.tea = MenuItem.objects.create(name='Tea', description='', price=Decimal('0.50'))
+        self.pilau = MenuItem.objects.create(name='Pilau', description='', price=Decimal('3.00'))
+        # Far from the other ids; the in-memory bitsets must not grow with it
+        self.soup = MenuItem.objects.create(id=10 ** 9, name='Soup', description='', price=Decimal('1.50'))
+
+    def tag(self, item, *tags):
+        with self.captureOnCommitCallbacks(execute=True):
+            item.tags.add(*tags)
+
+    def menu(self, tags, match='all'):
+        response = APIClient().get('/api/menu/', {'tags': ','.join(str(tag.pk) for tag in tags), 'tags_match': match})
+        self.assertEqual(response.status_code, 200)
+        return sorted(item['name'] for item in response.json())
+
+    def test_ids_are_stored_sorted_and_packed(self):
+        self.assertEqual(decode(encode([10 ** 9, 5, 1, 5])), [1, 5, 10 ** 9])
+        self.assertEqual(len(encode([10 ** 9, 5, 1])), 24)
+        self.assertEqual(encode([]), b'')
+
+    def test_and_or_filters(self):
+        self.tag(self.tea, self.hot)
+        self.tag(self.pilau, self.hot, self.lunch)
+        self.tag(self.soup, self.hot, self.lunch)
+
+        self.assertEqual(self.menu([self.hot]), ['Pilau', 'Soup', 'Tea'])
+        self.assertEqual(self.menu([self.hot, self.lunch]), ['Pilau', 'Soup'])
+        self.assertEqual(self.menu([self.lunch, self.hot], match='any'), ['Pilau', 'Soup', 'Tea'])
+        bits, ids = tag_index._current()
+        self.assertEqual(ids, [self.tea.pk, self.pilau.pk, self.soup.pk])
+        self.assertLessEqual(max(value.bit_length() for value in bits.values()), 3)
+
+    def test_membership_changes_update_the_index(self):
+        self.tag(self.tea, self.hot)
+        self.assertEqual(self.menu([self.hot]), ['Tea'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hot.menu_items.add(self.soup)  # reverse side
+        self.assertEqual(self.menu([self.hot]), ['Soup', 'Tea'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tea.tags.remove(self.hot)
+        self.assertEqual(self.menu([self.hot]), ['Soup'])
+
+        self.tag(self.pilau, self.hot, self.lunch)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pilau.tags.clear()
+        self.assertEqual((self.menu([self.hot]), self.menu([self.lunch])), (['Soup'], []))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.soup.delete()
+        self.assertEqual(self.menu([self.hot]), [])
+        self.assertEqual(Tag.objects.get(pk=self.hot.pk).member_ids, b'')
+
+    def test_other_workers_reload_after_the_ttl(self):
+        self.tag(self.tea, self.hot)
+        self.assertEqual(tag_index.match([self.hot.pk]), [self.tea.pk])
+        # Another worker's change: its version bump stays in that worker's cache
+        Tag.objects.filter(pk=self.hot.pk).update(member_ids=encode([self.tea.pk, self.pilau.pk]))
+        self.assertEqual(tag_index.match([self.hot.pk]), [self.tea.pk])
+        with override_settings(TAG_INDEX_TTL=-1):
+            self.assertEqual(tag_index.match([self.hot.pk]), [self.tea.pk, self.pilau.pk])
+
+    def test_populate_tags_is_idempotent(self):
+        out = io.StringIO()
+        call_command('populate_tags', stdout=out)
+        call_command('populate_tags', stdout=out)
+        # Hot and Lunch are defaults that already exist here
+        self.assertEqual(Tag.objects.count(), 12)
+        self.assertIn('Created 10 tags (2 already existed), 12 tags in total.', out.getvalue())
+        self.assertIn('Created 0 tags (12 already existed), 12 tags in total.', out.getvalue())
+
+        # The index is rebuilt for existing tags too
+        MenuItemTags = MenuItem.tags.through
+        MenuItemTags.objects.create(tag=self.hot, menuitem=self.tea)  # raw insert, no signal
+        call_command('populate_tags', stdout=io.StringIO())
+        self.assertEqual(self.menu([self.hot]), ['Tea'])
+
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.student = make_user('student1')
+        for number in range(3):
+            Notification.objects.create(user=self.student, message=f'Message {number}')
+
+    def count(self, queryset, estimate):
+        with mock.patch('core.admin.estimated_count', return_value=estimate) as estimated:
+            return EstimatedCountPaginator(queryset, 50).count, estimated.called
+
+    def test_big_unfiltered_tables_use_the_estimate(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(Notification.objects.order_by('id'), ESTIMATED_COUNT_MIN + 5), (ESTIMATED_COUNT_MIN + 5, True))
+
+    def test_small_or_filtered_tables_are_counted(self):
+        self.assertEqual(self.count(Notification.objects.order_by('id'), ESTIMATED_COUNT_MIN - 1), (3, True))
+        self.assertEqual(self.count(Notification.objects.order_by('id'), None), (3, True))
+        self.assertEqual(self.count(Notification.objects.filter(read_status=False).order_by('id'), 50000), (3, False))
+        # SQLite keeps no row statistics
+        self.assertIsNone(estimated_count(Notification.objects.all()))
+
+    def test_changelist_shows_the_estimate(self):
+        admin_user = make_user('admin1', role='admin')
+        admin_user.is_staff = admin_user.is_superuser = True
+        admin_user.save()
+        self.client.force_login(admin_user)
+        with mock.patch('core.admin.estimated_count', return_value=25000):
+            response = self.client.get('/admin/core/notification/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '25000 notifications')
+
+
+class SettingsProfileTests(SimpleTestCase):
+    def load(self, profile, **environ):
+        # Import the profile modules afresh so they read `environ`
+        with mock.patch.dict(sys.modules), mock.patch.dict(os.environ):
+            os.environ.pop('DB_PASSWORD', None)
+            os.environ.update(environ)
+            for name in [name for name in sys.modules if name.startswith('smartcanteen.settings.')]:
+                del sys.modules[name]
+            return profiles.load(profile)
+
+    def test_every_profile_loads(self):
+        for profile in profiles.PROFILES:
+            with self.subTest(profile=profile):
+                values = self.load(profile, DB_PASSWORD='secret')
+                self.assertIn('core', values['INSTALLED_APPS'])
+        self.assertEqual(self.load('prod', DB_PASSWORD='secret')['DATABASES']['default']['PASSWORD'], 'secret')
+        self.assertNotIn('django.contrib.admin', self.load('api', DB_PASSWORD='secret')['INSTALLED_APPS'])
+
+    def test_only_mysql_profiles_need_the_password(self):
+        for profile in ('prod', 'api'):
+            with self.subTest(profile=profile), self.assertRaises(ImproperlyConfigured):
+                self.load(profile)
+        for profile in ('dev', 'test', 'bench'):
+            with self.subTest(profile=profile):
+                self.assertEqual(self.load(profile)['DATABASES']['default']['ENGINE'], 'django.db.backends.sqlite3')
+
+
+class AssetTests(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root)
+        self.css = self.root / 'app.4f3c1c9d5e2a.css'
+        self.css.write_text('body { color: red; }\n' * 50)
+        (self.root / 'notes.txt').write_text('short')
+        self.factory = RequestFactory()
+
+    def serve(self, path, **headers):
+        return serve_file(self.factory.get(f'/static/{path}', **headers), path, str(self.root), max_age=60)
+
+    def test_precompressed_variant_and_caching_headers(self):
+        _compress(self.css)
+        self.assertTrue(self.css.with_name(self.css.name + '.gz').is_file())
+
+        response = self.serve(self.css.name, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.css.read_bytes())
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response = self.serve(self.css.name, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response.close()
+
+    def test_unhashed_files_revalidate(self):
+        response = self.serve('notes.txt')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        last_modified = response['Last-Modified']
+        response.close()
+        self.assertEqual(self.serve('notes.txt', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_missing_and_outside_files_are_not_found(self):
+        for path in ('missing.css', '../secrets.txt'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.serve(path)
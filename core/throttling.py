@@ -0,0 +1,159 @@
+"""
+Token bucket throttling for the API.
+
+Three throttles are installed by default (see REST_FRAMEWORK in settings):
+per authenticated user, per client IP for anonymous requests, and per
+route across all clients. Each bucket holds `count` tokens and refills at
+`count / period`, so short bursts are fine while refresh loops are cut off.
+
+Buckets live in process memory by default. Point THROTTLE_BUCKET_STORE at
+CacheBucketStore (or your own class with the same `consume` method) to share
+them between workers through the configured cache backend.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'120/min' -> (120, 60). None disables the throttle."""
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class LocalBucketStore:
+    """In-process buckets, with the least recently used ones evicted past `max_keys`."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, now=None):
+        """Take one token from `key`; return 0 if allowed, else seconds until a token is free."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / refill_rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class CacheBucketStore:
+    """
+    Buckets kept in the Django cache so every worker shares them. Updates are
+    read-modify-write, so under heavy contention a few extra requests may
+    slip through; that is acceptable for abuse protection.
+    """
+
+    prefix = 'throttle'
+
+    def consume(self, key, capacity, refill_rate, now=None):
+        now = time.time() if now is None else now
+        cache_key = f'{self.prefix}:{key}'
+        tokens, updated = cache.get(cache_key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / refill_rate
+        if not wait:
+            tokens -= 1
+        cache.set(cache_key, (tokens, now), int(capacity / refill_rate) + 1)
+        return wait
+
+
+_store = None
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        _store = import_string(getattr(settings, 'THROTTLE_BUCKET_STORE', 'core.throttling.LocalBucketStore'))()
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def __init__(self):
+        self.rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(self.scope))
+        self._wait = None
+
+    def get_bucket_key(self, request, view):
+        raise NotImplementedError('.get_bucket_key() must be overridden')
+
+    def get_rate(self, view):
+        return self.rate
+
+    def allow_request(self, request, view):
+        rate = self.get_rate(view)
+        key = self.get_bucket_key(request, view)
+        if rate is None or key is None:
+            return True
+        count, period = rate
+        self._wait = get_bucket_store().consume(f'{self.scope}:{key}', count, count / period)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    """One bucket per authenticated user."""
+    scope = 'user_bucket'
+
+    def get_bucket_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class AnonIPBucketThrottle(TokenBucketThrottle):
+    """
+    One bucket per client IP for anonymous requests. Logged-in students
+    often share a campus NAT address, so they are limited per user instead.
+    Anonymous views that every student behind that address calls all day
+    (token refresh) set `throttle_ip_scope` to get buckets of their own, at
+    that scope's rate.
+    """
+    scope = 'ip_bucket'
+
+    def get_rate(self, view):
+        scope = getattr(view, 'throttle_ip_scope', None)
+        return parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope)) if scope else self.rate
+
+    def get_bucket_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        scope = getattr(view, 'throttle_ip_scope', None)
+        return f'{scope}:{self.get_ident(request)}' if scope else self.get_ident(request)
+
+
+class RouteBucketThrottle(TokenBucketThrottle):
+    """
+    One bucket per view and action shared by all clients. Views can set
+    `throttle_route_rate` (e.g. '600/min') to override the default.
+    """
+    scope = 'route_bucket'
+
+    def get_rate(self, view):
+        override = getattr(view, 'throttle_route_rate', None)
+        return parse_rate(override) if override else self.rate
+
+    def get_bucket_key(self, request, view):
+        action = getattr(view, 'action', None) or request.method.lower()
+        return f'{view.__class__.__name__}.{action}'
@@ -0,0 +1,233 @@
+"""
+JWT refresh tokens under high churn.
+
+With 5-minute access tokens and rotation, every active student refreshes
+all day, and each refresh blacklists the token it was given. simplejwt's
+stock blacklist costs a blacklist lookup on every refresh and verify plus
+half a dozen user lookups and get_or_creates per refresh.
+
+Here every worker keeps `revoked_tokens`, a bloom filter of blacklisted
+token ids. A token the filter has never seen is not revoked, with no query
+(the common path); filter hits are confirmed in the database and the answer
+kept in a small LRU. Tokens blacklisted by the worker itself are added at
+once, others are picked up by an incremental load at most every
+TOKEN_REVOCATION_SYNC seconds (which re-reads the newest ids it has seen, in
+case a lower id committed late), and the filter is rebuilt from unexpired
+tokens only every TOKEN_REVOCATION_REBUILD seconds. Replaying a rotated
+refresh token on another worker inside that window still fails: blacklisting
+it again hits the unique constraint, so the refresh is refused.
+
+Expired outstanding tokens (and their blacklist rows) are deleted in
+batches by the purge_tokens command.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt import views as jwt_views
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+from rest_framework_simplejwt.tokens import UntypedToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings, about 1% false positives up to `capacity` entries."""
+
+    hashes = 7
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = max(capacity * 10, 1 << 16)  # ~10 bits per entry
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, step = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + number * step) % self.size for number in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationFilter:
+    """Per-worker answer to "is this token id blacklisted?", mostly without a query."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._last_id = 0
+        self._synced_at = self._built_at = 0.0
+        self._answers = OrderedDict()
+
+    def _rebuild(self):
+        rows = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+            .values_list('id', 'token__jti').iterator(chunk_size=5000)
+        )
+        bloom = BloomFilter(max(2 * len(rows), 50000))
+        for _, jti in rows:
+            bloom.add(jti)
+        self._bloom = bloom
+        self._last_id = max((row_id for row_id, _ in rows), default=self._last_id)
+        self._answers.clear()
+        self._built_at = time.monotonic()
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._bloom is None or now - self._built_at >= getattr(settings, 'TOKEN_REVOCATION_REBUILD', 3600):
+            self._rebuild()
+        elif now - self._synced_at >= getattr(settings, 'TOKEN_REVOCATION_SYNC', 1.0):
+            # Ids are handed out before commit, so a row can appear below ids
+            # already read: re-read the last TOKEN_REVOCATION_OVERLAP of them
+            since = self._last_id - getattr(settings, 'TOKEN_REVOCATION_OVERLAP', 500)
+            rows = BlacklistedToken.objects.filter(id__gt=since).order_by('id').values_list('id', 'token__jti')
+            for row_id, jti in rows:
+                if jti not in self._bloom:
+                    self._bloom.add(jti)
+                # A cached "not revoked" for this token is no longer true
+                if self._answers.get(jti) is False:
+                    del self._answers[jti]
+                self._last_id = max(self._last_id, row_id)
+            if self._bloom.count > self._bloom.capacity:
+                self._rebuild()
+        self._synced_at = now
+
+    def _remember(self, jti, revoked):
+        self._answers[jti] = revoked
+        self._answers.move_to_end(jti)
+        while len(self._answers) > getattr(settings, 'TOKEN_REVOCATION_LRU_SIZE', 10000):
+            self._answers.popitem(last=False)
+
+    def is_revoked(self, jti):
+        with self._lock:
+            self._sync()
+            if jti not in self._bloom:
+                return False
+            if jti in self._answers:
+                self._answers.move_to_end(jti)
+                return self._answers[jti]
+        revoked = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        with self._lock:
+            self._remember(jti, revoked)
+        return revoked
+
+    def add(self, jti):
+        """Record a token this worker just blacklisted."""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+                self._remember(jti, True)
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+            self._answers.clear()
+
+
+revoked_tokens = RevocationFilter()
+
+
+class RefreshToken(BaseRefreshToken):
+    """Refresh token checked against `revoked_tokens`, with leaner outstanding/blacklist writes."""
+
+    def check_blacklist(self):
+        if revoked_tokens.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def _outstanding_fields(self):
+        return {
+            'jti': self.payload[api_settings.JTI_CLAIM],
+            'user_id': self.payload.get(api_settings.USER_ID_CLAIM),
+            'token': str(self),
+            'created_at': self.current_time,
+            'expires_at': datetime_from_epoch(self.payload['exp']),
+        }
+
+    def blacklist(self):
+        """
+        Blacklist this token. A token that is already blacklisted raises
+        TokenError, so a refresh token replayed after rotation is refused
+        even before this worker's filter knows about it.
+        """
+        jti = self.payload[api_settings.JTI_CLAIM]
+        outstanding_id = OutstandingToken.objects.filter(jti=jti).values_list('id', flat=True).first()
+        if outstanding_id is None:
+            # Issued before the blacklist was installed
+            fields = self._outstanding_fields()
+            User = get_user_model()
+            if not User.objects.filter(**{api_settings.USER_ID_FIELD: fields['user_id']}).exists():
+                fields['user_id'] = None
+            outstanding_id = OutstandingToken.objects.create(**fields).id
+        try:
+            with transaction.atomic():
+                blacklisted = BlacklistedToken.objects.create(token_id=outstanding_id)
+        except IntegrityError:
+            raise TokenError(_('Token is blacklisted'))
+        revoked_tokens.add(jti)
+        return blacklisted
+
+    def outstand(self):
+        # Only called for freshly minted ids of a user the refresh just loaded
+        return OutstandingToken.objects.create(**self._outstanding_fields())
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    # Refreshes come from every student behind the campus NAT; see AnonIPBucketThrottle
+    throttle_ip_scope = 'token_ip'
+
+
+class TokenVerifyView(jwt_views.TokenVerifyView):
+    throttle_ip_scope = 'token_ip'
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if revoked_tokens.is_revoked(token.get(api_settings.JTI_CLAIM)):
+            raise ValidationError(_('Token is blacklisted'))
+        return {}
+
+
+def purge_expired_tokens(batch_size=1000):
+    """
+    Delete expired outstanding tokens and their blacklist entries, one
+    transaction per `batch_size` tokens. Returns the number deleted.
+    """
+    cutoff = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=cutoff)
+            .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        # Their blacklist rows go with them (cascade)
+        _, counts = OutstandingToken.objects.filter(id__in=ids).only('id').delete()
+        deleted += counts.get(OutstandingToken._meta.label, 0)
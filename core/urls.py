@@ -1,14 +1,16 @@
 from django.urls import include, path
 from rest_framework import routers
-from .views import UserViewset,MenuItemViewset, OrderItemViewset, OrderViewset, PaymentViewset, InventoryViewset, NotificationViewset, TagViewset, get_current_user
+from .views import UserViewset, OutletViewset, MenuItemViewset, OrderItemViewset, OrderViewset, OrderTicketViewset, PaymentViewset, InventoryViewset, NotificationViewset, TagViewset, get_current_user, kitchen_view, sync_view
 
 #Instance the router
 router = routers.DefaultRouter()
 
 #Register all the viewsets
 router.register(r'users', UserViewset)
+router.register(r'outlets', OutletViewset)
 router.register(r'menu', MenuItemViewset)
 router.register(r'order', OrderViewset, basename='order')
+router.register(r'order-tickets', OrderTicketViewset, basename='orderticket')
 router.register(r'order-item', OrderItemViewset)
 router.register(r'payment', PaymentViewset)
 router.register(r'inventory', InventoryViewset)
@@ -20,4 +22,6 @@ router.register(r'tags', TagViewset)
 urlpatterns = [
     path('', include(router.urls)),
     path('me/', get_current_user, name='current_user'),
+    path('kitchen/', kitchen_view, name='kitchen'),
+    path('sync/', sync_view, name='sync'),
 ]
\ No newline at end of file
@@ -1,12 +1,46 @@
+import datetime
+import io
+from collections import Counter
+from functools import partial
 from django.shortcuts import render
-from .models import User, MenuItem, Order, OrderItem, Payment, Notification, Inventory, Tag
-from .serializers import UserSerializer, MenuItemSerializer, OrderSerializer, OrderItemSerializer, PaymentSerializer, NotificationSerializer, InventorySerializer, TagSerializer
+from .models import User, Outlet, MenuItem, Order, OrderItem, OrderTicket, Payment, Notification, Inventory, Tag, ArchivedOrder
+from .serializers import UserSerializer, OutletSerializer, MenuItemSerializer, OrderSerializer, OrderItemSerializer, PaymentSerializer, NotificationSerializer, InventorySerializer, TagSerializer, OrderBulkTransitionSerializer, ArchivedOrderSerializer, AuditEventSerializer, OrderTicketSerializer, PasswordResetSerializer, PasswordResetConfirmSerializer
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from django.conf import settings
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
+from django.utils.http import http_date
+from . import audit
+from .accounts import send_password_links, user_for_token
+from .admission import admit
+from .alerts import decrement_stock, observe_inventory, stock_transaction
+from .caching import CachedReadMixin
+from .forecasting import restock_report
+from .kitchen import kitchen_board
+from .orders import bulk_transition, etag_for, held_stock, parse_version, release_stock, touch_orders
+from .outlets import OutletMixin, OwnOrdersMixin, menu_cache_scopes, resolve_outlet
+from .permissions import IsAdmin, IsAdminOrStaff, OutletStaffPermission
+from .provisioning import UserImporter
+from .querybudget import QueryBudgetMixin, query_budget
+from .receipts import receipt_queue
+from .sync import build_sync
+from .tagindex import tag_index
 
 
 # Get current authenticated user
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_current_user(request):
@@ -14,15 +48,197 @@ def get_current_user(request):
     return Response(serializer.data)
 
 
+# Kitchen display: quantities still to cook, grouped by pickup window. A board
+# loads with two queries per outlet and then costs only authentication.
+@query_budget(8)
+@api_view(['GET'])
+@permission_classes([IsAdminOrStaff])
+def kitchen_view(request):
+    try:
+        window = int(request.query_params.get('window', 15))
+    except ValueError:
+        window = 0
+    if not 1 <= window <= 24 * 60:
+        return Response(
+            {"error": "window must be a number of minutes between 1 and 1440."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    outlet = resolve_outlet(request)
+    user = request.user
+    if user.role == 'staff' and user.outlet_id is not None and (outlet is None or outlet.pk != user.outlet_id):
+        return Response(
+            {"error": "Staff can only view their own outlet's board."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    if outlet is None:
+        etag, payload = kitchen_board.snapshot(window, all_outlets=True)
+    else:
+        etag, payload = kitchen_board.snapshot(window, outlet.pk)
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(payload, headers={'ETag': etag})
+
+
+# Offline sync for the student app: everything that changed since `since`.
+# Each order database adds up to five queries (orders and their prefetches).
+@query_budget(15)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def sync_view(request):
+    since = request.query_params.get('since')
+    if since:
+        try:
+            since = parse_datetime(since.replace(' ', '+'))
+        except ValueError:
+            since = None
+        if since is None:
+            return Response(
+                {"error": "since must be an ISO 8601 timestamp (the watermark of the last sync)."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+    return Response(build_sync(request, since or None))
+
+
 # Create your views here.
-class UserViewset(viewsets.ModelViewSet):
+class UserViewset(QueryBudgetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    query_budgets = {
+        'list': 2, 'retrieve': 2, 'create': 4, 'update': 4, 'partial_update': 4, 'destroy': 13,
+        'password_reset': 1, 'password_reset_confirm': 2,
+        # Covers a file of one import chunk (1000 rows); bigger ones belong to the import_users command
+        'bulk_import': 24,
+    }
     permission_classes = [permissions.AllowAny]
 
-class MenuItemViewset(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='bulk-import',
+            permission_classes=[IsAdmin], parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        """
+        Create student accounts from an uploaded registrar CSV (`file`).
+        Pass dry_run=true to only validate, invite=true to email students
+        without a password a link to set one. Returns a per-row error report.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {"error": "Upload the registrar CSV as 'file'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        flags = {
+            name: str(request.data.get(name, '')).lower() in ('1', 'true', 'yes') for name in ('dry_run', 'invite')
+        }
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        # Hash in this process: a web worker must not fork a process pool. Imports
+        # too big for a request go through the import_users command.
+        report = UserImporter(workers=1, **flags).run(stream)
+        response_status = status.HTTP_200_OK if flags['dry_run'] or not report.created else status.HTTP_201_CREATED
+        return Response(report.to_dict(), status=response_status)
+
+    @action(detail=False, methods=['post'], url_path='password-reset', permission_classes=[permissions.AllowAny])
+    def password_reset(self, request):
+        """Mail a password link to the account with this email, if there is one."""
+        serializer = PasswordResetSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        users = User.objects.filter(email__iexact=serializer.validated_data['email'], is_active=True)[:1]
+        send_password_links(users)
+        # Same answer either way, so the endpoint does not reveal who has an account
+        return Response(
+            {"detail": "If an account uses this email, a link to set the password has been sent."},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    @action(detail=False, methods=['post'], url_path='password-reset/confirm',
+            permission_classes=[permissions.AllowAny])
+    def password_reset_confirm(self, request):
+        """Set a new password with the uid and token of a password link."""
+        serializer = PasswordResetConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = user_for_token(serializer.validated_data['uid'], serializer.validated_data['token'])
+        if user is None:
+            return Response(
+                {"error": "This link is invalid or has already been used."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            validate_password(serializer.validated_data['password'], user)
+        except DjangoValidationError as exc:
+            return Response({"password": exc.messages}, status=status.HTTP_400_BAD_REQUEST)
+        user.set_password(serializer.validated_data['password'])
+        user.save(update_fields=['password'])
+        return Response({"detail": "Password set."})
+
+class OutletViewset(QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = Outlet.objects.all()
+    serializer_class = OutletSerializer
+    query_budgets = {'list': 2, 'retrieve': 2, 'create': 3, 'update': 3, 'partial_update': 3, 'destroy': 9}
+
+    def get_permissions(self):
+        """
+        Anyone can see the outlets; only admins manage them.
+        """
+        if self.action in ['list', 'retrieve']:
+            return [permissions.AllowAny()]
+        return [IsAdmin()]
+
+class MenuItemViewset(QueryBudgetMixin, OutletMixin, CachedReadMixin, viewsets.ModelViewSet):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
+    query_budgets = {'list': 3, 'retrieve': 3, 'create': 14, 'update': 15, 'partial_update': 15, 'destroy': 10}
+    cache_scopes = ('menu', 'tags')
+    outlet_public_reads = True
+
+    def get_cache_scopes(self):
+        # Each outlet's menu is cached and invalidated on its own
+        outlet = f'menu:{self.outlet.pk}' if self.outlet else 'menu:all'
+        return (outlet, 'menu', 'tags')
+
+    def get_invalidation_scopes(self, instance):
+        return menu_cache_scopes(instance.outlet_id)
+
+    def get_queryset(self):
+        """
+        Filter with ?tags=1,2,3 (items carrying all of them) or, with
+        ?tags_match=any, items carrying any of them. Resolved through the
+        precomputed tag index, so no joins on the tag table.
+        """
+        queryset = MenuItem.objects.prefetch_related('tags')
+        if self.outlet:
+            # The outlet's own items plus the ones sold everywhere
+            queryset = queryset.filter(Q(outlet=self.outlet) | Q(outlet__isnull=True))
+        tag_ids = getattr(self, 'tag_filter', None)
+        if tag_ids:
+            match_all = self.request.query_params.get('tags_match', 'all') != 'any'
+            queryset = queryset.filter(id__in=tag_index.match(tag_ids, match_all=match_all))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        tags = request.query_params.get('tags')
+        if tags:
+            try:
+                self.tag_filter = [int(tag_id) for tag_id in tags.split(',') if tag_id.strip()]
+            except ValueError:
+                return Response(
+                    {"error": "tags must be a comma separated list of tag ids."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Add Last-Modified so clients can revalidate with If-Modified-Since
+        (answered by ConditionalGetMiddleware).
+        """
+        response = super().retrieve(request, *args, **kwargs)
+        updated_at = parse_datetime(response.data.get('updated_at') or '') if response.status_code == 200 else None
+        if updated_at:
+            response['Last-Modified'] = http_date(updated_at.timestamp())
+        return response
     
     def get_permissions(self):
         """
@@ -34,32 +250,183 @@ class MenuItemViewset(viewsets.ModelViewSet):
         else:
             # Import the custom permissions
             from .permissions import IsAdminOrStaff
-            permission_classes_list = [IsAdminOrStaff]
+            permission_classes_list = [IsAdminOrStaff, OutletStaffPermission]
         return [permission() for permission in permission_classes_list]
 
-class OrderViewset(viewsets.ModelViewSet):
+class OrderViewset(QueryBudgetMixin, OutletMixin, OwnOrdersMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    # One query more than a single database needs: outlet databases cannot join users.
+    # Creates that sell an item out and alert staff cost up to two more. Students without
+    # an outlet read every order database (see OwnOrdersMixin): lists pay for each one,
+    # single orders for a miss in default.
+    query_budgets = {
+        'list': 10, 'retrieve': 7, 'create': 13, 'update': 10, 'partial_update': 10,
+        'destroy': 12, 'history': 3, 'bulk_transition': 6, 'timeline': 4, 'prep_times': 2,
+    }
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, OutletStaffPermission]
     
-    def get_queryset(self):
+    def get_queryset_for(self, using):
         """
-        Return orders specific to the logged-in user.
-        Staff/admin users can see all orders.
+        Return orders specific to the logged-in user in database `using`.
+        Staff/admin users can see all orders (of the selected outlet, if any).
         """
         user = self.request.user
         
+        queryset = Order.objects.using(using)
+        # The timeline only loads the order for the access check
+        if self.action != 'timeline':
+            if using == DEFAULT_DB_ALIAS:
+                queryset = queryset.select_related('user').prefetch_related('items__menu_item__tags')
+            else:
+                # Users are not in the outlet database, so no join
+                queryset = queryset.prefetch_related('user', 'items__menu_item__tags')
+        if self.outlet:
+            queryset = queryset.filter(outlet=self.outlet)
+
         # Staff and admin can access ALL orders (for both list and detail views)
         if user.role in ['staff', 'admin']:
-            return Order.objects.all().order_by('-created_at')
+            return queryset.order_by('-created_at')
         
         # Regular users can only see their own orders
-        return Order.objects.filter(user=user).order_by('-created_at')
+        return queryset.filter(user=user).order_by('-created_at')
     
+    def create(self, request, *args, **kwargs):
+        """
+        With ORDER_QUEUE on, orders are only validated here and answered
+        with 202 and a ticket to poll; see core/admission.py.
+        """
+        if not getattr(settings, 'ORDER_QUEUE', False):
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ticket = admit(serializer.validated_data, request.user, serializer.validated_data.get('outlet') or self.outlet)
+        location = reverse('orderticket-detail', args=[ticket.id], request=request)
+        return Response(OrderTicketSerializer(ticket).data, status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': location, 'Retry-After': '1'})
+
     def perform_create(self, serializer):
         """
-        Automatically attach the logged-in user when creating a new order.
+        Automatically attach the logged-in user when creating a new order,
+        and the request's outlet unless the order names one.
+        """
+        serializer.save(user=self.request.user, outlet=serializer.validated_data.get('outlet') or self.outlet)
+
+    def perform_update(self, serializer):
+        """
+        Save only if the order is still at the version the client last saw,
+        taken from the If-Match header or a `version` field in the body.
+        """
+        expected_version = parse_version(
+            self.request.headers.get('If-Match', self.request.data.get('version'))
+        )
+        serializer.save(expected_version=expected_version)
+
+    def perform_destroy(self, instance):
+        using = instance._state.db
+        with transaction.atomic(using=using):
+            if instance.status in Order.HOLDS_STOCK:
+                for outlet_id, quantities in held_stock([instance.pk], using).items():
+                    release_stock(quantities, outlet_id, using)
+            instance.delete()
+        kitchen_board.invalidate(instance.outlet_id)
+
+    def get_archive_queryset(self):
+        """
+        Archived orders (see core/archive.py), with the same visibility rules.
         """
-        serializer.save(user=self.request.user)
+        user = self.request.user
+        queryset = ArchivedOrder.objects.select_related('user').order_by('-created_at')
+        if user.role in ['staff', 'admin']:
+            return queryset
+        return queryset.filter(user=user)
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """
+        Archived orders, newest first, paginated with ?limit=&offset=.
+        Staff can narrow it down to one student with ?user=<id>.
+        """
+        queryset = self.get_archive_queryset()
+        if 'user' in request.query_params and request.user.role in ['staff', 'admin']:
+            user_id = request.query_params['user']
+            if not user_id.isdigit():
+                return Response(
+                    {"error": "user must be a user id."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queryset = queryset.filter(user_id=user_id)
+
+        paginator = LimitOffsetPagination()
+        paginator.default_limit = 50
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(ArchivedOrderSerializer(page, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        """
+        Every status change of the order, oldest first, with who made it.
+        """
+        order = self.get_object()
+        return Response(AuditEventSerializer(audit.order_timeline(order), many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='prep-times',
+            permission_classes=[IsAdminOrStaff, OutletStaffPermission])
+    def prep_times(self, request):
+        """
+        Confirmed -> ready durations for capacity planning, overall and per
+        hour of day. Covers the last 7 days unless ?date_from=/&date_to=
+        (YYYY-MM-DD, inclusive) say otherwise; ?outlet= narrows to one outlet.
+        """
+        today = timezone.localdate()
+        dates = {}
+        for param, default in (('date_from', today - datetime.timedelta(days=6)), ('date_to', today)):
+            value = request.query_params.get(param)
+            try:
+                dates[param] = parse_date(value) if value else default
+            except ValueError:  # well formed but not a day, e.g. 2026-13-01
+                dates[param] = None
+            if dates[param] is None:
+                return Response(
+                    {"error": f"{param} must be in YYYY-MM-DD format."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        start = timezone.make_aware(datetime.datetime.combine(dates['date_from'], datetime.time.min))
+        end = timezone.make_aware(datetime.datetime.combine(dates['date_to'] + datetime.timedelta(days=1), datetime.time.min))
+        metrics = audit.prep_times(start, end, outlet_id=self.outlet.pk if self.outlet else None)
+        return Response({'date_from': dates['date_from'], 'date_to': dates['date_to'], **metrics})
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            instance = self.get_object()
+        except Http404:
+            # Old orders live in the archive; they can be read but not changed
+            order_id = str(kwargs.get(self.lookup_field))
+            if not order_id.isdigit():
+                raise
+            archived = self.get_archive_queryset().filter(order_id=order_id)
+            if self.outlet is not None:
+                # Order ids are only unique per database; rows archived before outlets have none
+                archived = archived.filter(Q(outlet=self.outlet) | Q(outlet__isnull=True))
+            archived = archived.order_by('-archived_at').first()
+            if archived is None:
+                raise
+            return Response(ArchivedOrderSerializer(archived).data)
+
+        headers = {
+            'ETag': etag_for(instance),
+            'Last-Modified': http_date(instance.updated_at.timestamp()),
+        }
+        # Answer revalidations before paying for serialization
+        not_modified = get_conditional_response(
+            request, etag=headers['ETag'], last_modified=int(instance.updated_at.timestamp())
+        )
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified[header] = value
+            return not_modified
+
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, headers=headers)
 
     def partial_update(self, request, *args, **kwargs):
         """
@@ -81,34 +448,189 @@ class OrderViewset(viewsets.ModelViewSet):
         # Use the serializer to update the instance
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        self.perform_update(serializer)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.data, status=status.HTTP_200_OK, headers={'ETag': etag_for(serializer.instance)})
 
+    @action(detail=False, methods=['post'], url_path='bulk-transition',
+            permission_classes=[IsAdminOrStaff, OutletStaffPermission])
+    def bulk_transition(self, request):
+        """
+        Advance many orders to one status in a single update, e.g.
+        {"status": "preparing", "ids": [1, 2, 3]} or
+        {"status": "ready", "orders": [{"id": 1, "version": 4}]}.
+        Orders that cannot make the move (or are at another version) are skipped.
+        """
+        serializer = OrderBulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
 
-class PaymentViewset(viewsets.ModelViewSet):
+        versions = {order['id']: order['version'] for order in data.get('orders', [])}
+        updated, skipped = bulk_transition(data['status'], ids=data.get('ids'), versions=versions, outlet=self.outlet)
+        return Response({'status': data['status'], 'updated': updated, 'skipped': skipped})
+
+
+class PaymentViewset(QueryBudgetMixin, OutletMixin, OwnOrdersMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    # Students without an outlet read every order database (see OwnOrdersMixin)
+    query_budgets = {
+        'list': 3, 'retrieve': 3, 'create': 4, 'update': 5, 'partial_update': 5, 'destroy': 5, 'receipt': 3,
+    }
+    permission_classes = [permissions.IsAuthenticated, OutletStaffPermission]
 
+    def get_queryset_for(self, using):
+        """
+        Payments in database `using`. Students only see payments for their
+        own orders: payments carry their receipt's URL, and receipts name the
+        student and what they ate.
+        """
+        queryset = Payment.objects.using(using).order_by('-created_at')
+        user = self.request.user
+        if self.outlet:
+            queryset = queryset.filter(order__outlet=self.outlet)
+        if user.role in ['staff', 'admin']:
+            return queryset
+        return queryset.filter(order__user=user)
 
-class OrderItemViewset(viewsets.ModelViewSet):
-    queryset = OrderItem.objects.all()
+    @action(detail=True, methods=['get'])
+    def receipt(self, request, pk=None):
+        """
+        The payment's receipt URL, for the student who paid and for staff.
+        Receipts are rendered in the background after checkout; until it is
+        ready this answers 202 (poll again).
+        """
+        payment = self.get_object()
+        if payment.receipt_url:
+            return Response({'receipt_url': payment.receipt_url})
+        if payment.payment_status != 'completed':
+            return Response(
+                {"error": "Receipts are only issued for completed payments."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        using = payment._state.db
+        transaction.on_commit(partial(receipt_queue.submit, payment.id, using), using=using)
+        return Response({'receipt_url': None}, status=status.HTTP_202_ACCEPTED)
+
+
+class OrderTicketViewset(QueryBudgetMixin, viewsets.ReadOnlyModelViewSet):
+    """Orders accepted at peak times; poll until the status is placed (or failed)."""
+    serializer_class = OrderTicketSerializer
+    query_budgets = {'list': 2, 'retrieve': 2}
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.role in ['staff', 'admin']:
+            return OrderTicket.objects.order_by('-id')
+        return OrderTicket.objects.filter(user=user).order_by('-id')
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if response.data['status'] == 'queued':
+            response['Retry-After'] = '1'
+        return response
+
+
+class OrderItemViewset(QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = OrderItem.objects.select_related('menu_item').prefetch_related('menu_item__tags')
     serializer_class = OrderItemSerializer
+    # Raising a quantity takes stock, which can alert staff and sell the item out
+    query_budgets = {'list': 3, 'retrieve': 3, 'create': 1, 'update': 12, 'partial_update': 12, 'destroy': 8}
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        if self.action in ('update', 'partial_update', 'destroy'):
+            # Edits of open orders' items take or return stock at the order's outlet
+            return OrderItem.objects.select_related('order', 'menu_item')
+        return self.queryset
+
+    def create(self, request, *args, **kwargs):
+        # Items belong to an order and are placed with it (items_data), which also takes the stock
+        raise MethodNotAllowed(request.method, detail="Add items to an order through the order's items_data.")
 
-class NotificationViewset(viewsets.ModelViewSet):
+    # An order's ETag is its version, so item edits move the order to a new one
+
+    def perform_update(self, serializer):
+        item = serializer.instance
+        order = item.order
+        before = Counter({item.menu_item_id: item.quantity})
+        with stock_transaction(order.outlet_id) as taken:
+            item = serializer.save()
+            touch_orders([item.order_id], item._state.db)
+            if order.status in Order.HOLDS_STOCK:
+                after = Counter({item.menu_item_id: item.quantity})
+                decrement_stock(after - before, outlet_id=order.outlet_id)
+                taken.update(after - before)
+                release_stock(before - after, order.outlet_id, item._state.db)
+
+    def perform_destroy(self, instance):
+        using = instance._state.db
+        with transaction.atomic(using=using):
+            instance.delete()
+            touch_orders([instance.order_id], using)
+            if instance.order.status in Order.HOLDS_STOCK:
+                release_stock(Counter({instance.menu_item_id: instance.quantity}), instance.order.outlet_id, using)
+            transaction.on_commit(partial(kitchen_board.invalidate_database, using), using=using)
+
+
+class NotificationViewset(QueryBudgetMixin, viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
+    query_budgets = {'list': 2, 'retrieve': 2, 'create': 4, 'update': 4, 'partial_update': 4, 'destroy': 5}
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
-class InventoryViewset(viewsets.ModelViewSet):
+class InventoryViewset(QueryBudgetMixin, OutletMixin, viewsets.ModelViewSet):
     queryset = Inventory.objects.all()
     serializer_class = InventorySerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    query_budgets = {
+        'list': 2, 'retrieve': 2, 'create': 4, 'update': 5, 'partial_update': 5, 'destroy': 4, 'restock_report': 4,
+    }
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, OutletStaffPermission]
+
+    def get_queryset(self):
+        """Each outlet keeps its own stock counters; ?outlet= narrows to one."""
+        queryset = Inventory.objects.all()
+        if self.action in ('update', 'partial_update'):
+            # Edits pass the item's name to the low-stock alert engine
+            queryset = queryset.select_related('menu_item')
+        if self.outlet:
+            return queryset.filter(outlet=self.outlet)
+        return queryset
+
+    def perform_update(self, serializer):
+        """
+        Log manual stock edits and run them through the low-stock alert engine.
+        """
+        previous = serializer.instance.quantity
+        inventory = serializer.save()
+        audit.record([audit.change(Inventory, inventory.pk, 'quantity', previous, inventory.quantity, inventory.outlet_id)])
+        observe_inventory(inventory, previous)
+
+    @action(detail=False, methods=['get'], url_path='restock-report',
+            permission_classes=[IsAdminOrStaff, OutletStaffPermission])
+    def restock_report(self, request):
+        """
+        Suggested restock quantities from the latest demand forecast, for the
+        request's outlet (all outlets when none is selected).
+        Defaults to tomorrow; pass ?date=YYYY-MM-DD for another day.
+        """
+        date = None
+        if 'date' in request.query_params:
+            try:
+                date = parse_date(request.query_params['date'])
+            except ValueError:  # well formed but not a day, e.g. 2026-02-30
+                date = None
+            if date is None:
+                return Response(
+                    {"error": "date must be in YYYY-MM-DD format."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        return Response(restock_report(date, outlet=self.outlet))
 
-class TagViewset(viewsets.ModelViewSet):
+class TagViewset(QueryBudgetMixin, CachedReadMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    query_budgets = {'list': 2, 'retrieve': 2, 'create': 4, 'update': 4, 'partial_update': 4, 'destroy': 5}
+    cache_scopes = ('tags',)
     permission_classes = [permissions.AllowAny]  # Anyone can view tags
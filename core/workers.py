@@ -0,0 +1,22 @@
+"""
+Helpers for process pools.
+
+Kept free of model imports: spawned workers import this module before
+Django is set up, and importing models at that point would fail.
+"""
+
+import os
+
+
+def pool_initargs():
+    return (os.environ.get('DJANGO_SETTINGS_MODULE'), os.environ.get('SMARTCANTEEN_PROFILE'))
+
+
+def setup_django_worker(settings_module, profile):
+    """Process pool initializer: configure Django in a freshly spawned worker."""
+    if settings_module:
+        os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    if profile:
+        os.environ['SMARTCANTEEN_PROFILE'] = profile
+    import django
+    django.setup()
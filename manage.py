@@ -7,6 +7,9 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartcanteen.settings')
+    # Tests run offline on the test profile unless told otherwise
+    if len(sys.argv) > 1 and sys.argv[1] == 'test':
+        os.environ.setdefault('SMARTCANTEEN_PROFILE', 'test')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
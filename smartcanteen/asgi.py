@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartcanteen.settings')
+os.environ.setdefault('SMARTCANTEEN_PROFILE', 'prod')
 
 application = get_asgi_application()
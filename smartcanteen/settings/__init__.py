@@ -0,0 +1,39 @@
+"""
+Settings profiles for smartcanteen.
+
+DJANGO_SETTINGS_MODULE stays 'smartcanteen.settings'; the profile is picked
+with the SMARTCANTEEN_PROFILE environment variable:
+
+    dev    local development, DEBUG on, SQLite (default for manage.py)
+    test   fast, offline test runs (default for `manage.py test`)
+    prod   production, MySQL from the DB_* environment variables, DB_PASSWORD
+           required (default for wsgi/asgi)
+    api    prod without admin/sessions/messages, for pure-JWT API workers
+    bench  api-only app stack on local SQLite, for benchmarks
+"""
+
+import importlib
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ('dev', 'test', 'prod', 'api', 'bench')
+
+PROFILE = os.environ.get('SMARTCANTEEN_PROFILE', 'dev')
+if PROFILE not in PROFILES:
+    raise ImportError(
+        f"Unknown SMARTCANTEEN_PROFILE '{PROFILE}'. Choose one of: {', '.join(PROFILES)}."
+    )
+
+
+def load(profile):
+    """The settings of `profile`; ImproperlyConfigured if a MySQL database it uses has no password."""
+    module = importlib.import_module(f'{__name__}.{profile}')
+    values = {name: value for name, value in vars(module).items() if name.isupper()}
+    for database in values['DATABASES'].values():
+        if database['ENGINE'] == 'django.db.backends.mysql' and not database.get('PASSWORD'):
+            raise ImproperlyConfigured("Set DB_PASSWORD to the production database password.")
+    return values
+
+
+globals().update(load(PROFILE))
@@ -0,0 +1,298 @@
+"""
+Base Django settings for smartcanteen project, shared by every profile.
+
+Generated by 'django-admin startproject' using Django 5.2.3.
+The profile modules next to this file (dev, test, prod, bench, api) import
+everything from here and override what differs.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.2/ref/settings/
+"""
+
+from datetime import timedelta
+import os
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY',
+    'django-insecure-4(_q8wx5nb^xp=&80&n^^4qrw^8f0i@klxjdwg9v9%uh1!x9-!'
+)
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    'bedanaurum.pythonanywhere.com',
+    'https://smart-canteen-50d9b.web.app/',
+    'https://smart-canteen-50d9b.firebaseapp.com/'
+]
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+
+    # 3rd party apps
+    'corsheaders',
+    'rest_framework',
+    'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
+
+    #My apps
+    'core',
+]
+
+MIDDLEWARE = [
+    'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.JSONGZipMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.audit.AuditMiddleware',
+]
+
+ROOT_URLCONF = 'smartcanteen.urls'
+
+CORS_ALLOW_ALL_ORIGINS = True
+
+CORS_ALLOW_CREDENTIALS = True
+
+
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': (
+        'rest_framework.permissions.IsAuthenticated',
+    ),
+    # Token buckets, see core/throttling.py
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.UserBucketThrottle',
+        'core.throttling.AnonIPBucketThrottle',
+        'core.throttling.RouteBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'user_bucket': '120/min',
+        'ip_bucket': '60/min',
+        # Token refresh and verify, per IP: a whole campus NAT refreshes every 5 minutes
+        'token_ip': '1200/min',
+        'route_bucket': '3000/min',
+    },
+}
+
+# Outlet code -> database alias for outlets whose order tables live in their own
+# database (the alias must also be in DATABASES); see core/outlets.py
+OUTLET_DATABASES = {}
+DATABASE_ROUTERS = ['core.outlets.OutletRouter']
+
+# Seconds each worker keeps its copy of the outlet table
+OUTLET_DIRECTORY_TTL = 60
+
+# Share of API requests checked against the viewsets' query_budgets (see core/querybudget.py);
+# over-budget requests are logged, or raise QueryBudgetExceeded with QUERY_BUDGET_RAISE
+QUERY_BUDGET_SAMPLE_RATE = 0.01
+QUERY_BUDGET_RAISE = False
+
+# Where throttle buckets live; CacheBucketStore shares them between workers
+THROTTLE_BUCKET_STORE = 'core.throttling.LocalBucketStore'
+
+# Seconds public menu/tag responses stay cached (writes invalidate them sooner)
+API_CACHE_TTL = 60
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),      # how long access tokens last
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),        # how long refresh tokens last
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    # Blacklist checks through core.tokens' in-memory revocation filter
+    'TOKEN_OBTAIN_SERIALIZER': 'core.tokens.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.tokens.TokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'core.tokens.TokenVerifySerializer',
+}
+
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'smartcanteen.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Local SQLite by default so nothing needs the network to start; prod switches to MySQL.
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    }
+}
+
+# Password validation
+# https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.2/howto/static-files/
+
+STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Serve static/media through core.assets when DEBUG is off (see smartcanteen/urls.py)
+SERVE_FILES = False
+# Cache lifetimes for files without a content hash in their name
+STATIC_MAX_AGE = 60 * 60
+MEDIA_MAX_AGE = 60 * 60 * 24
+
+# JSON responses smaller than this many bytes are sent uncompressed
+GZIP_MIN_LENGTH = 1024
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+#Tells django to use your custom user model
+AUTH_USER_MODEL = 'core.User'
+
+# Low-stock alerts: seconds before the same inventory row can alert again
+STOCK_ALERT_DEBOUNCE = 15 * 60
+# Seconds each worker keeps the list of staff to alert (saving a user drops it sooner)
+STOCK_ALERT_STAFF_TTL = 5 * 60
+
+# Kitchen board: seconds before the in-memory tally is reloaded from the database
+KITCHEN_BOARD_TTL = 30
+
+# Tag filter index: seconds before a worker reloads its copy even if the tag version did not move
+TAG_INDEX_TTL = 60
+
+# Completed/cancelled orders older than this many days are moved to the archive (archive_orders command)
+ORDER_ARCHIVE_AFTER_DAYS = 90
+
+# /api/sync/: seconds re-read before each client watermark, and how long delete tombstones are kept
+SYNC_OVERLAP = 5
+SYNC_TOMBSTONE_DAYS = 30
+
+# Password set/reset links mailed to students (core/accounts.py); the app's page that reads
+# uid and token and posts them to /api/users/password-reset/confirm/
+PASSWORD_SET_URL = '/set-password/{uid}/{token}/'
+
+# Receipts: rendered after commit on a background thread that batches payments for
+# RECEIPT_BATCH_WINDOW seconds; larger batches render in RECEIPT_WORKERS processes
+RECEIPT_ASYNC = True
+RECEIPT_BATCH_WINDOW = 0.5
+RECEIPT_BATCH_SIZE = 100
+RECEIPT_WORKERS = 2
+
+# Audit log of order status, menu price and stock changes: 'database' (AuditEvent rows,
+# needed by the order timeline and prep-time endpoints) and/or 'file' (rotated NDJSON)
+AUDIT_LOG_SINKS = ['database']
+AUDIT_LOG_FILE = BASE_DIR / 'logs' / 'audit.ndjson'
+AUDIT_LOG_MAX_BYTES = 50 * 1024 * 1024
+AUDIT_LOG_BACKUPS = 10
+
+# Peak-hour admission control (core/admission.py). When on, POST /api/order/ answers 202
+# with a ticket and orders are placed by a per-worker background thread in micro-batches
+# of up to ORDER_QUEUE_BATCH_SIZE collected over ORDER_QUEUE_BATCH_WINDOW seconds;
+# beyond ORDER_QUEUE_MAX waiting tickets per worker new orders get 503
+ORDER_QUEUE = False
+ORDER_QUEUE_ASYNC = True
+ORDER_QUEUE_MAX = 500
+ORDER_QUEUE_BATCH_SIZE = 50
+ORDER_QUEUE_BATCH_WINDOW = 0.05
+
+# Revoked refresh tokens (core/tokens.py): each worker keeps a bloom filter of blacklisted
+# token ids, topped up from the database at most every TOKEN_REVOCATION_SYNC seconds and
+# rebuilt every TOKEN_REVOCATION_REBUILD seconds; filter hits are confirmed in the database
+# and the answers kept in an LRU of TOKEN_REVOCATION_LRU_SIZE entries. Each top-up re-reads
+# the last TOKEN_REVOCATION_OVERLAP blacklist ids, which may have committed out of order
+TOKEN_REVOCATION_SYNC = 1.0
+TOKEN_REVOCATION_OVERLAP = 500
+TOKEN_REVOCATION_REBUILD = 60 * 60
+TOKEN_REVOCATION_LRU_SIZE = 10000
+
+# Profiling (core/profiling.py): admins add ?profile=1 or an X-Profile: 1 header to run a
+# request under cProfile; the profile and its SQL timeline are stored in PROFILE_DIR (newest
+# PROFILE_KEEP kept) and listed at /admin/profiles/. PROFILE_SAMPLE_RATE of all requests
+# (0: off) is sampled every PROFILE_SAMPLE_INTERVAL seconds for hot functions of
+# PROFILE_SAMPLE_MODULES; each worker writes its counts every PROFILE_SAMPLE_FLUSH seconds
+PROFILE_DIR = BASE_DIR / 'profiles'
+PROFILE_KEEP = 200
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_SAMPLE_INTERVAL = 0.01
+PROFILE_SAMPLE_FLUSH = 60
+PROFILE_SAMPLE_MODULES = ['core.views', 'core.serializers']
@@ -0,0 +1,17 @@
+"""
+Benchmark profile: the api-only app stack on a local SQLite file, so
+benchmarks measure the production request path without a MySQL server.
+"""
+
+from .api import *
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['testserver', 'localhost']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCH_DB_NAME', BASE_DIR / 'bench.sqlite3'),
+    }
+}
@@ -0,0 +1,8 @@
+from .base import *
+
+DEBUG = True
+
+ALLOWED_HOSTS = ALLOWED_HOSTS + ['localhost', '127.0.0.1']
+
+# Log every over-budget request while developing
+QUERY_BUDGET_SAMPLE_RATE = 1.0
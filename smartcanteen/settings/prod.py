@@ -0,0 +1,29 @@
+from .base import *
+
+DEBUG = env_bool('DJANGO_DEBUG', False)
+
+# No fallback password: the settings package refuses a MySQL database without one,
+# after the profile is loaded, so profiles that replace DATABASES (bench) start without it
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.mysql',
+        'NAME': os.environ.get('DB_NAME', 'bedanaurum$smartcanteen'),
+        'USER': os.environ.get('DB_USER', 'bedanaurum'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'bedanaurum.mysql.pythonanywhere-services.com'),
+        'PORT': os.environ.get('DB_PORT', '3306'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+    }
+}
+
+SERVE_FILES = env_bool('SERVE_FILES', True)
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Content-hashed names plus .gz/.br copies written by collectstatic
+    'staticfiles': {
+        'BACKEND': 'core.assets.PrecompressedManifestStaticFilesStorage',
+    },
+}
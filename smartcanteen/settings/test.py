@@ -0,0 +1,38 @@
+from .base import *
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['testserver', 'localhost']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+    # Order tables of the 'north' outlet, to exercise the outlet router
+    'outlet_north': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+}
+OUTLET_DATABASES = {'north': 'outlet_north'}
+
+# Full-cost hashing only slows tests down
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Tests hammer the same routes from one client; keep throttling out of the way
+REST_FRAMEWORK = {**REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': ()}
+
+# Every API request made by a test must stay within its query budget
+QUERY_BUDGET_SAMPLE_RATE = 1.0
+QUERY_BUDGET_RAISE = True
+
+# Render receipts and place queued orders inline when they commit instead of on background threads
+RECEIPT_ASYNC = False
+ORDER_QUEUE_ASYNC = False
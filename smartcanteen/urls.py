@@ -19,10 +19,11 @@ from django.conf.urls.static import static
 
 from django.contrib import admin
 from django.urls import include, path
-from rest_framework_simplejwt.views import TokenObtainPairView,TokenRefreshView, TokenVerifyView
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from core.tokens import TokenRefreshView, TokenVerifyView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/', include('core.urls')),
 
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -30,6 +31,17 @@ urlpatterns = [
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
 ]
 
+# The api profile leaves the admin out of INSTALLED_APPS
+if 'django.contrib.admin' in settings.INSTALLED_APPS:
+    from core.admin import profile_urls
+    urlpatterns[:0] = [
+        path('admin/profiles/', include(profile_urls())),
+        path('admin/', admin.site.urls),
+    ]
+
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+elif settings.SERVE_FILES:
+    from core.assets import file_urlpatterns
+    urlpatterns += file_urlpatterns()
@@ -12,5 +12,6 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartcanteen.settings')
+os.environ.setdefault('SMARTCANTEEN_PROFILE', 'prod')
 
 application = get_wsgi_application()